@@ -4,56 +4,134 @@ This module defines the `analyze_image` function, which uses OpenAI's GPT-4o min
 API to analyze a clothing image and return structured fashion metadata. It provides
 an example input and output prompt (one shot example). The output (JSON format) includes a predefined structure
 including, items, category, gender 
+Results are cached by perceptual image hash, so re-uploads of the same (or nearly the same) photo skip the vision call.
 """
 
-# 3P Imports
-from openai import OpenAI
+# Standard library imports
+import asyncio
+import json
 
 # Local Application Imports
-from config import GPT_MODEL, OPENAI_API_KEY
-
-# Initialize OpenAI client
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
+from config import GPT_MODEL
+from utils import openai_client
+from utils.analysis_cache import get_analysis_cache
+from utils.image_hash import dhash_base64
+from utils.image_prep import image_data_url
+from utils import tracing
 
 # Includes example of expected output, to future clarify expected output. 
+# "category" and "gender" come first so a streamed answer yields the catalog filter before the suggested items
+
+def _analysis_messages(image_base64, subcategories):
+    return [
+        {
+        "role": "user",
+        "content": [
+            {
+            "type": "text",
+            "text": f"""Given an image of an item of clothing, analyze the item and generate a JSON output with the following fields: "items", "category", and "gender".
+                       Use your understanding of fashion trends, styles, and gender preferences to provide accurate and relevant suggestions for how to complete the outfit.
+                       The items field should be a list of items that would go well with the item in the picture. Each item should represent a title of an item of clothing that contains the style, color, and gender of the item.
+                       The category needs to be chosen between the types in this list: {subcategories}.
+                       You have to choose between the genders in this list: [Men, Women, Boys, Girls, Unisex]
+                       Do not include the description of the item in the picture. Do not include the ```json ``` tag in the output.
+                       Write "category" and "gender" before "items".
+
+                       Example Input: An image representing a black leather jacket.
+
+                       Example Output: {{"category": "Jackets", "gender": "Women", "items": ["Fitted White Women's T-shirt", "White Canvas Sneakers", "Women's Black Skinny Jeans"]}}
+                       """,
+            },
+            {
+            "type": "image_url",
+            "image_url": {
+                "url": image_data_url(image_base64),
+            },
+            }
+        ],
+        }
+    ]
 
-def analyze_image(image_base64, subcategories):
-    if not client:
+
+async def analyze_image_async(image_base64, subcategories, use_cache=True):
+    if not openai_client.is_configured():
         return None
+
+    with tracing.span("analyze_image", cache_hit=False) as span:
+        return await _analyze_image(image_base64, subcategories, use_cache, span)
+
+
+async def _analyze_image(image_base64, subcategories, use_cache, span):
+    # Identical or near-duplicate image with the same subcategories: reuse the stored analysis
+    if use_cache:
+        phash, cached = await asyncio.to_thread(_cached_analysis, image_base64, subcategories)
+        if cached is not None:
+            span.set(cache_hit=True)
+            return cached
         
-    response = client.chat.completions.create(
+    response = await openai_client.achat_completion(
         model=GPT_MODEL,
-        messages=[
-            {
-            "role": "user",
-            "content": [
-                {
-                "type": "text",
-                "text": f"""Given an image of an item of clothing, analyze the item and generate a JSON output with the following fields: "items", "category", and "gender".
-                           Use your understanding of fashion trends, styles, and gender preferences to provide accurate and relevant suggestions for how to complete the outfit.
-                           The items field should be a list of items that would go well with the item in the picture. Each item should represent a title of an item of clothing that contains the style, color, and gender of the item.
-                           The category needs to be chosen between the types in this list: {subcategories}.
-                           You have to choose between the genders in this list: [Men, Women, Boys, Girls, Unisex]
-                           Do not include the description of the item in the picture. Do not include the ```json ``` tag in the output.
-
-                           Example Input: An image representing a black leather jacket.
-
-                           Example Output: {{"items": ["Fitted White Women's T-shirt", "White Canvas Sneakers", "Women's Black Skinny Jeans"], "category": "Jackets", "gender": "Women"}}
-                           """,
-                },
-                {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{image_base64}",
-                },
-                }
-            ],
-            }
-        ]
+        messages=_analysis_messages(image_base64, subcategories),
     )
     # Extract relevant features from the response
     features = response.choices[0].message.content
-    return features
\ No newline at end of file
+
+    if use_cache:
+        await asyncio.to_thread(_cache_analysis, phash, subcategories, features)
+    return features
+
+
+# Image decoding and SQLite are blocking, so the coroutines below run these helpers in a worker thread
+# instead of stalling the other requests on the shared event loop
+
+def _cached_analysis(image_base64, subcategories):
+    """(perceptual hash of the image, cached analysis or None)"""
+    phash = dhash_base64(image_base64)
+    return phash, get_analysis_cache().get(phash, subcategories)
+
+
+def _cache_analysis(phash, subcategories, features):
+    # Only cache analyses that parse, so a malformed answer is retried next time
+    try:
+        json.loads(features)
+        get_analysis_cache().set(phash, subcategories, features)
+    except (json.JSONDecodeError, TypeError):
+        pass
+
+
+async def stream_image_analysis(image_base64, subcategories, use_cache=True):
+    """
+    Async generator over the analysis text as the model writes it (a cached analysis arrives as one chunk),
+    so callers can act on "category", "gender" and each suggested item before the answer is complete.
+    """
+    if not openai_client.is_configured():
+        return
+
+    with tracing.span("analyze_image", cache_hit=False, streamed=True) as span:
+        if use_cache:
+            phash, cached = await asyncio.to_thread(_cached_analysis, image_base64, subcategories)
+            if cached is not None:
+                span.set(cache_hit=True)
+                yield cached
+                return
+
+        stream = await openai_client.achat_completion(
+            model=GPT_MODEL,
+            messages=_analysis_messages(image_base64, subcategories),
+            stream=True,
+        )
+        chunks = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunks[-1]
+
+        if use_cache:
+            await asyncio.to_thread(_cache_analysis, phash, subcategories, "".join(chunks))
+
+
+def analyze_image(image_base64, subcategories, use_cache=True):
+    """Blocking wrapper around analyze_image_async (runs on the shared OpenAI client loop)"""
+    if not openai_client.is_configured():
+        return None
+    return openai_client.run(analyze_image_async(image_base64, subcategories, use_cache))
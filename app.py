@@ -6,18 +6,23 @@ A user-friendly interface for the GPT-4o mini + RAG fashion recommendation syste
 import streamlit as st
 import pandas as pd
 import json
-import ast
-import base64
 import os
 from PIL import Image
-import io
 
 # Local imports
-from analysis import analyze_image
-from utils.guardrails import check_match
-from match.search_similar_items import find_matching_items_with_rag
-from config import OPENAI_API_KEY
+from utils.guardrails import check_match_cached, check_matches
+from match.outfit_search import find_outfit
+from match.catalog_index import build_catalog_index
+from match.compatibility_graph import get_compatibility_graph
+from match.pipelined_match import match_image_pipelined
+from match.visual_search import get_visual_search
+from config import MATCH_SERVICE_URL, OPENAI_API_KEY, USE_COMPATIBILITY_GRAPH
 from utils.gcs_download import load_embeddings_with_gcs_fallback
+from utils.catalog_store import store_exists
+from utils.analysis_cache import get_analysis_cache
+from utils.image_prep import candidate_thumbnail, prepare_image_bytes
+from utils import tracing
+from utils.match_client import MatchServiceError, get_match_client
 
 # Page configuration
 st.set_page_config(
@@ -48,6 +53,15 @@ if not OPENAI_API_KEY:
     """)
     st.stop()
 
+# Prometheus metrics endpoint (only when METRICS_PORT is set; started once per process)
+tracing.start_metrics_server()
+
+# With MATCH_SERVICE_URL set, analysis, search and validation run in the matching service (match_service.py)
+match_client = get_match_client()
+
+# Catalog images <id>.jpg, shown next to the matches and sent to the guardrail
+CATALOG_IMAGE_DIR = "../openai-cookbook/examples/data/sample_clothes/sample_images"
+
 # Title and description
 st.title("👗 Fashion Matchmaker")
 st.markdown("""
@@ -55,8 +69,8 @@ Upload a photo of your clothing item and get AI-powered outfit recommendations!
 This app uses GPT-4o mini to analyze your clothing and find matching items.
 """)
 
-# Load the dataset with embeddings
-@st.cache_data
+# Load the dataset with embeddings (cached as a shared resource so the memory-mapped matrix is never copied)
+@st.cache_resource
 def load_data():
     """Load the clothing dataset with embeddings from GCS or local file"""
     
@@ -73,13 +87,37 @@ def load_data():
         st.error(f"Error loading dataset: {e}")
         return None
 
+@st.cache_resource
+def load_catalog_index(_styles_df):
+    """Build the gender/articleType catalog index once per loaded dataset"""
+    return build_catalog_index(_styles_df)
+
+@st.cache_resource
+def load_compatibility_graph():
+    """Precomputed recommendations for uploads of known catalog items (python -m match.compatibility_graph)"""
+    return get_compatibility_graph() if USE_COMPATIBILITY_GRAPH else None
+
+@st.cache_resource
+def load_visual_search():
+    """Local image encoder + visual index of the catalog images (python -m match.visual_search), if set up"""
+    return get_visual_search()
+
+@st.cache_data(ttl=300)
+def load_service_info():
+    """Catalog summary from the matching service"""
+    return match_client.catalog_info()
+
 def get_data_source():
     """Determine the actual data source being used"""
     local_path = "data/sample_clothes/sample_styles_with_embeddings.csv"
     public_url = os.getenv("GCS_PUBLIC_URL")
     bucket_name = os.getenv("GCS_BUCKET_NAME")
     
-    if os.path.exists(local_path):
+    if MATCH_SERVICE_URL:
+        return "service"
+    elif store_exists():
+        return "store"
+    elif os.path.exists(local_path):
         return "local"
     elif public_url:
         return "gcs_public"
@@ -88,18 +126,117 @@ def get_data_source():
     else:
         return "sample"
 
-def encode_image_to_base64(image):
-    """Convert PIL image to base64 string"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return img_str
+def prepare_upload(uploaded_file):
+    """Downscaled base64 payload of the upload, prepared once per uploaded file and reused across reruns"""
+    upload_key = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    prepared = st.session_state.get('prepared_upload')
+    if prepared is None or prepared[0] != upload_key:
+        prepared = (upload_key, prepare_image_bytes(uploaded_file.getvalue()))
+        st.session_state.prepared_upload = prepared
+    return prepared[1]
+
+def remember_trace(request_trace):
+    """Keep the last few request traces in the session for the sidebar breakdown"""
+    traces = st.session_state.setdefault('traces', [])
+    traces.append(request_trace)
+    del traces[:-10]
+
+def render_trace_breakdown(container):
+    """Per-stage time, tokens and cache hits of the latest request"""
+    with container.container():
+        traces = st.session_state.get('traces')
+        if not traces:
+            st.caption("Run an analysis to see where the time goes.")
+            return
+        latest = traces[-1]
+        st.write(f"**{latest.name}**: {latest.duration * 1000:.0f} ms")
+        stages = pd.DataFrame([
+            {"stage": name, **stats, "total_ms": round(stats["total_ms"], 1)}
+            for name, stats in latest.breakdown().items()
+        ])
+        st.dataframe(stages, hide_index=True, use_container_width=True)
+
+def validate_remotely(encoded_image, item_ids):
+    """Service verdicts as {item_id: (raw verdict JSON, error)}, the shape render_validation takes"""
+    verdicts = match_client.validate(encoded_image, item_ids)
+    results = {}
+    for item_id in item_ids:
+        verdict = verdicts.get(int(item_id))
+        if verdict is None:
+            results[item_id] = (None, MatchServiceError(f"No catalog image for item {item_id} on the service"))
+        elif "error" in verdict:
+            results[item_id] = (None, MatchServiceError(verdict["error"]))
+        else:
+            results[item_id] = (json.dumps(verdict), None)
+    return results
+
+def stored_validation(verdict):
+    """A parsed verdict ({"answer", "reason"} or {"error"}) in the (raw verdict JSON, error) shape render_validation takes"""
+    if "error" in verdict:
+        return (None, RuntimeError(verdict["error"]))
+    return (json.dumps(verdict), None)
+
+def render_match_progress(container, events):
+    """Show pipelined match events inside `container` as they arrive; returns the final result, or None on error"""
+    with container:
+        for event in events:
+            kind = event["event"]
+            if kind == "analysis":
+                st.write(f"**{event['field'].title()}:** {event['value']}")
+            elif kind == "description":
+                st.write(f"💡 {event['text']}")
+            elif kind == "match":
+                st.write(f"🎯 {event['item'].get('productDisplayName', 'N/A')} ({event['item'].get('articleType', 'N/A')})")
+            elif kind == "search_error":
+                st.warning(f"Could not search for suggestion {event['index'] + 1}: {event['message']}")
+            elif kind == "verdict":
+                answer = event["verdict"].get("answer")
+                st.write(f"{'✅' if answer == 'yes' else '❌'} Validated item {event['item_id']}")
+            elif kind == "error":
+                st.error(f"Failed to analyze image: {event['message']}")
+                return None
+            elif kind == "done":
+                return event["result"]
+    return None
+
+def render_validation(container, match_result, error=None):
+    """Show a guardrail verdict (raw check_match JSON) inside `container`"""
+    with container.container():
+        if error is not None:
+            st.error(f"Error during validation: {str(error)}")
+            return
+        if match_result is None:
+            st.error("Failed to validate match")
+            return
+        try:
+            match = json.loads(match_result)
+            if match["answer"] == 'yes':
+                st.success("✅ Items match well!")
+            else:
+                st.warning("❌ Items don't match well")
+            st.write(f"**Reason:** {match['reason']}")
+        except (json.JSONDecodeError, TypeError) as e:
+            st.error(f"Error parsing validation result: {e}")
 
 def main():
-    # Load data
-    styles_df = load_data()
-    if styles_df is None:
-        return
+    # Load data (the matching service holds the catalog when MATCH_SERVICE_URL is set)
+    if match_client is not None:
+        styles_df, catalog = None, None
+        try:
+            dataset_info = load_service_info()
+        except MatchServiceError as e:
+            st.error(f"Error connecting to the matching service: {e}")
+            return
+    else:
+        styles_df = load_data()
+        if styles_df is None:
+            return
+        catalog = load_catalog_index(styles_df)
+        dataset_info = {
+            "items": len(styles_df),
+            "categories": styles_df['articleType'].unique().tolist(),
+            "genders": sorted(styles_df['gender'].unique().tolist()),
+        }
     
     # Sidebar for information
     with st.sidebar:
@@ -114,14 +251,18 @@ def main():
         """)
         
         st.header("📊 Dataset Info")
-        if styles_df is not None:
-            st.write(f"Total items: {len(styles_df)}")
-            st.write(f"Categories: {len(styles_df['articleType'].unique())}")
-            st.write(f"Genders: {sorted(styles_df['gender'].unique().tolist())}")
+        if dataset_info is not None:
+            st.write(f"Total items: {dataset_info['items']}")
+            st.write(f"Categories: {len(dataset_info['categories'])}")
+            st.write(f"Genders: {dataset_info['genders']}")
             
             # Show data source
             data_source = get_data_source()
-            if data_source == "local":
+            if data_source == "service":
+                st.info(f"🌐 Using matching service at {MATCH_SERVICE_URL}")
+            elif data_source == "store":
+                st.info("📦 Using local catalog store (memory-mapped)")
+            elif data_source == "local":
                 st.info("📁 Using local embeddings file")
             elif data_source == "gcs_public":
                 st.info("☁️ Using Google Cloud Storage (Public URL)")
@@ -131,6 +272,15 @@ def main():
                 st.info("📝 Using sample demo data")
         else:
             st.error("Dataset not loaded")
+        
+        st.header("⚡ Image Analysis Cache")
+        analysis_stats = get_analysis_cache().stats()
+        st.write(f"Vision calls saved: {analysis_stats['vision_calls_saved_total']}")
+        st.write(f"Hit rate (this session): {analysis_stats['hit_rate']:.0%}")
+        
+        st.header("⏱️ Last Request")
+        trace_slot = st.empty()
+        render_trace_breakdown(trace_slot)
     
     # Main content area
     col1, col2 = st.columns([1, 1])
@@ -152,28 +302,38 @@ def main():
             
             # Analyze button
             if st.button("🔍 Analyze & Find Matches", type="primary"):
-                with st.spinner("Analyzing your clothing item..."):
+                progress = st.container()
+                with st.spinner("Analyzing your clothing item..."), tracing.trace("match", on_finish=remember_trace):
                     try:
                         # Encode image
-                        encoded_image = encode_image_to_base64(image)
-                        
-                        # Get unique subcategories
-                        unique_subcategories = styles_df['articleType'].unique()
-                        
-                        # Analyze the image
-                        analysis = analyze_image(encoded_image, unique_subcategories)
-                        if analysis is None:
-                            st.error("Failed to analyze image. Please check your API key and try again.")
-                            return
+                        encoded_image = prepare_upload(uploaded_file)
                         
-                        try:
-                            image_analysis = json.loads(analysis)
-                        except (json.JSONDecodeError, TypeError) as e:
-                            st.error(f"Error parsing analysis result: {e}")
+                        # One pipelined match: analysis streams in, each suggestion is searched and validated as soon
+                        # as it is written (known catalog items come straight from the compatibility graph)
+                        if match_client is not None:
+                            events = match_client.match_stream(encoded_image)
+                        else:
+                            events = match_image_pipelined(
+                                catalog, encoded_image, styles_df['articleType'].unique(), CATALOG_IMAGE_DIR,
+                                graph=load_compatibility_graph(), visual=load_visual_search(),
+                            )
+                        result = render_match_progress(progress, events)
+                        if result is None:
                             return
                         
                         # Store results in session state
-                        st.session_state.analysis = image_analysis
+                        st.session_state.visual_matches = result.get('visual_matches', [])
+                        if result['source'] == 'graph':
+                            st.session_state.pop('analysis', None)
+                            st.session_state.graph_match = result['matched_item']
+                        else:
+                            st.session_state.pop('graph_match', None)
+                            st.session_state.analysis = result['analysis']
+                        st.session_state.matching_items = result['matches']
+                        st.session_state.validations = {
+                            i: stored_validation(item['verdict'])
+                            for i, item in enumerate(result['matches']) if 'verdict' in item
+                        }
                         st.session_state.encoded_image = encoded_image
                         st.session_state.uploaded_image = image
                         st.rerun()
@@ -184,6 +344,14 @@ def main():
     with col2:
         st.header("🎯 Analysis Results")
         
+        if 'graph_match' in st.session_state:
+            st.info(f"Recognised catalog item {st.session_state.graph_match}: recommendations come from the precomputed compatibility graph.")
+        
+        if st.session_state.get('visual_matches'):
+            st.subheader("👀 Visually Similar Catalog Items")
+            for item in st.session_state.visual_matches:
+                st.write(f"- {item.get('productDisplayName', 'N/A')} ({item.get('articleType', 'N/A')}, similarity {item['score']:.2f})")
+        
         if 'analysis' in st.session_state:
             analysis = st.session_state.analysis
             
@@ -205,24 +373,29 @@ def main():
             
             # Find and display matching items
             if st.button("🔍 Find Similar Items", type="secondary"):
-                with st.spinner("Searching for similar items..."):
+                with st.spinner("Searching for similar items..."), tracing.trace("search", on_finish=remember_trace):
                     try:
-                        # Extract features
-                        item_descs = analysis['items']
-                        item_category = analysis['category']
-                        item_gender = analysis['gender']
-                        
-                        # Filter data
-                        filtered_items = styles_df.loc[styles_df['gender'].isin([item_gender, 'Unisex'])]
-                        filtered_items = filtered_items[filtered_items['articleType'] != item_category]
+                        if match_client is not None:
+                            searched_items, matching_items = match_client.search(analysis)
+                            st.info(f"Searched through {searched_items} items")
+                        else:
+                            # Extract features
+                            item_descs = analysis['items']
+                            item_category = analysis['category']
+                            item_gender = analysis['gender']
+                            
+                            # Filter data (row-id view over the prebuilt catalog index, no DataFrame copies)
+                            with tracing.span("filter_catalog"):
+                                filtered_items = catalog.view(gender=item_gender, exclude_category=item_category)
+                            
+                            st.info(f"Searching through {len(filtered_items)} items...")
+                            
+                            # Assemble one deduplicated outfit (one item per suggestion and per articleType)
+                            matching_items = find_outfit(filtered_items, item_descs)
                         
-                        st.info(f"Searching through {len(filtered_items)} items...")
-                        
-                        # Find matching items
-                        matching_items = find_matching_items_with_rag(filtered_items, item_descs)
-                        
-                        # Store results
+                        # Store results (and drop verdicts for the previous matches)
                         st.session_state.matching_items = matching_items
+                        st.session_state.validations = {}
                         st.rerun()
                         
                     except Exception as e:
@@ -239,6 +412,12 @@ def main():
         else:
             st.success(f"Found {len(matching_items)} potential matches!")
             
+            # Validate every candidate at once; verdicts stream into each item as they finish
+            validate_all = st.button("✅ Validate All Matches", type="primary")
+            validations = st.session_state.setdefault('validations', {})
+            validation_slots = {}
+            image_paths = {}
+            
             # Create columns for displaying items
             cols = st.columns(min(3, len(matching_items)))
             
@@ -249,44 +428,72 @@ def main():
                     
                     # Try to display image if available
                     item_id = item.get('id')
-                    image_path = f"../openai-cookbook/examples/data/sample_clothes/sample_images/{item_id}.jpg"
+                    image_path = os.path.join(CATALOG_IMAGE_DIR, f"{item_id}.jpg")
                     
                     if os.path.exists(image_path):
                         st.image(image_path, caption=f"ID: {item_id}", use_container_width=True)
+                        image_paths[i] = image_path
                     else:
                         st.write(f"Image not found for ID: {item_id}")
                     
                     # Display item details
+                    if item.get('description'):
+                        st.caption(f"Suggested: {item['description']}")
                     st.write(f"**Name:** {item.get('productDisplayName', 'N/A')}")
                     st.write(f"**Category:** {item.get('articleType', 'N/A')}")
                     st.write(f"**Gender:** {item.get('gender', 'N/A')}")
                     
+                    # Placeholder for this item's verdict (filled from session state or by Validate All)
+                    validation_slots[i] = st.empty()
+                    if i in validations:
+                        render_validation(validation_slots[i], *validations[i])
+                    
                     # Add match validation button
                     if st.button(f"✅ Validate Match {i+1}", key=f"validate_{i}"):
-                        with st.spinner("Validating match..."):
+                        with st.spinner("Validating match..."), tracing.trace("validate", on_finish=remember_trace):
                             try:
-                                # Encode suggested image
-                                suggested_image = encode_image_to_base64(Image.open(image_path))
-                                
-                                # Check match
-                                match_result = check_match(st.session_state.encoded_image, suggested_image)
-                                if match_result is None:
-                                    st.error("Failed to validate match")
-                                    continue
-                                
-                                try:
-                                    match = json.loads(match_result)
-                                    if match["answer"] == 'yes':
-                                        st.success("✅ Items match well!")
-                                        st.write(f"**Reason:** {match['reason']}")
-                                    else:
-                                        st.warning("❌ Items don't match well")
-                                        st.write(f"**Reason:** {match['reason']}")
-                                except (json.JSONDecodeError, TypeError) as e:
-                                    st.error(f"Error parsing validation result: {e}")
-                                    
+                                if match_client is not None:
+                                    validations[i] = validate_remotely(st.session_state.encoded_image, [item_id])[item_id]
+                                else:
+                                    # Check match (cached per reference image + item id; the image is only encoded on a miss)
+                                    match_result = check_match_cached(
+                                        st.session_state.encoded_image,
+                                        item_id,
+                                        lambda item_id=item_id, path=image_path: candidate_thumbnail(item_id, path),
+                                    )
+                                    validations[i] = (match_result, None)
                             except Exception as e:
-                                st.error(f"Error during validation: {str(e)}")
+                                validations[i] = (None, e)
+                            render_validation(validation_slots[i], *validations[i])
+                        render_trace_breakdown(trace_slot)
+            
+            if validate_all:
+                # Key candidates by item id (verdict cache key). The service validates against its own catalog
+                # images, so every match goes to it; in-process validation needs the image on local disk, and
+                # encodes it in the worker threads
+                positions = {}
+                candidates = {}
+                for i, item in enumerate(matching_items):
+                    if match_client is None and i not in image_paths:
+                        continue
+                    item_id = item.get('id')
+                    positions.setdefault(item_id, []).append(i)
+                    path = image_paths.get(i)
+                    candidates[item_id] = lambda item_id=item_id, path=path: candidate_thumbnail(item_id, path)
+                with st.spinner(f"Validating {len(candidates)} matches..."), tracing.trace("validate_all", on_finish=remember_trace):
+                    if match_client is not None:
+                        try:
+                            results = validate_remotely(st.session_state.encoded_image, list(candidates)).items()
+                        except MatchServiceError as e:
+                            results = [(item_id, (None, e)) for item_id in candidates]
+                        verdicts = ((item_id, *result) for item_id, result in results)
+                    else:
+                        verdicts = check_matches(st.session_state.encoded_image, candidates)
+                    for item_id, match_result, error in verdicts:
+                        for i in positions[item_id]:
+                            validations[i] = (match_result, error)
+                            render_validation(validation_slots[i], match_result, error)
+                render_trace_breakdown(trace_slot)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
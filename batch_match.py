@@ -0,0 +1,222 @@
+"""
+batch_match.py
+Headless batch matching for large image sets. Takes a directory of images or a JSONL manifest
+({"image": path, "id": optional}) and runs analysis, retrieval and guardrails for every image across
+worker processes, each handling several images concurrently. Results are appended to a JSONL file as
+they finish; re-running with the same output resumes, skipping images that already succeeded.
+
+    python batch_match.py --images path/to/images --output results.jsonl --workers 4 --concurrency 8
+"""
+
+# Standard library imports
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import time
+import traceback
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from config import OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT, USE_COMPATIBILITY_GRAPH
+from match.pipeline import DEFAULT_IMAGE_DIR, match_image
+from utils import openai_client, tracing
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Per-process state set up once by `init_worker`
+_worker = {}
+
+
+def load_inputs(images=None, manifest=None):
+    """[(id, image path)] from a directory of images or a JSONL manifest"""
+    if images:
+        paths = sorted(
+            path for path in glob.glob(os.path.join(images, "**", "*"), recursive=True)
+            if path.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        return [(os.path.relpath(path, images), path) for path in paths]
+
+    inputs = []
+    with open(manifest) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = entry.get("image") or entry.get("image_path") or entry.get("path")
+            if path is None:
+                raise ValueError(f"Manifest entry without an image path: {entry}")
+            inputs.append((str(entry.get("id", path)), path))
+    return inputs
+
+
+def completed_ids(output_path):
+    """Ids already written successfully to `output_path` (errors are retried on resume)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut off by an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def init_worker(store_dir, workers, concurrency, image_dir, validate):
+    """
+    Load the catalog (and its compatibility graph and visual index, if built) once per process (the store is memory-mapped,
+    so its pages are shared between workers) and split the account's RPM/TPM budget across the worker processes.
+    """
+    from match.catalog_index import build_catalog_index
+    from match.compatibility_graph import get_compatibility_graph
+    from match.visual_search import get_visual_search
+    from utils.catalog_store import load_catalog_dataframe
+
+    styles_df = load_catalog_dataframe(store_dir)
+    limiter = openai_client.get_shared_client().limiter
+    limiter.rpm = OPENAI_RPM_LIMIT / workers
+    limiter.tpm = OPENAI_TPM_LIMIT / workers
+    _worker.update(
+        catalog=build_catalog_index(styles_df, store_dir),
+        graph=get_compatibility_graph(store_dir) if USE_COMPATIBILITY_GRAPH else None,
+        visual=get_visual_search(store_dir),
+        subcategories=styles_df["articleType"].unique(),
+        concurrency=concurrency,
+        image_dir=image_dir,
+        validate=validate,
+    )
+
+
+def process_image(item_id, image_path):
+    """Match one image; never raises, errors are reported in the record"""
+    with tracing.trace("batch_match", image=image_path) as request_trace:
+        try:
+            result = match_image(
+                _worker["catalog"], image_path, _worker["subcategories"], _worker["image_dir"], _worker["validate"],
+                graph=_worker["graph"], visual=_worker["visual"],
+            )
+            record = {"id": item_id, "image": image_path, "status": "ok", **result}
+        except Exception as e:
+            record = {
+                "id": item_id,
+                "image": image_path,
+                "status": "error",
+                "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(limit=5),
+            }
+    stages = request_trace.breakdown()
+    record["elapsed_ms"] = round(request_trace.duration * 1000, 1)
+    record["tokens"] = sum(stage["tokens"] for stage in stages.values())
+    record["stages_ms"] = {name: round(stage["total_ms"], 1) for name, stage in stages.items()}
+    return record
+
+
+def process_chunk(chunk):
+    """Match a chunk of images concurrently inside one worker process"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=_worker["concurrency"]) as executor:
+        return list(executor.map(lambda args: process_image(*args), chunk))
+
+
+def run_batch(
+    inputs,
+    output_path,
+    store_dir,
+    workers=4,
+    concurrency=8,
+    chunk_size=16,
+    image_dir=DEFAULT_IMAGE_DIR,
+    validate=True,
+):
+    """
+    Match every (id, path) in `inputs` not yet in `output_path`, appending one JSON line per image.
+    At most two chunks per worker are in flight, so memory stays bounded for any number of images.
+    """
+    done = completed_ids(output_path)
+    pending = [(item_id, path) for item_id, path in inputs if item_id not in done]
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    print(f"images={len(inputs)}, already_done={len(inputs) - len(pending)}, to_process={len(pending)}")
+
+    counts = {"ok": 0, "error": 0}
+    latencies, tokens, graph_hits = [], 0, 0
+    start = time.perf_counter()
+    init_args = (store_dir, workers, concurrency, image_dir, validate)
+
+    # A single worker runs in this process, which keeps tracebacks and debuggers simple
+    pool = concurrent.futures.ThreadPoolExecutor if workers == 1 else concurrent.futures.ProcessPoolExecutor
+
+    with open(output_path, "a") as output, pool(max_workers=workers, initializer=init_worker, initargs=init_args) as executor:
+        remaining = iter(chunks)
+        in_flight = set()
+        while True:
+            for chunk in remaining:
+                in_flight.add(executor.submit(process_chunk, chunk))
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                break
+
+            finished, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                for record in future.result():
+                    output.write(json.dumps(record, default=str) + "\n")
+                    counts[record["status"]] += 1
+                    latencies.append(record["elapsed_ms"])
+                    tokens += record["tokens"]
+                    graph_hits += record.get("source") == "graph"
+                output.flush()
+
+            processed = counts["ok"] + counts["error"]
+            elapsed = time.perf_counter() - start
+            print(f"processed={processed}/{len(pending)}, ok={counts['ok']}, errors={counts['error']}, images/s={processed / elapsed:.2f}")
+
+    elapsed = time.perf_counter() - start
+    report = {
+        **counts,
+        "elapsed_s": round(elapsed, 1),
+        "images_per_s": round((counts["ok"] + counts["error"]) / elapsed, 2) if pending else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1) if latencies else None,
+        "tokens": tokens,
+        "graph_hits": graph_hits,
+    }
+    print(f"✅ Batch finished: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    from utils.catalog_store import DEFAULT_CSV_PATH, DEFAULT_STORE_DIR, convert_csv_to_store, store_outdated
+
+    parser = argparse.ArgumentParser(description="Match a directory or manifest of images against the catalog")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Directory of images (searched recursively)")
+    source.add_argument("--manifest", help='JSONL manifest with one {"image": path, "id": optional} per line')
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file (appended; enables resume)")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--catalog-images", default=DEFAULT_IMAGE_DIR, help="Directory of catalog images <id>.jpg")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Images in flight per worker process")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--no-validate", action="store_true", help="Skip the guardrail checks")
+    args = parser.parse_args()
+
+    # Convert the embeddings CSV into the binary catalog store on first run (and after the CSV is regenerated)
+    if store_outdated(DEFAULT_CSV_PATH, args.store_dir):
+        convert_csv_to_store(DEFAULT_CSV_PATH, args.store_dir)
+
+    run_batch(
+        load_inputs(args.images, args.manifest),
+        args.output,
+        args.store_dir,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size,
+        image_dir=args.catalog_images,
+        validate=not args.no_validate,
+    )
@@ -0,0 +1,269 @@
+"""
+retrieval_benchmark.py
+Offline benchmark of the retrieval path. Builds synthetic catalogs (clustered unit vectors plus gender /
+articleType metadata) as real catalog stores, then times query workloads for every search backend and
+filter setting: raw `search_batch` calls and `find_matching_items_with_rag` with a stubbed embedding
+function, so no OpenAI calls are made. Each (catalog, backend) runs in its own process so peak RSS is
+attributable. Results (p50/p95/p99 latency, throughput, peak RSS, recall@k) are written as JSON.
+
+    python -m benchmarks.retrieval_benchmark --sizes 1000 100000 1000000 --dims 256 3072
+"""
+
+# Standard library imports
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import zlib
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+
+# Local application imports
+from utils.catalog_store import CatalogStoreWriter, load_catalog, store_exists
+
+BACKENDS = ("exact", "ivf", "float16", "int8")
+FILTERS = {
+    "none": {},
+    "gender": {"gender": "Women"},
+    "gender+category": {"gender": "Women", "exclude_category": "Tshirts"},
+}
+GENDERS = ["Men", "Women", "Unisex"]
+GENDER_WEIGHTS = [0.45, 0.45, 0.10]
+ARTICLE_TYPES = [
+    "Tshirts", "Casual Shoes", "Shirts", "Sports Shoes", "Kurtas", "Tops", "Heels", "Flip Flops",
+    "Sandals", "Shorts", "Formal Shoes", "Flats", "Dresses", "Sarees", "Jeans", "Watches",
+]
+GENERATE_BLOCK = 50_000
+DEFAULT_OUTPUT_DIR = "benchmarks/results"
+
+
+def synthetic_catalog(store_dir, n_items, dim, n_clusters=256, noise=0.6, seed=0):
+    """
+    Write a synthetic catalog store of `n_items` clustered unit vectors, block by block so catalogs far
+    larger than memory can be generated. Deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    writer = CatalogStoreWriter(store_dir, model="synthetic")
+    for start in range(0, n_items, GENERATE_BLOCK):
+        size = min(GENERATE_BLOCK, n_items - start)
+        block_rng = np.random.default_rng([seed, start])
+        labels = block_rng.integers(n_clusters, size=size)
+        vectors = centers[labels] + block_rng.normal(scale=noise / np.sqrt(dim), size=(size, dim)).astype(np.float32)
+        ids = np.arange(start, start + size)
+        metadata = pd.DataFrame({
+            "id": ids,
+            "gender": block_rng.choice(GENDERS, size=size, p=GENDER_WEIGHTS),
+            "articleType": block_rng.choice(ARTICLE_TYPES, size=size),
+            "productDisplayName": [f"Synthetic item {i}" for i in ids],
+        })
+        writer.append(metadata, vectors)
+    return writer.close()
+
+
+def make_stub_embeddings(matrix, noise=0.05, seed=0):
+    """
+    Offline replacement for `get_embeddings`: the text "query <row>" embeds to catalog row <row> plus
+    deterministic noise, so queries have realistic near neighbours.
+    """
+    dim = matrix.shape[1]
+
+    def stub(texts):
+        vectors = []
+        for text in texts:
+            row = int(text.rsplit(" ", 1)[-1])
+            rng = np.random.default_rng([seed, zlib.crc32(text.encode())])
+            vectors.append(np.asarray(matrix[row], dtype=np.float32) + rng.normal(scale=noise / np.sqrt(dim), size=dim))
+        return vectors
+
+    return stub
+
+
+def latency_summary(latencies, n_queries):
+    """Percentiles in milliseconds and queries per second for one workload"""
+    latencies = np.asarray(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "mean_ms": round(float(latencies.mean()) * 1000, 3),
+        "queries_per_s": round(n_queries / float(latencies.sum()), 1),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if platform.system() == "Darwin" else 2**10), 1)
+
+
+def run_scenario(store_dir, backend, n_queries, query_batch, top_k, threshold, recall_k, seed):
+    """
+    Benchmark one backend over one catalog store, for every filter setting. Runs in a fresh process.
+    """
+    from match import search_similar_items
+    from match.ann_index import build_index, recall_at_k
+    from match.catalog_index import CatalogIndex
+    from match.vector_index import VectorIndex
+
+    metadata_df, matrix = load_catalog(store_dir)
+    rss_loaded = peak_rss_mb()
+
+    start = time.perf_counter()
+    if backend in ("float16", "int8"):
+        index = build_index(matrix, "exact", quantization=backend)
+    else:
+        index = build_index(matrix, backend)
+    build_s = time.perf_counter() - start
+    catalog = CatalogIndex(metadata_df, matrix, index=index)
+
+    # Queries are noisy copies of random catalog rows, embedded by the stub instead of the API
+    search_similar_items.get_embeddings = make_stub_embeddings(matrix, seed=seed)
+    rng = np.random.default_rng(seed)
+    query_rows = rng.integers(len(matrix), size=n_queries)
+    texts = [f"query {row}" for row in query_rows]
+    queries = np.stack(search_similar_items.get_embeddings(texts))
+
+    results = []
+    for filter_name, filter_args in FILTERS.items():
+        view = catalog.view(**filter_args)
+        view.search_batch(queries[:1], threshold=threshold, top_k=top_k)  # warm-up
+
+        search_latencies = []
+        for query in queries:
+            call_start = time.perf_counter()
+            view.search_batch(query[None, :], threshold=threshold, top_k=top_k)
+            search_latencies.append(time.perf_counter() - call_start)
+
+        rag_latencies = []
+        for batch_start in range(0, n_queries, query_batch):
+            call_start = time.perf_counter()
+            search_similar_items.find_matching_items_with_rag(view, texts[batch_start:batch_start + query_batch])
+            rag_latencies.append(time.perf_counter() - call_start)
+
+        results.append({
+            "backend": backend,
+            "filter": filter_name,
+            "filtered_items": len(view),
+            "build_s": round(build_s, 3),
+            "search": latency_summary(search_latencies, n_queries),
+            "rag": latency_summary(rag_latencies, n_queries),
+        })
+
+    # Peak RSS is read before the exact reference index used for recall is touched
+    rss_peak = peak_rss_mb()
+    recall = None
+    if recall_k and backend != "exact":
+        recall = round(recall_at_k(index, VectorIndex(matrix, normalized=True), queries, k=recall_k), 4)
+    for result in results:
+        result.update({"rss_after_load_mb": rss_loaded, "peak_rss_mb": rss_peak, f"recall@{recall_k}": recall})
+    return results
+
+
+def environment():
+    """Machine and code version, so result files can be compared across changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmark(
+    sizes=(1_000, 10_000, 100_000),
+    dims=(256, 1024, 3072),
+    backends=BACKENDS,
+    n_queries=200,
+    query_batch=4,
+    top_k=2,
+    threshold=0.6,
+    recall_k=10,
+    work_dir=None,
+    keep_catalogs=False,
+    seed=0,
+):
+    """Generate every (size, dim) catalog and benchmark each backend on it in a fresh process"""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="retrieval_benchmark_")
+    context = multiprocessing.get_context("spawn")
+    report = {"environment": environment(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": []}
+
+    for dim in dims:
+        for n_items in sizes:
+            store_dir = os.path.join(work_dir, f"catalog_{n_items}x{dim}")
+            if not store_exists(store_dir):
+                print(f"Generating {n_items} x {dim} catalog ({n_items * dim * 4 / 2**30:.2f} GiB) ...")
+                synthetic_catalog(store_dir, n_items, dim, seed=seed)
+
+            for backend in backends:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    rows = executor.submit(
+                        run_scenario, store_dir, backend, n_queries, query_batch, top_k, threshold, recall_k, seed
+                    ).result()
+                for row in rows:
+                    row.update({"n_items": n_items, "dim": dim})
+                    print(
+                        f"n={n_items:<8} dim={dim:<5} {backend:<8} {row['filter']:<16} "
+                        f"p50={row['search']['p50_ms']:.2f}ms p99={row['search']['p99_ms']:.2f}ms "
+                        f"rag_p50={row['rag']['p50_ms']:.2f}ms qps={row['search']['queries_per_s']:.0f} "
+                        f"rss={row['peak_rss_mb']:.0f}MB"
+                    )
+                report["results"].extend(rows)
+
+            if not keep_catalogs:
+                shutil.rmtree(store_dir)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput and memory on synthetic catalogs")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 1024, 3072])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-batch", type=int, default=4, help="Descriptions per find_matching_items_with_rag call")
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--recall-k", type=int, default=10, help="0 disables the recall measurement")
+    parser.add_argument("--work-dir", help="Where synthetic catalogs are written (default: a temp dir)")
+    parser.add_argument("--keep-catalogs", action="store_true")
+    parser.add_argument("--output", help=f"JSON output path (default: {DEFAULT_OUTPUT_DIR}/<timestamp>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        sizes=args.sizes,
+        dims=args.dims,
+        backends=args.backends,
+        n_queries=args.queries,
+        query_batch=args.query_batch,
+        top_k=args.top_k,
+        threshold=args.threshold,
+        recall_k=args.recall_k,
+        work_dir=args.work_dir,
+        keep_catalogs=args.keep_catalogs,
+        seed=args.seed,
+    )
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"retrieval_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
@@ -9,8 +9,112 @@ GPT_MODEL = "gpt-4o-mini"
 EMBEDDING_MODEL = "text-embedding-3-large"
 EMBEDDING_COST_PER_1K_TOKENS = 0.00013
 
-# Get API key from environment variable
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Matryoshka truncation done by the API (`dimensions` parameter, e.g. 256/512/1024); 0 = the model's full 3072
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Identifies vectors of this model *and* size in caches and content hashes
+EMBEDDING_MODEL_KEY = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
+
+# Shared OpenAI client: HTTP connection pool, keep-alive, global concurrency and per-model rate limits
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "32"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Retrieval backend: "exact" (brute force), "ivf" (approximate), or "auto" (IVF for large catalogs)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+
+# Compact exact search: "none" (float32), "float16" or "int8" codes, optionally truncated to SEARCH_DIMENSIONS
+# (0 = all stored dims); the top RERANK_CANDIDATES are re-scored on the float32 vectors (0 = no re-rank)
+SEARCH_QUANTIZATION = os.getenv("SEARCH_QUANTIZATION", "none")
+SEARCH_DIMENSIONS = int(os.getenv("SEARCH_DIMENSIONS", "0")) or None
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+
+# Retrieval: "vector" (embedding similarity only) or "hybrid" (BM25 over name + attributes fused with the vector
+# ranking by reciprocal rank fusion). Hybrid scores vectors only for the top HYBRID_LEXICAL_CANDIDATES lexical matches,
+# falling back to the whole filtered catalog when too few of them pass the similarity threshold.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_LEXICAL_CANDIDATES = int(os.getenv("HYBRID_LEXICAL_CANDIDATES", "200"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Outfit search: candidates kept per suggested item before MMR picks one item per description (and per articleType);
+# OUTFIT_MMR_LAMBDA trades relevance (1.0) against diversity from the items already chosen (0.0)
+OUTFIT_CANDIDATES = int(os.getenv("OUTFIT_CANDIDATES", "20"))
+OUTFIT_MMR_LAMBDA = float(os.getenv("OUTFIT_MMR_LAMBDA", "0.7"))
+
+# Compatibility graph (python -m match.compatibility_graph): uploads whose dHash is within GRAPH_MATCH_MAX_DISTANCE
+# bits of a catalog image are answered from the precomputed graph with GRAPH_RECOMMENDATIONS items (one per articleType).
+# Off by default: its edges are ranked by name-embedding similarity, not by the live analysis of the upload
+USE_COMPATIBILITY_GRAPH = os.getenv("USE_COMPATIBILITY_GRAPH", "0").lower() in ("1", "true", "yes")
+GRAPH_MATCH_MAX_DISTANCE = int(os.getenv("GRAPH_MATCH_MAX_DISTANCE", "4"))
+GRAPH_RECOMMENDATIONS = int(os.getenv("GRAPH_RECOMMENDATIONS", "4"))
+
+# Visual search (python -m match.visual_search): a local ONNX image encoder (e.g. the CLIP ViT-B/32 vision tower, needs
+# `pip install onnxruntime`) embeds catalog images offline and uploads at request time. "alongside" adds the
+# VISUAL_NEIGHBORS most similar catalog images to each result and treats an upload scoring VISUAL_MATCH_THRESHOLD or
+# more against one as that item; "replace" always takes the nearest catalog image as the item, so the compatibility
+# graph answers without a vision call; "off" disables it
+VISUAL_SEARCH_MODE = os.getenv("VISUAL_SEARCH_MODE", "alongside")
+IMAGE_EMBEDDING_MODEL = os.getenv("IMAGE_EMBEDDING_MODEL", "models/clip_image_encoder.onnx")
+IMAGE_EMBEDDING_SIZE = int(os.getenv("IMAGE_EMBEDDING_SIZE", "224"))
+IMAGE_EMBEDDING_THREADS = int(os.getenv("IMAGE_EMBEDDING_THREADS", "0"))  # 0 = onnxruntime default
+VISUAL_MATCH_THRESHOLD = float(os.getenv("VISUAL_MATCH_THRESHOLD", "0.92"))
+VISUAL_NEIGHBORS = int(os.getenv("VISUAL_NEIGHBORS", "6"))
+
+# Guardrail validation: concurrent requests per reference image, per-request timeout (s), attempts per check
+GUARDRAIL_MAX_CONCURRENCY = int(os.getenv("GUARDRAIL_MAX_CONCURRENCY", "8"))
+GUARDRAIL_TIMEOUT = float(os.getenv("GUARDRAIL_TIMEOUT", "30"))
+GUARDRAIL_MAX_ATTEMPTS = int(os.getenv("GUARDRAIL_MAX_ATTEMPTS", "5"))
+
+# Images sent to the vision model are downscaled to fit these sides (px) before base64 encoding: GPT-4o bills
+# 170 tokens per 512px tile, so a 512px candidate costs one tile. Candidate thumbnails are cached per item id.
+REFERENCE_IMAGE_MAX_SIDE = int(os.getenv("REFERENCE_IMAGE_MAX_SIDE", "768"))
+CANDIDATE_IMAGE_MAX_SIDE = int(os.getenv("CANDIDATE_IMAGE_MAX_SIDE", "512"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+THUMBNAIL_CACHE_MAX_ENTRIES = int(os.getenv("THUMBNAIL_CACHE_MAX_ENTRIES", "1024"))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Local caches (query embeddings etc.) survive app restarts in this directory
+CACHE_DIR = os.getenv("RETAILNEXT_CACHE_DIR", ".cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+ANALYSIS_CACHE_MAX_DISTANCE = int(os.getenv("ANALYSIS_CACHE_MAX_DISTANCE", "4"))
+GUARDRAIL_CACHE_TTL = float(os.getenv("GUARDRAIL_CACHE_TTL", str(30 * 24 * 3600)))
+GUARDRAIL_CACHE_MAX_ENTRIES = int(os.getenv("GUARDRAIL_CACHE_MAX_ENTRIES", "10000"))
+GUARDRAIL_CACHE_MAX_BYTES = int(os.getenv("GUARDRAIL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Request tracing: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics (0 = off) and/or one JSON line per
+# request. The metrics server only listens on loopback unless METRICS_HOST says otherwise (e.g. 0.0.0.0 for a scraper)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+
+# Matching service (match_service.py): catalog store and catalog images it serves from; app.py becomes a thin
+# HTTP client of the service when MATCH_SERVICE_URL is set (e.g. http://localhost:8000)
+MATCH_SERVICE_URL = os.getenv("MATCH_SERVICE_URL")
+MATCH_SERVICE_TIMEOUT = float(os.getenv("MATCH_SERVICE_TIMEOUT", "120"))
+MATCH_SERVICE_STORE_DIR = os.getenv("MATCH_SERVICE_STORE_DIR", "data/sample_clothes/catalog_store")
+MATCH_SERVICE_IMAGE_DIR = os.getenv("MATCH_SERVICE_IMAGE_DIR", "data/sample_clothes/sample_images")
+
+# Offline stand-in for the OpenAI API (utils/fake_openai.py) for load tests: deterministic embeddings,
+# scripted JSON answers, simulated latency (ms), 429s and 5xx failures. No network calls are made.
+OPENAI_FAKE = os.getenv("OPENAI_FAKE", "").lower() in ("1", "true", "yes")
+FAKE_OPENAI_LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "200"))
+FAKE_OPENAI_JITTER = float(os.getenv("FAKE_OPENAI_JITTER", "0.25"))
+FAKE_OPENAI_RATE_LIMIT_RATE = float(os.getenv("FAKE_OPENAI_RATE_LIMIT_RATE", "0"))
+FAKE_OPENAI_FAILURE_RATE = float(os.getenv("FAKE_OPENAI_FAILURE_RATE", "0"))
+FAKE_OPENAI_RPM = int(os.getenv("FAKE_OPENAI_RPM", "0"))
+FAKE_OPENAI_RETRY_AFTER = float(os.getenv("FAKE_OPENAI_RETRY_AFTER", "1"))
+FAKE_OPENAI_SCRIPT = os.getenv("FAKE_OPENAI_SCRIPT")
+FAKE_OPENAI_SEED = int(os.getenv("FAKE_OPENAI_SEED", "0"))
+
+# Get API key from environment variable (any placeholder works against the offline fake)
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or ("sk-fake" if OPENAI_FAKE else None)
 
 if not OPENAI_API_KEY:
     print("⚠️ Warning: OPENAI_API_KEY environment variable not set")
@@ -7,6 +7,8 @@ import pandas as pd
 import numpy as np
 import ast
 
+from config import EMBEDDING_DIMENSIONS
+
 def create_sample_embeddings():
     """Create a small sample embeddings file for deployment"""
     
@@ -35,15 +37,15 @@ def create_sample_embeddings():
     sample_size = min(50, len(original_df))
     sample_df = original_df.head(sample_size).copy()
     
-    # Create dummy embeddings (1536-dimensional vectors like OpenAI embeddings)
+    # Create dummy embeddings with the same shape as the real ones (3072 dims for text-embedding-3-large,
+    # or EMBEDDING_DIMENSIONS when the API truncates them)
     print(f"Creating embeddings for {len(sample_df)} items...")
     
-    # Generate random embeddings (in real deployment, these would be actual OpenAI embeddings)
-    embeddings = []
-    for i in range(len(sample_df)):
-        # Create a random embedding vector (1536 dimensions like text-embedding-3-large)
-        embedding = np.random.rand(1536).tolist()
-        embeddings.append(embedding)
+    # Generate random unit vectors (in real deployment, these would be actual OpenAI embeddings)
+    dims = EMBEDDING_DIMENSIONS or 3072
+    vectors = np.random.normal(size=(len(sample_df), dims))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    embeddings = vectors.tolist()
     
     # Add embeddings to the dataframe
     sample_df['embeddings'] = embeddings
@@ -1,34 +1,37 @@
 """
 generate_embeddings.py
 Generates OpenAI embeddings for a product catalog using the `text-embedding-3-large` configured in config.py model.
+Writes both the embeddings CSV and the binary catalog store.
 """
 
 # Standard library
-import concurrent.futures
 from typing import List
 
 # 3P Imports
-import pandas as pd
+import numpy as np
 import tiktoken
-from tqdm import tqdm
-from openai import OpenAI
-from tenacity import retry, wait_random_exponential, stop_after_attempt
+from openai import NOT_GIVEN
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 # Local config
-from config import EMBEDDING_MODEL, EMBEDDING_COST_PER_1K_TOKENS
-from embeddings.embed_samples_load import styles_df
-
-# Initialize OpenAI client 
-client = OpenAI()
-
-# Simple function to take in a list of text objects and return them as a list of embeddings
-@retry(wait=wait_random_exponential(min=1, max=40), stop=stop_after_attempt(10))
+from config import EMBEDDING_COST_PER_1K_TOKENS, EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, EMBEDDING_MODEL_KEY
+from embeddings.scheduler import AdaptiveScheduler, pack_batches
+from utils import openai_client
+from utils.catalog_store import DEFAULT_CSV_PATH, DEFAULT_STORE_DIR, save_catalog
+from utils.guardrails import RETRYABLE_ERRORS
+
+# Simple function to take in a list of text objects and return them as a list of embeddings.
+# Transient errors are retried here only; the client's own retries are disabled so attempts are not multiplied.
+@retry(
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    wait=wait_random_exponential(min=1, max=40),
+    stop=stop_after_attempt(10),
+    reraise=True,
+)
 def get_embeddings(input: List):
-    response = client.embeddings.create(
-        input=input,
-        model=EMBEDDING_MODEL
-    ).data
-    return [data.embedding for data in response]
+    return openai_client.create_embeddings(
+        input, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS or NOT_GIVEN, max_retries=0
+    )
 
 
 # Splits an iterable into batches of size n. Allows for scale
@@ -38,45 +41,59 @@ def batchify(iterable, n=1):
         yield iterable[ndx : min(ndx + n, l)]
      
 
+# Embeds one packed batch with no client-side retries, so the scheduler sees 429s and adapts to them
+def request_embeddings(input: List):
+    return openai_client.create_embeddings(
+        input, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS or NOT_GIVEN, max_retries=0
+    )
+
+
 # Function for batching and parallel processing the embeddings
 def embed_corpus(
     corpus: List[str],
-    batch_size=64,
+    max_tokens_per_batch=100_000,
+    max_items_per_batch=2048,
     num_workers=8,
     max_context_len=8191,
+    target_latency=None,
 ):
+    # The whole corpus is embedded without the query embedding cache, which a catalog run would flush
+    # (incremental_embeddings.py is the job that skips unchanged rows, using the catalog store)
+    embeddings = [None] * len(corpus)
+
     # Encode the corpus, truncating to max_context_len
     encoding = tiktoken.get_encoding("cl100k_base")
-    encoded_corpus = [
-        encoded_article[:max_context_len] for encoded_article in encoding.encode_batch(corpus)
-    ]
+    encoded_corpus = [encoded_article[:max_context_len] for encoded_article in encoding.encode_batch(corpus)]
 
     # Calculate corpus statistics: the number of inputs, the total number of tokens, and the estimated cost to embed
-    num_tokens = sum(len(article) for article in encoded_corpus)
+    token_counts = [len(article) for article in encoded_corpus]
+    num_tokens = sum(token_counts)
     cost_to_embed_tokens = num_tokens / 1000 * EMBEDDING_COST_PER_1K_TOKENS
     print(
         f"num_articles={len(encoded_corpus)}, num_tokens={num_tokens}, est_embedding_cost={cost_to_embed_tokens:.2f} USD"
     )
 
-    # Embed the corpus
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        
-        futures = [
-            executor.submit(get_embeddings, text_batch)
-            for text_batch in batchify(encoded_corpus, batch_size)
-        ]
+    # Pack batches by token count and embed them under the TPM/RPM budget with adaptive concurrency
+    batches = pack_batches(token_counts, max_tokens_per_batch, max_items_per_batch)
+    scheduler = AdaptiveScheduler(request_embeddings, max_concurrency=num_workers, target_latency=target_latency)
 
-        with tqdm(total=len(encoded_corpus)) as pbar:
-            for _ in concurrent.futures.as_completed(futures):
-                pbar.update(batch_size)
+    def on_result(batch_index, data):
+        # Place each vector at its corpus position
+        for position, embedding in zip(batches[batch_index], data):
+            embeddings[position] = embedding
 
-        embeddings = []
-        for future in futures:
-            data = future.result()
-            embeddings.extend(data)
+    report = scheduler.run(
+        [([encoded_corpus[p] for p in batch], len(batch), sum(token_counts[p] for p in batch)) for batch in batches],
+        on_result,
+    )
+    print(
+        f"embedded={report['items']} in {report['elapsed_s']}s, items/s={report['items_per_s']}, "
+        f"tokens/s={report['tokens_per_s']}, requests={report['requests']}, 429s={report['rate_limited']}, "
+        f"cost={report['cost_usd']:.2f} USD"
+    )
+
+    return embeddings
 
-        return embeddings
-    
 
 # Function to generate embeddings for a given column in a DataFrame
 def generate_embeddings(df, column_name):
@@ -90,7 +107,14 @@ def generate_embeddings(df, column_name):
 
 
 # === Call the embedding function and save the result ===
-generate_embeddings(styles_df, 'productDisplayName')
-print("Writing embeddings to file ...")
-styles_df.to_csv('data/sample_clothes/sample_styles_with_embeddings.csv', index=False)
-print("Embeddings successfully stored in sample_styles_with_embeddings.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    from embeddings.embed_samples_load import styles_df
+
+    generate_embeddings(styles_df, 'productDisplayName')
+    print("Writing embeddings to file ...")
+    styles_df.to_csv(DEFAULT_CSV_PATH, index=False)
+    print("Embeddings successfully stored in sample_styles_with_embeddings.csv")
+
+    # Refresh the binary catalog store too, which the app, demo and service load in preference to the CSV
+    save_catalog(styles_df, np.stack(styles_df['embeddings'].to_numpy()))
+    print(f"✅ Catalog store updated in {DEFAULT_STORE_DIR}")
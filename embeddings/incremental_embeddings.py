@@ -0,0 +1,166 @@
+"""
+incremental_embeddings.py
+Incremental, resumable catalog embedding job. Every catalog row gets a content hash of the text being
+embedded; rows whose (id, hash) already exist in the catalog store reuse their vector, and only new or
+changed rows are sent to the API. Each finished batch is checkpointed to disk, so an interrupted run
+resumes where it stopped. At the end everything is merged into the catalog store.
+"""
+
+# Standard library
+import argparse
+import concurrent.futures
+import glob
+import os
+import shutil
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+import tiktoken
+from tqdm import tqdm
+
+# Local config
+from config import EMBEDDING_MODEL_KEY
+from embeddings.generate_embeddings import batchify, get_embeddings
+from utils.cache import make_key
+from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog, save_catalog, store_exists
+from utils.embedding_cache import normalize_text
+
+DEFAULT_CATALOG_PATH = "data/sample_clothes/sample_styles.csv"
+DEFAULT_CHECKPOINT_DIR = "data/sample_clothes/embedding_checkpoints"
+
+
+def content_hash(text, model=EMBEDDING_MODEL_KEY):
+    """Hash of the embedded text (and model/dimensions); changes exactly when the row needs re-embedding"""
+    return make_key(model, normalize_text(text))[:32]
+
+
+def load_existing_vectors(store_dir, column_name="productDisplayName"):
+    """
+    {(id, content_hash): vector} for every row of an existing catalog store. Stores written before
+    content hashes were recorded are hashed from their stored `column_name` text.
+    """
+    if not store_exists(store_dir):
+        return {}
+    metadata_df, embeddings = load_catalog(store_dir)
+    if "content_hash" not in metadata_df.columns:
+        if column_name not in metadata_df.columns:
+            return {}
+        metadata_df["content_hash"] = [content_hash(text) for text in metadata_df[column_name].astype(str)]
+    return {
+        (item_id, row_hash): embeddings[row]
+        for row, (item_id, row_hash) in enumerate(zip(metadata_df["id"], metadata_df["content_hash"]))
+    }
+
+
+def load_checkpoints(checkpoint_dir):
+    """
+    {content_hash: vector} from every completed batch file in `checkpoint_dir`.
+    """
+    vectors = {}
+    for path in sorted(glob.glob(os.path.join(checkpoint_dir, "batch_*.npz"))):
+        data = np.load(path)
+        vectors.update(zip(data["hashes"].tolist(), data["embeddings"]))
+    return vectors
+
+
+def write_checkpoint(checkpoint_dir, batch_number, hashes, embeddings):
+    """Atomically write one finished batch (temp file + rename, so a crash never leaves a partial batch)"""
+    path = os.path.join(checkpoint_dir, f"batch_{batch_number:06d}.npz")
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, hashes=np.array(hashes), embeddings=np.asarray(embeddings, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def embed_texts(texts, max_context_len=8191):
+    """
+    Embed one batch of texts, truncated to the model context, in a single request. (Unchanged rows are already
+    reused from the store and the checkpoints, so the shared query embedding cache is not involved.)
+    """
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return get_embeddings([tokens[:max_context_len] for tokens in encoding.encode_batch(texts)])
+
+
+def run_incremental_job(
+    catalog_path=DEFAULT_CATALOG_PATH,
+    column_name="productDisplayName",
+    store_dir=DEFAULT_STORE_DIR,
+    checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+    batch_size=64,
+    num_workers=8,
+):
+    """
+    Embed only new/changed catalog rows, checkpointing each batch, then merge into the catalog store.
+    Re-running after an interruption resumes from the checkpoints.
+    """
+    styles_df = pd.read_csv(catalog_path, on_bad_lines="skip")
+    texts = styles_df[column_name].astype(str).tolist()
+    hashes = [content_hash(text) for text in texts]
+    styles_df["content_hash"] = hashes
+
+    # Diff against the current store and any checkpoints left by an interrupted run
+    existing = load_existing_vectors(store_dir, column_name)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpointed = load_checkpoints(checkpoint_dir)
+
+    pending = {}
+    for item_id, text, row_hash in zip(styles_df["id"], texts, hashes):
+        if (item_id, row_hash) not in existing and row_hash not in checkpointed:
+            pending.setdefault(row_hash, text)
+    pending_hashes = list(pending)
+    print(
+        f"catalog_rows={len(styles_df)}, unchanged={sum((k in existing) for k in zip(styles_df['id'], hashes))}, "
+        f"checkpointed={len(checkpointed)}, to_embed={len(pending_hashes)}"
+    )
+
+    # Embed the remaining rows; every finished batch is written to disk immediately
+    next_batch = len(glob.glob(os.path.join(checkpoint_dir, "batch_*.npz")))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {}
+        for offset, batch_hashes in enumerate(batchify(pending_hashes, batch_size)):
+            future = executor.submit(embed_texts, [pending[h] for h in batch_hashes])
+            futures[future] = (next_batch + offset, batch_hashes)
+
+        with tqdm(total=len(pending_hashes)) as pbar:
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    batch_number, batch_hashes = futures[future]
+                    embeddings = future.result()
+                    write_checkpoint(checkpoint_dir, batch_number, batch_hashes, embeddings)
+                    checkpointed.update(zip(batch_hashes, np.asarray(embeddings, dtype=np.float32)))
+                    pbar.update(len(batch_hashes))
+            except BaseException:
+                # Stop scheduling new batches; finished ones are already checkpointed for the next run
+                for future in futures:
+                    future.cancel()
+                raise
+
+    # Merge: unchanged rows keep their stored vector, new/changed rows take the checkpointed one
+    vectors = [
+        existing[(item_id, row_hash)] if (item_id, row_hash) in existing else checkpointed[row_hash]
+        for item_id, row_hash in zip(styles_df["id"], hashes)
+    ]
+    save_catalog(styles_df, np.stack(vectors), store_dir)
+    shutil.rmtree(checkpoint_dir)
+    print(f"✅ Catalog store updated: {store_dir} ({len(styles_df)} items)")
+    return store_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed new/changed catalog rows and merge them into the catalog store")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--column", default="productDisplayName")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    run_incremental_job(
+        catalog_path=args.catalog,
+        column_name=args.column,
+        store_dir=args.store_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+    )
@@ -0,0 +1,228 @@
+"""
+scheduler.py
+Token-aware batching and an adaptive request scheduler for bulk embedding jobs. Batches are packed by
+token count (not item count), requests are paced against a TPM/RPM budget, and concurrency backs off
+multiplicatively on 429s / slow responses and grows additively while requests succeed (AIMD).
+Reports accurate throughput (items/s, tokens/s) and cost.
+"""
+
+# Standard library
+import collections
+import concurrent.futures
+import threading
+import time
+
+# 3P Imports
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tqdm import tqdm
+
+# Local config
+from config import EMBEDDING_COST_PER_1K_TOKENS, OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT
+
+# API limits for a single embeddings request
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+
+TRANSIENT_ERRORS = (APITimeoutError, APIConnectionError, InternalServerError)
+
+
+def pack_batches(token_counts, max_tokens_per_batch=100_000, max_items_per_batch=MAX_INPUTS_PER_REQUEST):
+    """
+    Greedily pack consecutive inputs into batches that stay under both limits.
+    Returns a list of index lists, in input order.
+    """
+    max_tokens_per_batch = min(max_tokens_per_batch, MAX_TOKENS_PER_REQUEST)
+    max_items_per_batch = min(max_items_per_batch, MAX_INPUTS_PER_REQUEST)
+
+    batches, current, current_tokens = [], [], 0
+    for i, n_tokens in enumerate(token_counts):
+        if current and (current_tokens + n_tokens > max_tokens_per_batch or len(current) >= max_items_per_batch):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class Budget:
+    """
+    Thread-safe requests/minute + tokens/minute budget (two token buckets).
+    """
+
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT):
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.requests = self.rpm
+        self.tokens = self.tpm
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, n_tokens):
+        """Take budget for one request of `n_tokens`; returns 0 on success, else seconds to wait"""
+        n_tokens = min(n_tokens, self.tpm)
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+            self.updated = now
+
+            wait = max((1 - self.requests) * 60 / self.rpm, (n_tokens - self.tokens) * 60 / self.tpm, 0)
+            if wait == 0:
+                self.requests -= 1
+                self.tokens -= n_tokens
+            return wait
+
+
+class ThroughputStats:
+    """
+    Counters for a scheduler run.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.items = 0
+        self.tokens = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.latencies = []
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "items": self.items,
+            "tokens": self.tokens,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_s": round(self.items / elapsed, 1),
+            "tokens_per_s": round(self.tokens / elapsed, 1),
+            "mean_latency_s": round(sum(self.latencies) / len(self.latencies), 3) if self.latencies else 0.0,
+            "cost_usd": round(self.tokens / 1000 * EMBEDDING_COST_PER_1K_TOKENS, 4),
+        }
+
+
+class AdaptiveScheduler:
+    """
+    Runs `request_fn(payload)` for every batch with AIMD concurrency under a TPM/RPM budget.
+
+    Args:
+        request_fn: Callable sending one batch; must raise RateLimitError on 429 (no internal retries)
+        max_concurrency: Upper bound on requests in flight
+        min_concurrency: Lower bound after backoffs
+        rpm, tpm: Request and token budget per minute
+        target_latency: Seconds; slower responses also shrink concurrency (None disables)
+        max_attempts: Attempts per batch before the error is raised
+    """
+
+    def __init__(
+        self,
+        request_fn,
+        max_concurrency=8,
+        min_concurrency=1,
+        rpm=OPENAI_RPM_LIMIT,
+        tpm=OPENAI_TPM_LIMIT,
+        target_latency=None,
+        max_attempts=10,
+    ):
+        self.request_fn = request_fn
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max(min_concurrency, max_concurrency // 2)
+        self.budget = Budget(rpm=rpm, tpm=tpm)
+        self.target_latency = target_latency
+        self.max_attempts = max_attempts
+        self.stats = ThroughputStats()
+        self._successes = 0
+        self._resume_at = 0.0
+
+    def _backoff(self, seconds):
+        """Multiplicative decrease, and pause new submissions for `seconds`"""
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        self._successes = 0
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def _on_success(self, latency):
+        self.stats.latencies.append(latency)
+        if self.target_latency is not None and latency > self.target_latency:
+            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+            self._successes = 0
+            return
+        # Additive increase: one more slot after a full window of successes
+        self._successes += 1
+        if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self._successes = 0
+
+    def _timed_request(self, payload):
+        start = time.perf_counter()
+        result = self.request_fn(payload)
+        return result, time.perf_counter() - start
+
+    def run(self, batches, on_result):
+        """
+        Send every batch and call `on_result(batch_index, result)` as each one completes.
+
+        Args:
+            batches: list of (payload, n_items, n_tokens)
+            on_result: callback receiving results in completion order
+        """
+        pending = collections.deque(range(len(batches)))
+        attempts = collections.Counter()
+        in_flight = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor, tqdm(
+            total=sum(n_items for _, n_items, _ in batches)
+        ) as pbar:
+            while pending or in_flight:
+                # Submit while there is a free slot, no active 429 pause, and budget for the next batch
+                delay = self._resume_at - time.monotonic()
+                while pending and len(in_flight) < self.concurrency and delay <= 0:
+                    index = pending[0]
+                    delay = self.budget.try_acquire(batches[index][2])
+                    if delay > 0:
+                        break
+                    pending.popleft()
+                    attempts[index] += 1
+                    in_flight[executor.submit(self._timed_request, batches[index][0])] = index
+
+                if not in_flight:
+                    time.sleep(max(delay, 0.01))
+                    continue
+
+                timeout = max(delay, 0.01) if pending and delay > 0 else None
+                done, _ = concurrent.futures.wait(in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    _, n_items, n_tokens = batches[index]
+                    try:
+                        result, latency = future.result()
+                    except (RateLimitError, *TRANSIENT_ERRORS) as e:
+                        if attempts[index] >= self.max_attempts:
+                            raise
+                        self.stats.retries += 1
+                        if isinstance(e, RateLimitError):
+                            self.stats.rate_limited += 1
+                            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                            try:
+                                pause = float(retry_after)
+                            except (TypeError, ValueError):
+                                pause = min(2 ** attempts[index], 60)
+                            self._backoff(pause)
+                        else:
+                            self._backoff(min(2 ** attempts[index], 30))
+                        pending.appendleft(index)
+                        continue
+
+                    self.stats.requests += 1
+                    self.stats.items += n_items
+                    self.stats.tokens += n_tokens
+                    self._on_success(latency)
+                    on_result(index, result)
+                    pbar.update(n_items)
+
+        return self.stats.report()
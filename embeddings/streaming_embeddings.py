@@ -0,0 +1,127 @@
+"""
+streaming_embeddings.py
+Streaming ingestion for catalogs larger than memory. The styles CSV is read in chunks and pushed through
+a generator pipeline: tokenize/truncate -> batch -> embed -> append to the on-disk catalog store.
+At most `window` batches are in flight, so memory is bounded by the batch window, not the catalog size.
+"""
+
+# Standard library
+import argparse
+import collections
+import concurrent.futures
+import time
+
+# 3P Imports
+import pandas as pd
+import tiktoken
+
+# Local config
+from config import EMBEDDING_COST_PER_1K_TOKENS, EMBEDDING_MODEL
+from embeddings.generate_embeddings import get_embeddings
+from utils.catalog_store import DEFAULT_STORE_DIR, CatalogStoreWriter
+
+DEFAULT_CATALOG_PATH = "data/sample_clothes/sample_styles.csv"
+
+
+def iter_catalog_chunks(catalog_path, chunksize=10_000):
+    """Yield the catalog CSV as DataFrame chunks of `chunksize` rows"""
+    yield from pd.read_csv(catalog_path, on_bad_lines="skip", chunksize=chunksize)
+
+
+def iter_tokenized(chunks, column_name="productDisplayName", max_context_len=8191):
+    """Yield (chunk, token lists) with every text truncated to the model context"""
+    encoding = tiktoken.get_encoding("cl100k_base")
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        tokens = [encoded[:max_context_len] for encoded in encoding.encode_batch(chunk[column_name].astype(str).tolist())]
+        yield chunk, tokens
+
+
+def iter_batches(tokenized_chunks, batch_size=64):
+    """Re-slice tokenized chunks into (metadata rows, token lists) batches of `batch_size` rows"""
+    leftover_rows, leftover_tokens = None, []
+    for chunk, tokens in tokenized_chunks:
+        # Rows that did not fill a batch in the previous chunk go first
+        if leftover_tokens:
+            chunk = pd.concat([leftover_rows, chunk], ignore_index=True)
+            tokens = leftover_tokens + tokens
+
+        full = len(tokens) - len(tokens) % batch_size
+        for start in range(0, full, batch_size):
+            yield chunk.iloc[start:start + batch_size], tokens[start:start + batch_size]
+        leftover_rows, leftover_tokens = chunk.iloc[full:], tokens[full:]
+
+    if leftover_tokens:
+        yield leftover_rows, leftover_tokens
+
+
+def iter_embedded(batches, num_workers=8, window=16):
+    """
+    Embed batches concurrently and yield (metadata rows, embeddings, n_tokens) in input order.
+    No more than `window` batches are submitted ahead of the consumer.
+    """
+    in_flight = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for rows, tokens in batches:
+            in_flight.append((rows, sum(len(t) for t in tokens), executor.submit(get_embeddings, tokens)))
+            if len(in_flight) >= window:
+                rows, n_tokens, future = in_flight.popleft()
+                yield rows, future.result(), n_tokens
+        while in_flight:
+            rows, n_tokens, future = in_flight.popleft()
+            yield rows, future.result(), n_tokens
+
+
+def stream_embed_catalog(
+    catalog_path=DEFAULT_CATALOG_PATH,
+    column_name="productDisplayName",
+    store_dir=DEFAULT_STORE_DIR,
+    chunksize=10_000,
+    batch_size=64,
+    num_workers=8,
+    window=16,
+    max_context_len=8191,
+):
+    """
+    Embed a catalog of any size into a catalog store, appending each batch as soon as it is embedded.
+    """
+    chunks = iter_catalog_chunks(catalog_path, chunksize)
+    tokenized = iter_tokenized(chunks, column_name, max_context_len)
+    batches = iter_batches(tokenized, batch_size)
+
+    writer = CatalogStoreWriter(store_dir, model=EMBEDDING_MODEL)
+    num_tokens = 0
+    start = time.perf_counter()
+    for batch_number, (rows, embeddings, n_tokens) in enumerate(iter_embedded(batches, num_workers, window), 1):
+        writer.append(rows, embeddings)
+        num_tokens += n_tokens
+        if batch_number % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"embedded={writer.count}, tokens={num_tokens}, items/s={writer.count / elapsed:.1f}")
+    writer.close()
+
+    cost = num_tokens / 1000 * EMBEDDING_COST_PER_1K_TOKENS
+    print(f"✅ Streamed {writer.count} items ({num_tokens} tokens, {cost:.2f} USD) into {store_dir}")
+    return store_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a large catalog CSV into the catalog store")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--column", default="productDisplayName")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--chunksize", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--window", type=int, default=16)
+    args = parser.parse_args()
+
+    stream_embed_catalog(
+        catalog_path=args.catalog,
+        column_name=args.column,
+        store_dir=args.store_dir,
+        chunksize=args.chunksize,
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        window=args.window,
+    )
@@ -17,10 +17,10 @@ import tiktoken
 from tqdm import tqdm
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 from IPython.display import Image, display, HTML
-from openai import OpenAI
 
 # Local Application Imports
 from config import GPT_MODEL, EMBEDDING_MODEL
+from utils import openai_client
 
-# Initialize OpenAI client - Need to add API key
-client = OpenAI()
\ No newline at end of file
+# Shared OpenAI client (connection pool + rate limits) - Need to set OPENAI_API_KEY
+client = openai_client.get_shared_client().client
\ No newline at end of file
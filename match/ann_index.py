@@ -0,0 +1,251 @@
+"""
+ann_index.py
+Approximate nearest-neighbour search for large catalogs. Implements an inverted-file (IVF) index in
+pure NumPy: catalog vectors are clustered with spherical k-means, and a query only scores the rows of
+its `nprobe` closest clusters. Exposes the same search interface as VectorIndex, so it plugs into
+find_similar_items and CatalogIndex unchanged. Small catalogs fall back to exact brute-force search.
+"""
+
+# Standard library imports
+import argparse
+import time
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from match.quantization import QuantizedIndex
+from match.vector_index import VectorIndex, normalize_rows, top_k_above_threshold
+
+# Below this many items brute force is both exact and fast enough
+MIN_ANN_SIZE = 50_000
+
+# Rows scored per block during clustering/assignment, bounds the temporary score matrix
+ASSIGN_BLOCK = 65_536
+
+
+def _assign(matrix, centroids):
+    """Index of the most similar centroid for every row, computed block by block"""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), ASSIGN_BLOCK):
+        block = np.asarray(matrix[start:start + ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(matrix, n_lists, n_iter=10, sample_size=100_000, seed=0):
+    """
+    Cluster unit vectors by cosine similarity. Trains on a random sample of at most `sample_size` rows.
+    """
+    rng = np.random.default_rng(seed)
+    sample_ids = rng.choice(len(matrix), size=min(sample_size, len(matrix)), replace=False)
+    sample = np.asarray(matrix[np.sort(sample_ids)], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        sums = np.zeros_like(centroids)
+        non_empty = counts > 0
+        sums[non_empty] = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+
+        # Re-seed empty clusters from random sample points so every list stays usable
+        empty = np.flatnonzero(~non_empty)
+        sums[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized vectors.
+
+    Args:
+        matrix: (n_items, dim) float32 matrix of unit vectors (e.g. the memory-mapped catalog store)
+        centroids: (n_lists, dim) cluster centroids
+        list_offsets: CSR offsets into `list_rows`, one slice per cluster
+        list_rows: row ids grouped by cluster, ascending within each cluster
+        nprobe: number of clusters scanned per query (higher = better recall, slower)
+    """
+
+    def __init__(self, matrix, centroids, list_offsets, list_rows, nprobe=8):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, nprobe=8, n_iter=10, sample_size=100_000, seed=0):
+        """
+        Cluster `matrix` and build the inverted lists. `n_lists` defaults to about 4 * sqrt(n_items).
+        """
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(len(matrix))))
+        n_lists = min(n_lists, len(matrix), sample_size)
+
+        centroids = spherical_kmeans(matrix, n_lists, n_iter=n_iter, sample_size=sample_size, seed=seed)
+        labels = _assign(matrix, centroids)
+        list_rows = np.argsort(labels, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=n_lists)))).astype(np.int64)
+        return cls(matrix, centroids, list_offsets, list_rows, nprobe=nprobe)
+
+    def save(self, path, fingerprint=""):
+        """
+        Save the index structure. The vectors themselves stay in the catalog store, whose `store_fingerprint`
+        is recorded so a rewritten store is detected at load time.
+        """
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+            nprobe=self.nprobe,
+            fingerprint=fingerprint,
+        )
+
+    @classmethod
+    def load(cls, path, matrix, nprobe=None, fingerprint=None):
+        """
+        Load an index saved with `save` on top of the same `matrix` it was built from.
+        Raises ValueError when it was built for other catalog contents (`fingerprint` or item count differ).
+        """
+        data = np.load(path)
+        if fingerprint is not None and ("fingerprint" not in data.files or str(data["fingerprint"]) != fingerprint):
+            raise ValueError(f"Index at {path} was built for other catalog contents")
+        if int(data["list_offsets"][-1]) != len(matrix):
+            raise ValueError(f"Index at {path} was built for {int(data['list_offsets'][-1])} items, got {len(matrix)}")
+        return cls(
+            matrix,
+            data["centroids"],
+            data["list_offsets"],
+            data["list_rows"],
+            nprobe=int(data["nprobe"]) if nprobe is None else nprobe,
+        )
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def vectors(self, rows):
+        """float32 unit vectors of the given row ids"""
+        return np.asarray(self.matrix[np.asarray(rows)], dtype=np.float32)
+
+    def candidates(self, query, nprobe=None):
+        """Sorted row ids in the `nprobe` clusters closest to `query`"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        lists = [self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe]
+        return np.sort(np.concatenate(lists))
+
+    def search(self, query, threshold=0.5, top_k=2, rows=None, nprobe=None):
+        return self.search_batch(np.ravel(query), threshold=threshold, top_k=top_k, rows=rows, nprobe=nprobe)[0]
+
+    def search_batch(self, queries, threshold=0.5, top_k=2, rows=None, nprobe=None):
+        """
+        Approximate top-k (row id, score) pairs per query. `rows` restricts results to a sorted array
+        of row ids, same as VectorIndex.search_batch.
+        """
+        queries = normalize_rows(queries, dtype=np.float32)
+        # Membership mask of the allowed rows, built once per call: one gather per query instead of a set intersection
+        mask = None
+        if rows is not None:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[rows] = True
+
+        results = []
+        for query in queries:
+            candidates = self.candidates(query, nprobe)
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+
+            scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+            results.append(
+                [(int(candidates[i]), score) for i, score in top_k_above_threshold(scores, threshold, top_k)]
+            )
+        return results
+
+
+def build_index(matrix, backend="auto", normalized=True, quantization="none", dims=None, rerank=50, **params):
+    """
+    Build a search index over `matrix`.
+
+    Args:
+        backend: "exact" (brute force), "ivf", or "auto" (IVF only for catalogs of MIN_ANN_SIZE items or more)
+        normalized: whether the rows of `matrix` are already unit length
+        quantization: "none", "float16" or "int8"; the exact backend then scans compact codes (QuantizedIndex)
+        dims: Matryoshka truncation of the quantized codes (None = all dims)
+        rerank: candidates re-scored on the float32 vectors by a QuantizedIndex (0 = none)
+        params: forwarded to IVFIndex.build (n_lists, nprobe, n_iter, sample_size, seed)
+    """
+    if backend == "auto":
+        backend = "ivf" if len(matrix) >= MIN_ANN_SIZE else "exact"
+
+    if backend == "exact" and quantization != "none":
+        matrix = matrix if normalized else normalize_rows(matrix)
+        return QuantizedIndex.build(matrix, quantization, dims, rerank=rerank)
+    if backend == "exact":
+        return VectorIndex(matrix, normalized=normalized)
+    if backend == "ivf":
+        matrix = matrix if normalized else normalize_rows(matrix)
+        return IVFIndex.build(matrix, **params)
+    raise ValueError(f"Unknown search backend: {backend}")
+
+
+def recall_at_k(index, exact_index, queries, k=10):
+    """
+    Mean fraction of the exact top-k neighbours that `index` also returns, over all `queries`.
+    """
+    approx = index.search_batch(queries, threshold=-1.0, top_k=k)
+    exact = exact_index.search_batch(queries, threshold=-1.0, top_k=k)
+    hits = [
+        len({i for i, _ in approx_row} & {i for i, _ in exact_row}) / max(len(exact_row), 1)
+        for approx_row, exact_row in zip(approx, exact)
+    ]
+    return float(np.mean(hits))
+
+
+if __name__ == "__main__":
+    from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog, store_fingerprint
+
+    parser = argparse.ArgumentParser(description="Build an IVF index over the catalog store and measure recall@k")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--output", default=f"{DEFAULT_STORE_DIR}/ivf_index.npz")
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    metadata_df, matrix = load_catalog(args.store_dir)
+    start = time.perf_counter()
+    ivf = IVFIndex.build(matrix, n_lists=args.n_lists)
+    print(f"Built IVF index with {len(ivf.centroids)} lists over {len(matrix)} items in {time.perf_counter() - start:.1f}s")
+
+    # Queries: catalog vectors with a little noise, so the exact neighbours are not trivially themselves
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)
+    queries = np.asarray(matrix[np.sort(query_ids)]) + rng.normal(scale=0.02, size=(len(query_ids), matrix.shape[1]))
+    exact = VectorIndex(matrix, normalized=True)
+
+    start = time.perf_counter()
+    exact.search_batch(queries, threshold=-1.0, top_k=args.k)
+    print(f"exact        {(time.perf_counter() - start) * 1000 / len(queries):.2f} ms/query")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        start = time.perf_counter()
+        ivf.search_batch(queries, threshold=-1.0, top_k=args.k)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"nprobe={nprobe:<4} {elapsed_ms:.2f} ms/query  recall@{args.k}={recall_at_k(ivf, exact, queries, k=args.k):.3f}")
+
+    # Keep the default nprobe in the saved index; tune it at load time via IVFIndex.load(..., nprobe=...)
+    ivf.nprobe = 8
+    ivf.save(args.output, fingerprint=store_fingerprint(args.store_dir, metadata_df))
+    print(f"✅ Saved index to {args.output}")
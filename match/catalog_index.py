@@ -0,0 +1,230 @@
+"""
+catalog_index.py
+Catalog index built once at load time. Holds the shared embedding matrix plus precomputed row-id arrays
+per gender and per articleType, so the "same gender (or unisex), different category" filter becomes a
+cheap set operation on row ids instead of a DataFrame copy on every request. In hybrid retrieval mode a BM25
+index over the catalog text is built along with it, for lexical + vector search.
+"""
+
+# Standard library imports
+import os
+import threading
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from config import (
+    HYBRID_LEXICAL_CANDIDATES,
+    IVF_NPROBE,
+    RERANK_CANDIDATES,
+    RETRIEVAL_MODE,
+    RRF_K,
+    SEARCH_BACKEND,
+    SEARCH_DIMENSIONS,
+    SEARCH_QUANTIZATION,
+)
+from match.ann_index import IVFIndex, MIN_ANN_SIZE, build_index
+from match.lexical_index import BM25Index, reciprocal_rank_fusion
+from match.quantization import QuantizedIndex
+from match.vector_index import VectorIndex, normalize_rows
+from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog, store_exists, store_fingerprint
+
+PARTITION_COLUMNS = ("gender", "articleType")
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+
+class CatalogIndex:
+    """
+    Embedding matrix + per-attribute row partitions for one catalog DataFrame.
+    Row ids are positional (what `styles_df.iloc` expects). `embeddings`, when given, must be
+    L2-normalized float32 rows; `index` can be a prebuilt (e.g. loaded IVF) index over them.
+    """
+
+    def __init__(self, styles_df, embeddings=None, backend=SEARCH_BACKEND, index=None):
+        self.styles_df = styles_df
+        if index is not None:
+            self.index = index
+        else:
+            if embeddings is None:
+                embeddings = normalize_rows(np.stack(styles_df["embeddings"].to_numpy()))
+            self.index = build_index(
+                embeddings,
+                backend=backend,
+                quantization=SEARCH_QUANTIZATION,
+                dims=SEARCH_DIMENSIONS,
+                rerank=RERANK_CANDIDATES,
+                nprobe=IVF_NPROBE,
+            )
+
+        # {column: {value: sorted row ids}}
+        self.partitions = {
+            column: {value: np.asarray(rows, dtype=np.int64) for value, rows in styles_df.groupby(column).indices.items()}
+            for column in PARTITION_COLUMNS
+            if column in styles_df.columns
+        }
+        self._lexical = None
+        self._lexical_lock = threading.Lock()
+        self._id_order = None
+
+    def __len__(self):
+        return len(self.styles_df)
+
+    @property
+    def lexical(self):
+        """BM25 index over the catalog text (built by build_catalog_index in hybrid mode, otherwise on first use)"""
+        with self._lexical_lock:
+            if self._lexical is None:
+                self._lexical = BM25Index(self.styles_df)
+        return self._lexical
+
+    def rows_for(self, column, value):
+        """Sorted row ids whose `column` equals `value`"""
+        return self.partitions.get(column, {}).get(value, EMPTY_ROWS)
+
+    def rows_for_ids(self, item_ids):
+        """Row ids of the given item ids, in order (ids not in the catalog are dropped)"""
+        ids = self.styles_df["id"].to_numpy(dtype=np.int64)
+        if not len(ids):
+            return EMPTY_ROWS
+        if self._id_order is None:
+            self._id_order = np.argsort(ids, kind="stable")
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(ids, item_ids, sorter=self._id_order), len(ids) - 1)
+        rows = self._id_order[positions]
+        return rows[ids[rows] == item_ids]
+
+    def filter_rows(self, gender=None, exclude_category=None):
+        """
+        Row ids for items of `gender` or 'Unisex', excluding the `exclude_category` articleType.
+        Cost is proportional to the number of matching rows, not the catalog size.
+        """
+        if gender is None:
+            rows = np.arange(len(self), dtype=np.int64)
+        else:
+            rows = np.union1d(self.rows_for("gender", gender), self.rows_for("gender", "Unisex"))
+
+        if exclude_category is not None:
+            rows = np.setdiff1d(rows, self.rows_for("articleType", exclude_category), assume_unique=True)
+        return rows
+
+    def view(self, gender=None, exclude_category=None):
+        """Filtered view over the shared catalog (no DataFrame or embedding copies)"""
+        return CatalogView(self, self.filter_rows(gender, exclude_category))
+
+
+class CatalogView:
+    """
+    A subset of catalog rows backed by the parent CatalogIndex.
+    """
+
+    def __init__(self, catalog, rows):
+        self.catalog = catalog
+        self.rows = rows
+        self._lexical_mask = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search_batch(self, queries, threshold=0.5, top_k=2):
+        """Top-k (row id, score) pairs per query, restricted to this view"""
+        rows = None if len(self.rows) == len(self.catalog) else self.rows
+        return self.catalog.index.search_batch(queries, threshold=threshold, top_k=top_k, rows=rows)
+
+    def hybrid_search_batch(self, queries, texts, threshold=0.5, top_k=2,
+                            lexical_candidates=HYBRID_LEXICAL_CANDIDATES, rrf_k=RRF_K):
+        """
+        Top-k (row id, score) pairs per (query vector, query text), restricted to this view. Vectors are scored
+        only against the best `lexical_candidates` BM25 matches of the text; if fewer than `top_k` of those pass
+        `threshold`, the whole view is searched instead. Items above the threshold are ranked by reciprocal rank
+        fusion of their vector and BM25 ranks; scores returned are cosine similarities.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        index = self.catalog.index
+        rows = None if len(self.rows) == len(self.catalog) else self.rows
+        lexical = self.catalog.lexical
+        if rows is not None and self._lexical_mask is None:
+            self._lexical_mask = lexical.row_mask(rows)
+
+        results, lexical_rankings, fallback = [], [], []
+        for position, (query, text) in enumerate(zip(queries, texts)):
+            lexical_rows, _ = lexical.search(text, top_n=lexical_candidates, mask=self._lexical_mask)
+            vector_hits = []
+            if len(lexical_rows):
+                candidates = np.sort(lexical_rows)
+                vector_hits = index.search_batch(query[None, :], threshold=threshold, top_k=len(candidates), rows=candidates)[0]
+            if len(vector_hits) < top_k:
+                fallback.append(position)
+            results.append(vector_hits)
+            lexical_rankings.append(lexical_rows)
+
+        # Descriptions with too few lexical candidates: one batched search over the whole view
+        if fallback:
+            fallback_hits = index.search_batch(queries[fallback], threshold=threshold, top_k=lexical_candidates, rows=rows)
+            for position, vector_hits in zip(fallback, fallback_hits):
+                results[position] = vector_hits
+
+        for position, vector_hits in enumerate(results):
+            fused = reciprocal_rank_fusion([[row for row, _ in vector_hits], lexical_rankings[position]], k=rrf_k)
+            results[position] = sorted(vector_hits, key=lambda hit: (-fused[hit[0]], -hit[1]))[:top_k]
+        return results
+
+    def vectors(self, rows):
+        """Unit vectors of the given catalog row ids"""
+        return self.catalog.index.vectors(rows)
+
+    def record(self, row):
+        """Catalog row as a dict, same shape as `styles_df.iloc[row].to_dict()`"""
+        return self.catalog.styles_df.iloc[row].to_dict()
+
+
+def frame_view(styles_df):
+    """
+    Unfiltered view over an ad-hoc (e.g. already filtered) catalog DataFrame, indexed per call: exact float32 search
+    over its `embeddings` column, whatever SEARCH_BACKEND and SEARCH_QUANTIZATION say (building an IVF or quantized
+    index per call would cost more than it saves). Search it in "vector" mode, so no BM25 index is built either.
+    """
+    index = VectorIndex(np.stack(styles_df["embeddings"].to_numpy()))
+    return CatalogIndex(styles_df, index=index).view()
+
+
+def quantized_index_file(quantization=SEARCH_QUANTIZATION, dims=SEARCH_DIMENSIONS):
+    """File name of a saved QuantizedIndex for these settings inside the catalog store"""
+    return f"quantized_{quantization}_{dims or 'full'}.npz"
+
+
+def build_catalog_index(styles_df, store_dir=DEFAULT_STORE_DIR, mode=RETRIEVAL_MODE):
+    """
+    Build the CatalogIndex for a loaded catalog. When the frame came from the binary catalog store,
+    the memory-mapped matrix is used directly instead of stacking the embeddings column, and a saved
+    IVF index (`python -m match.ann_index`) or quantized index (`python -m match.quantization --save`)
+    is loaded instead of being rebuilt, as long as it was built for the store's current contents.
+    In "hybrid" `mode` the BM25 index is built here too, so the first query does not pay for it.
+    """
+    catalog = _load_catalog_index(styles_df, store_dir)
+    if mode == "hybrid":
+        catalog.lexical  # property access builds and keeps the BM25 index
+    return catalog
+
+
+def _load_catalog_index(styles_df, store_dir):
+    if store_exists(store_dir):
+        metadata_df, embeddings = load_catalog(store_dir)
+        if len(metadata_df) == len(styles_df) and (metadata_df["id"].to_numpy() == styles_df["id"].to_numpy()).all():
+            ivf_path = os.path.join(store_dir, "ivf_index.npz")
+            quantized_path = os.path.join(store_dir, quantized_index_file())
+            use_ivf = SEARCH_BACKEND == "ivf" or (SEARCH_BACKEND == "auto" and len(embeddings) >= MIN_ANN_SIZE)
+            try:
+                if use_ivf and os.path.exists(ivf_path):
+                    index = IVFIndex.load(ivf_path, embeddings, nprobe=IVF_NPROBE,
+                                          fingerprint=store_fingerprint(store_dir, metadata_df))
+                    return CatalogIndex(styles_df, embeddings, index=index)
+                if not use_ivf and SEARCH_QUANTIZATION != "none" and os.path.exists(quantized_path):
+                    rerank_matrix = embeddings if RERANK_CANDIDATES else None
+                    index = QuantizedIndex.load(quantized_path, rerank_matrix, rerank=RERANK_CANDIDATES,
+                                                fingerprint=store_fingerprint(store_dir, metadata_df))
+                    return CatalogIndex(styles_df, embeddings, index=index)
+            except ValueError as e:
+                print(f"⚠️ {e}; rebuilding it in memory (re-run the index job to save a fresh one)")
+            return CatalogIndex(styles_df, embeddings)
+    return CatalogIndex(styles_df)
@@ -0,0 +1,277 @@
+"""
+compatibility_graph.py
+Precomputed outfit-compatibility graph over the catalog. For every item, an offline job stores its top-N neighbours
+among the items the live pipeline would consider (other articleTypes, same gender or Unisex), ranked by the similarity
+of their product-name embeddings, with a cap per articleType so neighbours span the outfit. Name similarity is not
+outfit compatibility: run with `--verify` to keep only edges the guardrail accepts. Edges are CSR arrays keyed by item id, optionally with cached
+guardrail verdicts, next to the dHash of each catalog image. When an upload is (nearly) identical to a catalog image,
+recommendations come straight from the graph: no vision call, retrieval or per-pair guardrail at request time.
+
+    python -m match.compatibility_graph --top-n 20 --image-dir data/sample_clothes/sample_images [--verify]
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import threading
+import time
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+from PIL import Image
+from tqdm import tqdm
+
+# Local application imports
+from config import GRAPH_MATCH_MAX_DISTANCE, GRAPH_RECOMMENDATIONS
+from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog
+from utils.image_hash import dhash, dhash_base64, hamming_distances, to_signed64
+
+GRAPH_FILE = "compatibility_graph.npz"
+# Similarity block scored at once while building (elements of a float32 (block, n_items) matrix)
+BUILD_BLOCK_ELEMENTS = 1 << 24
+# Edge verdicts: unknown (not checked, or the check failed), guardrail said no, guardrail said yes
+VERDICT_UNKNOWN, VERDICT_NO, VERDICT_YES = -1, 0, 1
+
+
+class CompatibilityGraph:
+    """
+    Item-id keyed adjacency lists. Node i is `item_ids[i]` (sorted); its edges are
+    `neighbors[indptr[i]:indptr[i + 1]]` with `scores`, `neighbor_types` (codes into `type_names`) and `verdicts`.
+    `image_hashes` holds the catalog image dHash per node (valid where `has_image`).
+    """
+
+    def __init__(self, item_ids, indptr, neighbors, scores, neighbor_types, type_names,
+                 verdicts=None, image_hashes=None, has_image=None):
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+        self.neighbor_types = neighbor_types
+        self.type_names = type_names
+        self.verdicts = verdicts if verdicts is not None else np.full(len(neighbors), VERDICT_UNKNOWN, dtype=np.int8)
+        self.image_hashes = image_hashes if image_hashes is not None else np.zeros(len(item_ids), dtype=np.int64)
+        self.has_image = has_image if has_image is not None else np.zeros(len(item_ids), dtype=bool)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.neighbors)
+
+    @classmethod
+    def build(cls, styles_df, matrix, top_n=20, max_per_type=3):
+        """
+        Top `top_n` neighbours per item by cosine similarity of the L2-normalized `matrix` rows, restricted to
+        other articleTypes and to the item's gender or Unisex, with at most `max_per_type` per articleType.
+        """
+        n_items = len(styles_df)
+        ids = styles_df["id"].to_numpy(dtype=np.int64)
+        genders = pd.Categorical(styles_df["gender"])
+        gender_codes = genders.codes
+        unisex = genders.categories.get_loc("Unisex") if "Unisex" in genders.categories else -2
+        types = pd.Categorical(styles_df["articleType"])
+        type_codes = types.codes.astype(np.int16)
+
+        # Per-type cap: look at enough candidates that `top_n` usually survive it
+        shortlist = min(n_items - 1, top_n * 4) if n_items > 1 else 0
+        edges = [None] * n_items
+        block = max(1, BUILD_BLOCK_ELEMENTS // max(n_items, 1))
+        for start in tqdm(range(0, n_items, block), desc="Building compatibility graph"):
+            end = min(start + block, n_items)
+            scores = np.asarray(matrix[start:end], dtype=np.float32) @ np.asarray(matrix, dtype=np.float32).T
+            allowed = (gender_codes[None, :] == gender_codes[start:end, None]) | (gender_codes[None, :] == unisex)
+            allowed &= type_codes[None, :] != type_codes[start:end, None]
+            scores[~allowed] = -np.inf
+
+            if shortlist:
+                top = np.argpartition(-scores, shortlist - 1, axis=1)[:, :shortlist]
+            else:
+                top = np.empty((end - start, 0), dtype=np.int64)
+            for offset, candidates in enumerate(top):
+                row_scores = scores[offset, candidates]
+                candidates = candidates[np.isfinite(row_scores)]
+                candidates = candidates[np.argsort(-scores[offset, candidates], kind="stable")]
+                kept, per_type = [], {}
+                for candidate in candidates:
+                    type_code = type_codes[candidate]
+                    if per_type.get(type_code, 0) < max_per_type:
+                        per_type[type_code] = per_type.get(type_code, 0) + 1
+                        kept.append(candidate)
+                        if len(kept) == top_n:
+                            break
+                kept = np.asarray(kept, dtype=np.int64)
+                edges[start + offset] = (kept, scores[offset, kept])
+
+        # Lay the adjacency lists out in item-id order
+        order = np.argsort(ids, kind="stable")
+        lengths = np.array([len(edges[row][0]) for row in order], dtype=np.int64)
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        rows = np.concatenate([edges[row][0] for row in order]) if n_items else np.empty(0, dtype=np.int64)
+        scores = np.concatenate([edges[row][1] for row in order]) if n_items else np.empty(0, dtype=np.float32)
+        return cls(
+            item_ids=ids[order],
+            indptr=indptr,
+            neighbors=ids[rows],
+            scores=scores.astype(np.float16),
+            neighbor_types=type_codes[rows],
+            type_names=np.asarray(types.categories, dtype=str),
+        )
+
+    def save(self, path):
+        np.savez(
+            path,
+            item_ids=self.item_ids,
+            indptr=self.indptr,
+            neighbors=self.neighbors,
+            scores=self.scores,
+            neighbor_types=self.neighbor_types,
+            type_names=self.type_names,
+            verdicts=self.verdicts,
+            image_hashes=self.image_hashes,
+            has_image=self.has_image,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def node(self, item_id):
+        """Position of `item_id` in `item_ids`, or None"""
+        position = int(np.searchsorted(self.item_ids, item_id))
+        if position < len(self.item_ids) and self.item_ids[position] == item_id:
+            return position
+        return None
+
+    def edges(self, item_id):
+        """[(neighbor id, score, articleType, verdict)] of an item, best first"""
+        position = self.node(item_id)
+        if position is None:
+            return []
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return [
+            (int(neighbor), float(score), str(self.type_names[type_code]), int(verdict))
+            for neighbor, score, type_code, verdict in zip(
+                self.neighbors[start:end], self.scores[start:end], self.neighbor_types[start:end], self.verdicts[start:end]
+            )
+        ]
+
+    def recommend(self, item_id, limit=GRAPH_RECOMMENDATIONS):
+        """
+        Up to `limit` neighbours, one per articleType: guardrail-approved edges first, rejected edges never.
+        Returns [(neighbor id, score, verdict)].
+        """
+        ranked = sorted(
+            (edge for edge in self.edges(item_id) if edge[3] != VERDICT_NO),
+            key=lambda edge: edge[3] != VERDICT_YES,
+        )
+        outfit, used_types = [], set()
+        for neighbor, score, article_type, verdict in ranked:
+            if article_type not in used_types:
+                used_types.add(article_type)
+                outfit.append((neighbor, score, verdict))
+                if len(outfit) == limit:
+                    break
+        return outfit
+
+    def set_image_hashes(self, image_dir):
+        """dHash every catalog image `<image_dir>/<id>.jpg` that exists"""
+        for position, item_id in enumerate(tqdm(self.item_ids, desc="Hashing catalog images")):
+            path = os.path.join(image_dir, f"{item_id}.jpg")
+            if os.path.exists(path):
+                with Image.open(path) as image:
+                    self.image_hashes[position] = to_signed64(dhash(image))
+                self.has_image[position] = True
+
+    def find_item(self, image_base64, max_distance=GRAPH_MATCH_MAX_DISTANCE):
+        """
+        Id of the catalog item whose image is within `max_distance` dHash bits of the upload, or None.
+        Ties (e.g. several plain images hashing alike) are treated as no match rather than guessed.
+        """
+        if not self.has_image.any():
+            return None
+        candidates = np.flatnonzero(self.has_image)
+        distances = hamming_distances(dhash_base64(image_base64), self.image_hashes[candidates])
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance or np.count_nonzero(distances == distances[best]) > 1:
+            return None
+        return int(self.item_ids[candidates[best]])
+
+    def verify_edges(self, image_dir, limit=None):
+        """
+        Run the guardrail on the edges of up to `limit` items with images and store the verdicts
+        (the verdict cache makes re-runs free for edges checked before).
+        """
+        from utils.guardrails import check_matches
+        from utils.image_prep import candidate_thumbnail, encode_image_file
+
+        checked = 0
+        for position in tqdm(np.flatnonzero(self.has_image)[:limit], desc="Verifying edges"):
+            reference = encode_image_file(os.path.join(image_dir, f"{self.item_ids[position]}.jpg"))
+            start, end = self.indptr[position], self.indptr[position + 1]
+            edge_of, candidates = {}, {}
+            for edge in range(start, end):
+                neighbor = int(self.neighbors[edge])
+                path = os.path.join(image_dir, f"{neighbor}.jpg")
+                if os.path.exists(path):
+                    edge_of[neighbor] = edge
+                    candidates[neighbor] = lambda neighbor=neighbor, path=path: candidate_thumbnail(neighbor, path)
+            for neighbor, match_result, error in check_matches(reference, candidates):
+                self.verdicts[edge_of[neighbor]] = _verdict_code(match_result, error)
+                checked += 1
+        return checked
+
+
+def _verdict_code(match_result, error):
+    if error is not None or match_result is None:
+        return VERDICT_UNKNOWN
+    try:
+        answer = json.loads(match_result)["answer"]
+    except (json.JSONDecodeError, TypeError, KeyError):
+        return VERDICT_UNKNOWN
+    return {"yes": VERDICT_YES, "no": VERDICT_NO}.get(answer, VERDICT_UNKNOWN)
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_compatibility_graph(store_dir=DEFAULT_STORE_DIR):
+    """The saved graph of a catalog store (loaded once per process), or None if it was never built"""
+    with _graphs_lock:
+        if store_dir not in _graphs:
+            path = os.path.join(store_dir, GRAPH_FILE)
+            _graphs[store_dir] = CompatibilityGraph.load(path) if os.path.exists(path) else None
+    return _graphs[store_dir]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the outfit-compatibility graph of a catalog store")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--top-n", type=int, default=20, help="Neighbours kept per item")
+    parser.add_argument("--max-per-type", type=int, default=3, help="Neighbours kept per articleType")
+    parser.add_argument("--image-dir", default="data/sample_clothes/sample_images",
+                        help="Catalog images <id>.jpg, hashed to recognise uploads of catalog items")
+    parser.add_argument("--verify", action="store_true", help="Run the guardrail on every edge and store the verdicts")
+    parser.add_argument("--verify-limit", type=int, help="Only verify the edges of this many items")
+    args = parser.parse_args()
+
+    metadata_df, embeddings = load_catalog(args.store_dir)
+    start = time.perf_counter()
+    graph = CompatibilityGraph.build(metadata_df, embeddings, top_n=args.top_n, max_per_type=args.max_per_type)
+    print(f"items={len(graph)}, edges={graph.n_edges}, build_s={time.perf_counter() - start:.1f}")
+    if os.path.isdir(args.image_dir):
+        graph.set_image_hashes(args.image_dir)
+        print(f"catalog images hashed: {int(graph.has_image.sum())}")
+        if args.verify:
+            print(f"edges verified: {graph.verify_edges(args.image_dir, args.verify_limit)}")
+    elif args.verify:
+        print(f"⚠️ No catalog images in {args.image_dir}, skipping verification")
+
+    path = os.path.join(args.store_dir, GRAPH_FILE)
+    graph.save(path)
+    print(f"✅ Compatibility graph written to {path}")
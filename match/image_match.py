@@ -11,14 +11,14 @@ item_gender = image_analysis['gender']
 
 
 # Filter data such that we only look through the items of the same gender (or unisex) and different category
-filtered_items = styles_df.loc[styles_df['gender'].isin([item_gender, 'Unisex'])]
-filtered_items = filtered_items[filtered_items['articleType'] != item_category]
+# (row-id view over the catalog index built once at load time, e.g. `catalog = build_catalog_index(styles_df)`)
+filtered_items = catalog.view(gender=item_gender, exclude_category=item_category)
 print(str(len(filtered_items)) + " Remaining Items")
 
-# Find the most similar items based on the input item descriptions
-matching_items = find_matching_items_with_rag(filtered_items, item_descs)
+# Assemble one deduplicated outfit from the input item descriptions (see match/outfit_search.py)
+matching_items = find_outfit(filtered_items, item_descs)
 
-# Display the matching items (this will display 2 items for each description in the image analysis)
+# Display the matching outfit (at most one item for each description in the image analysis)
 html = ""
 paths = []
 for i, item in enumerate(matching_items):
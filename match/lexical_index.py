@@ -0,0 +1,151 @@
+"""
+lexical_index.py
+In-memory BM25 inverted index over the catalog's text columns (productDisplayName plus the structured attributes
+baseColour, articleType, subCategory, usage, season). The descriptions `analyze_image` returns name colours, styles
+and garment types explicitly ("Navy Blue Men's Formal Shirt"), which exact term matching scores sharply and embeddings
+only approximately. Postings are stored CSR-style (one sorted row-id array and one weighted term-frequency array per
+term), so a query costs time proportional to the postings of its terms, not the catalog size.
+`reciprocal_rank_fusion` merges its ranking with the vector ranking.
+"""
+
+# Standard library imports
+import re
+from collections import Counter
+
+# 3P Imports
+import numpy as np
+
+# Term-frequency weight per indexed column: attribute columns are short, exact labels, so a hit counts double
+FIELD_WEIGHTS = {
+    "productDisplayName": 1.0,
+    "baseColour": 2.0,
+    "articleType": 2.0,
+    "subCategory": 1.0,
+    "usage": 1.0,
+    "season": 0.5,
+}
+STOPWORDS = frozenset({"a", "an", "and", "for", "in", "of", "on", "the", "to", "with", "s"})
+# Query terms found in more than this share of the catalog (e.g. "men") are skipped when rarer terms are present:
+# they barely change the ranking but have the longest postings
+MAX_DOCUMENT_FRACTION = 0.5
+
+
+def stem(token):
+    """Crude plural folding, so "shirts"/"shirt" and "jeans"/"jean" match"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lower-cased, plural-folded word tokens without stopwords ("Men's" -> "men")"""
+    return [stem(token) for token in re.findall(r"[a-z0-9]+", str(text).lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    BM25 over the FIELD_WEIGHTS columns of a catalog DataFrame (columns it lacks are skipped).
+    Row ids are positional, matching CatalogIndex.
+    """
+
+    def __init__(self, styles_df, field_weights=None, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        field_weights = field_weights or FIELD_WEIGHTS
+        fields = [(column, weight) for column, weight in field_weights.items() if column in styles_df.columns]
+        columns = [styles_df[column].fillna("").astype(str).to_numpy() for column, _ in fields]
+
+        self.vocabulary = {}
+        doc_ids, term_ids, frequencies = [], [], []
+        self.doc_lengths = np.zeros(len(styles_df), dtype=np.float32)
+        for row in range(len(styles_df)):
+            counts = Counter()
+            for (_, weight), values in zip(fields, columns):
+                for token in tokenize(values[row]):
+                    counts[token] += weight
+            for token, count in counts.items():
+                doc_ids.append(row)
+                term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                frequencies.append(count)
+            self.doc_lengths[row] = sum(counts.values())
+
+        # CSR layout: postings of term t are doc_ids[indptr[t]:indptr[t + 1]], sorted by row id
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.lexsort((np.asarray(doc_ids, dtype=np.int64), term_ids))
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)[order]
+        self.frequencies = np.asarray(frequencies, dtype=np.float32)[order]
+        self.indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)), out=self.indptr[1:])
+
+        n_docs = max(len(styles_df), 1)
+        document_frequency = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        self.average_length = float(self.doc_lengths.mean()) if len(styles_df) else 0.0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def row_mask(self, rows):
+        """Boolean membership mask for a set of row ids, reusable across `search` calls"""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def search(self, text, top_n=100, rows=None, mask=None):
+        """
+        Top `top_n` (row ids, scores) for `text`, best first, optionally restricted to the row ids `rows`
+        (or, cheaper when searching one subset repeatedly, to a precomputed `row_mask(rows)`).
+        Rows sharing no term with the query are never returned.
+        """
+        term_ids = {self.vocabulary[token] for token in tokenize(text) if token in self.vocabulary}
+        selective = {term_id for term_id in term_ids if self.indptr[term_id + 1] - self.indptr[term_id] <= MAX_DOCUMENT_FRACTION * len(self)}
+        term_ids = selective or term_ids
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Membership mask of the allowed rows: one gather per term instead of a set intersection
+        if mask is None and rows is not None:
+            mask = self.row_mask(rows)
+
+        docs, contributions = [], []
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            postings, tf = self.doc_ids[start:end], self.frequencies[start:end]
+            if mask is not None:
+                keep = mask[postings]
+                postings, tf = postings[keep], tf[keep]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[postings] / self.average_length)
+            docs.append(postings)
+            contributions.append(self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm))
+
+        docs, contributions = np.concatenate(docs), np.concatenate(contributions)
+        if not len(docs):
+            return docs, np.empty(0, dtype=np.float32)
+
+        # Accumulate per row: densely when the postings cover a good part of the catalog, else via a sort
+        if 8 * len(docs) >= len(self):
+            dense = np.bincount(docs, weights=contributions, minlength=len(self))
+            unique_docs = np.flatnonzero(dense)
+            scores = dense[unique_docs].astype(np.float32)
+        else:
+            unique_docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+
+        if len(scores) > top_n:
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((unique_docs[top], -scores[top]))]
+        return unique_docs[top], scores[top]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse ranked lists of row ids: score(row) = sum over lists of 1 / (k + rank), rank starting at 1.
+    Returns {row: fused score}.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank)
+    return fused
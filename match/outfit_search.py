@@ -0,0 +1,154 @@
+"""
+outfit_search.py
+Outfit-level retrieval. Rather than searching each suggested description on its own and concatenating the hits
+(which can repeat an item or return two near-identical ones), all descriptions are scored against the filtered
+catalog in one pass and a single outfit is assembled with maximal marginal relevance (MMR): each step adds the
+(description, item) pair that best matches a still-uncovered description while being least similar to the items
+already chosen, with at most one item per articleType. The guardrail stage then only validates this small,
+non-redundant set. `IncrementalOutfit` applies the same score to descriptions arriving one at a time (pipelined match).
+"""
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from config import OUTFIT_CANDIDATES, OUTFIT_MMR_LAMBDA, RETRIEVAL_MODE
+from match.catalog_index import CatalogView, frame_view
+from match.quantization import truncate_dimensions
+from match.search_similar_items import get_embeddings
+from match.vector_index import normalize_rows
+from utils import tracing
+
+
+def mmr_select(relevance, item_similarity, article_types, mmr_lambda=OUTFIT_MMR_LAMBDA):
+    """
+    Greedy MMR assignment of candidates to descriptions.
+
+    Args:
+        relevance: (n_descriptions, n_candidates) similarities, -inf where a candidate does not qualify
+        item_similarity: (n_candidates, n_candidates) similarities between candidates
+        article_types: articleType of each candidate; once one is chosen, its type is used up
+        mmr_lambda: weight of relevance against redundancy with the items already chosen
+
+    Returns [(description index, candidate index)] in selection order, at most one per description.
+    """
+    n_descriptions, n_candidates = relevance.shape
+    article_types = np.asarray(article_types)
+    open_descriptions = np.ones(n_descriptions, dtype=bool)
+    available = np.ones(n_candidates, dtype=bool)
+    redundancy = np.zeros(n_candidates, dtype=np.float32)  # highest similarity to any chosen item
+
+    # Scored only where relevance is finite: at mmr_lambda == 0, 0 * -inf would be NaN and argmax would pick it
+    qualifies = np.isfinite(relevance)
+    relevance = np.where(qualifies, relevance, 0)
+    selected = []
+    while open_descriptions.any() and available.any():
+        scores = np.where(qualifies, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        scores[~open_descriptions] = -np.inf
+        scores[:, ~available] = -np.inf
+        description, candidate = np.unravel_index(np.argmax(scores), scores.shape)
+        if not np.isfinite(scores[description, candidate]):
+            break
+        selected.append((int(description), int(candidate)))
+        open_descriptions[description] = False
+        available &= article_types != article_types[candidate]
+        redundancy = np.maximum(redundancy, item_similarity[candidate])
+    return selected
+
+
+class IncrementalOutfit:
+    """
+    Streaming counterpart of `mmr_select` for descriptions that arrive one at a time: each one is immediately given
+    its best candidate by the same MMR score, against the items chosen for the descriptions before it (one item per
+    articleType). Greedy in arrival order rather than over all pairs, so it can differ from `find_outfit`.
+    """
+
+    def __init__(self, mmr_lambda=OUTFIT_MMR_LAMBDA):
+        self.mmr_lambda = mmr_lambda
+        self.chosen_vectors = []
+        self.used_types = set()
+
+    def pick(self, relevance, vectors, article_types):
+        """
+        Index of the chosen candidate, or None when none qualifies.
+
+        Args:
+            relevance: (n_candidates,) similarity to the description, -inf where a candidate does not qualify
+            vectors: (n_candidates, dim) unit vectors of the candidates
+            article_types: articleType of each candidate
+        """
+        redundancy = np.zeros(len(relevance), dtype=np.float32)
+        if self.chosen_vectors:
+            redundancy = (vectors @ np.stack(self.chosen_vectors).T).max(axis=1)
+        qualifies = np.isfinite(relevance)
+        scores = np.where(
+            qualifies, self.mmr_lambda * np.where(qualifies, relevance, 0) - (1 - self.mmr_lambda) * redundancy, -np.inf
+        )
+        scores[np.isin(np.asarray(article_types), list(self.used_types))] = -np.inf
+        if not len(scores) or not np.isfinite(scores.max()):
+            return None
+        best = int(np.argmax(scores))
+        self.chosen_vectors.append(vectors[best])
+        self.used_types.add(article_types[best])
+        return best
+
+
+def candidate_relevance(queries, vectors):
+    """
+    (n_queries, n_candidates) cosine similarities of unit query vectors to candidate vectors. Queries are truncated
+    to the candidates' dimensions, since a QuantizedIndex without a re-rank matrix returns truncated codes.
+    """
+    return truncate_dimensions(queries, vectors.shape[1]) @ vectors.T
+
+
+def description_candidates(view, queries, texts, threshold=0.6, top_k=OUTFIT_CANDIDATES, mode=RETRIEVAL_MODE):
+    """Per description, its top `top_k` (row, score) hits in the view (hybrid or vector ranking)"""
+    if mode == "hybrid":
+        return view.hybrid_search_batch(queries, texts, threshold=threshold, top_k=top_k)
+    return view.search_batch(queries, threshold=threshold, top_k=top_k)
+
+
+def find_outfit(df_items, item_descs, threshold=0.6, candidates_per_description=OUTFIT_CANDIDATES,
+                mmr_lambda=OUTFIT_MMR_LAMBDA, mode=RETRIEVAL_MODE):
+    """
+    One ranked, deduplicated outfit for the suggested item descriptions: at most one catalog item per description
+    and per articleType, in MMR selection order. Each returned record also carries the `description` it fills and
+    its similarity `score`. `df_items` is either a prefiltered DataFrame (searched exactly, vector mode only) or a
+    CatalogView.
+    """
+    item_descs = list(item_descs)
+    if not item_descs or not len(df_items):
+        return []
+
+    input_embeddings = get_embeddings(item_descs)
+    if input_embeddings is None:
+        return []
+
+    with tracing.span("outfit_search", queries=len(item_descs), mode=mode) as span:
+        if isinstance(df_items, CatalogView):
+            view = df_items
+        else:
+            view, mode = frame_view(df_items), "vector"
+        queries = normalize_rows(np.asarray(input_embeddings, dtype=np.float32))
+        hits = description_candidates(view, queries, item_descs, threshold, candidates_per_description, mode)
+
+        rows = np.unique([row for description_hits in hits for row, _ in description_hits]).astype(np.int64)
+        span.set(candidates=len(rows))
+        if not len(rows):
+            return []
+
+        # Every description against every candidate (a hit for one description may fit another too)
+        vectors = view.vectors(rows)
+        relevance = candidate_relevance(queries, vectors)
+        relevance[relevance < threshold] = -np.inf
+        styles_df = view.catalog.styles_df
+        article_types = styles_df["articleType"].to_numpy()[rows] if "articleType" in styles_df.columns else rows
+        selected = mmr_select(relevance, vectors @ vectors.T, article_types, mmr_lambda)
+
+    with tracing.span("load_records"):
+        outfit = []
+        for description, candidate in selected:
+            record = view.record(rows[candidate])
+            record.update(description=item_descs[description], score=float(relevance[description, candidate]))
+            outfit.append(record)
+    return outfit
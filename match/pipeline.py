@@ -0,0 +1,188 @@
+"""
+pipeline.py
+The full matching pipeline for one reference image, as plain functions: analyze the image, retrieve
+matching catalog items for each suggested description, and validate the candidates with the guardrail.
+Images of known catalog items (recognised by dHash, or by the local image encoder when visual search is set up)
+are answered from the precomputed compatibility graph instead, when one is given.
+Used by the notebook-style demo (run_demo.py) and the headless batch CLI (batch_match.py).
+"""
+
+# Standard library imports
+import json
+import os
+
+# Local application imports
+from analysis import analyze_image
+from config import VISUAL_MATCH_THRESHOLD, VISUAL_SEARCH_MODE
+from match.compatibility_graph import VERDICT_YES
+from match.outfit_search import find_outfit
+from utils import tracing
+from utils.guardrails import check_matches
+from utils.image_prep import candidate_thumbnail, encode_image_file
+
+DEFAULT_IMAGE_DIR = "data/sample_clothes/sample_images"
+
+# Catalog fields copied into batch results (plus the outfit slot each item fills, its similarity and,
+# for graph recommendations, the cached guardrail verdict)
+RESULT_FIELDS = ("id", "productDisplayName", "articleType", "gender", "baseColour", "description", "score", "verdict")
+
+
+def run_image_analysis(encoded_image, subcategories):
+    """
+    Analyze the reference image and return the parsed analysis ({"items", "category", "gender"}).
+    Raises ValueError when no analysis is available or it is not valid JSON.
+    """
+    analysis = analyze_image(encoded_image, subcategories)
+    if analysis is None:
+        raise ValueError("Failed to analyze image (is the OpenAI client configured?)")
+    try:
+        return json.loads(analysis)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ValueError(f"Error parsing analysis result: {e}; raw result: {analysis!r}")
+
+
+def match_from_analysis(catalog, image_analysis):
+    """
+    Outfit matching the analysis: same gender (or unisex), different category, one deduplicated item per
+    suggested description (see match/outfit_search.py). Returns (number of items searched, matching item dicts).
+    """
+    with tracing.span("filter_catalog"):
+        filtered_items = catalog.view(gender=image_analysis["gender"], exclude_category=image_analysis["category"])
+    return len(filtered_items), find_outfit(filtered_items, image_analysis["items"])
+
+
+def catalog_records(catalog, item_ids):
+    """{item id: catalog row dict} for the given ids that are in the catalog"""
+    records = (catalog.styles_df.iloc[row].to_dict() for row in catalog.rows_for_ids(item_ids))
+    return {int(record["id"]): record for record in records}
+
+
+def find_catalog_item(encoded_image, graph=None, visual=None):
+    """
+    The catalog item the image shows, if recognised, and its visual neighbours [(item id, similarity)].
+    An image within a few dHash bits of a catalog image is that item; otherwise, with visual search, so is the
+    nearest catalog image scoring VISUAL_MATCH_THRESHOLD or more (the nearest one at any score in "replace" mode).
+    """
+    visual_hits = visual.search(encoded_image) if visual is not None else []
+    item_id = graph.find_item(encoded_image) if graph is not None else None
+    if item_id is None and visual_hits:
+        best_id, best_score = visual_hits[0]
+        if VISUAL_SEARCH_MODE == "replace" or best_score >= VISUAL_MATCH_THRESHOLD:
+            item_id = best_id
+    return item_id, visual_hits
+
+
+def match_from_graph(catalog, graph, encoded_image, item_id=None):
+    """
+    Recommendations for an image of a known catalog item, straight from the compatibility graph.
+    Pass `item_id` when the item is already known (e.g. from `find_catalog_item`) to skip the dHash lookup.
+    Returns (matched item id, matching item dicts with the edge `score` and cached `verdict`),
+    or (None, []) when the image is not recognised.
+    """
+    with tracing.span("graph_lookup", hit=False) as span:
+        if item_id is None:
+            item_id = graph.find_item(encoded_image)
+        if item_id is None or graph.node(item_id) is None:
+            return None, []
+        span.set(hit=True, item_id=item_id)
+        recommendations = graph.recommend(item_id)
+        records = catalog_records(catalog, [neighbor for neighbor, _, _ in recommendations])
+        matching_items = []
+        for neighbor, score, verdict in recommendations:
+            if neighbor not in records:
+                continue
+            item = dict(records[neighbor], score=score)
+            if verdict == VERDICT_YES:
+                item["verdict"] = {"answer": "yes", "reason": "Approved by the guardrail when the compatibility graph was built."}
+            matching_items.append(item)
+        return item_id, matching_items
+
+
+def visual_summaries(catalog, visual_hits):
+    """`item_summary` dicts (with the image `score`) of visual search hits, best first"""
+    records = catalog_records(catalog, [item_id for item_id, _ in visual_hits])
+    return [item_summary(dict(records[item_id], score=score)) for item_id, score in visual_hits if item_id in records]
+
+
+def match_known_item(catalog, encoded_image, graph=None, visual=None):
+    """
+    Graph recommendations when the image is recognised as a catalog item the graph knows, plus the visual matches.
+    Returns (matched item id or None, matching item dicts, visual match summaries).
+    """
+    item_id, visual_hits = find_catalog_item(encoded_image, graph, visual)
+    matching_items = []
+    if graph is not None and item_id is not None:
+        item_id, matching_items = match_from_graph(catalog, graph, encoded_image, item_id)
+    else:
+        item_id = None
+    return item_id, matching_items, visual_summaries(catalog, visual_hits)
+
+
+def catalog_image_path(item_id, image_dir=DEFAULT_IMAGE_DIR):
+    return os.path.join(image_dir, f"{item_id}.jpg")
+
+
+def validate_matches(encoded_image, matching_items, image_dir=DEFAULT_IMAGE_DIR):
+    """
+    Guardrail verdicts for the matching items, checked concurrently.
+    Returns {item_id: parsed verdict} or {item_id: {"error": message}}; items without an image are skipped.
+    """
+    candidates = {}
+    for item in matching_items:
+        path = catalog_image_path(item["id"], image_dir)
+        if os.path.exists(path):
+            candidates[item["id"]] = lambda item_id=item["id"], path=path: candidate_thumbnail(item_id, path)
+
+    return {
+        item_id: parse_verdict(match_result, error)
+        for item_id, match_result, error in check_matches(encoded_image, candidates)
+    }
+
+
+def parse_verdict(match_result, error=None):
+    """Parsed guardrail verdict ({"answer", "reason"}), or {"error": message} when the check failed"""
+    if error is not None:
+        return {"error": f"{type(error).__name__}: {error}"}
+    try:
+        return json.loads(match_result)
+    except (json.JSONDecodeError, TypeError):
+        return {"error": f"Unparseable verdict: {match_result!r}"}
+
+
+def match_image(catalog, image_path, subcategories, image_dir=DEFAULT_IMAGE_DIR, validate=True, graph=None, visual=None):
+    """
+    Run analysis, retrieval and (optionally) guardrails for one image file, or, when the image is recognised as a
+    catalog item that `graph` knows, serve its precomputed recommendations. With `visual` (match/visual_search.py)
+    the result also lists the most similar catalog images. Returns a JSON-serializable result.
+    """
+    encoded_image = encode_image_file(image_path)
+    item_id, matching_items, visual_matches = match_known_item(catalog, encoded_image, graph, visual)
+    if item_id is not None:
+        result = {"source": "graph", "matched_item": item_id, "analysis": None, "searched_items": 0}
+        verdicts = {}  # graph items carry their cached verdicts
+    else:
+        image_analysis = run_image_analysis(encoded_image, subcategories)
+        searched, matching_items = match_from_analysis(catalog, image_analysis)
+        result = {"source": "analysis", "analysis": image_analysis, "searched_items": searched}
+        verdicts = validate_matches(encoded_image, matching_items, image_dir) if validate else {}
+
+    matches = []
+    for item in matching_items:
+        match = item_summary(item)
+        if item["id"] in verdicts:
+            match["verdict"] = verdicts[item["id"]]
+        matches.append(match)
+    result["matches"] = matches
+    if visual is not None:
+        result["visual_matches"] = visual_matches
+    return result
+
+
+def item_summary(item):
+    """The RESULT_FIELDS of a catalog item as plain JSON-serializable values"""
+    return {field: _to_json(item.get(field)) for field in RESULT_FIELDS if field in item}
+
+
+def _to_json(value):
+    """NumPy scalars from the catalog DataFrame as plain Python values"""
+    return value.item() if hasattr(value, "item") else value
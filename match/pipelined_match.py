@@ -0,0 +1,264 @@
+"""
+pipelined_match.py
+One match operation with its stages overlapped instead of run back to back. The analysis is streamed and parsed as
+it arrives: as soon as the model has written "category" and "gender" the catalog filter is ready, every suggested
+item is embedded and searched the moment its string closes, each search result immediately gets its outfit slot
+(MMR against the items already chosen), and the guardrail check for that item starts right away. Progress is yielded
+as events, so the UI (or an HTTP stream) can show each result as it lands. End-to-end time approaches the slowest
+stage (usually the analysis plus one guardrail call) rather than the sum of all of them.
+"""
+
+# Standard library imports
+import concurrent.futures
+import json
+import os
+import queue
+import re
+import threading
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from analysis import stream_image_analysis
+from config import GUARDRAIL_MAX_CONCURRENCY, OUTFIT_CANDIDATES, OUTFIT_MMR_LAMBDA, RETRIEVAL_MODE
+from match.outfit_search import IncrementalOutfit, candidate_relevance, description_candidates
+from match.pipeline import DEFAULT_IMAGE_DIR, catalog_image_path, item_summary, match_known_item, parse_verdict
+from match.search_similar_items import get_embeddings
+from match.vector_index import normalize_rows
+from utils import openai_client, tracing
+from utils.guardrails import check_match_cached
+from utils.image_prep import candidate_thumbnail
+
+JSON_STRING = r'"((?:[^"\\]|\\.)*)"'
+
+
+class AnalysisStreamParser:
+    """
+    Incremental reader for the analysis JSON ({"category": str, "gender": str, "items": [str, ...]} in any key order).
+    `feed` returns the (field, value) pairs completed by a chunk: ("category", ...), ("gender", ...) and one
+    ("item", ...) per suggested item; `finish` parses the whole text and returns the complete analysis.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.emitted = set()
+        self.items_emitted = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        for field in ("category", "gender"):
+            if field not in self.emitted:
+                match = re.search(rf'"{field}"\s*:\s*{JSON_STRING}', self.text)
+                if match:
+                    self.emitted.add(field)
+                    completed.append((field, json.loads(f'"{match.group(1)}"')))
+
+        items = re.search(r'"items"\s*:\s*\[', self.text)
+        if items:
+            # Closed strings up to the end of the array; a string still being written has no closing quote yet
+            strings = []
+            for token in re.finditer(rf"{JSON_STRING}|\]", self.text[items.end():]):
+                if token.group(0) == "]":
+                    break
+                strings.append(token.group(1))
+            for value in strings[self.items_emitted:]:
+                completed.append(("item", json.loads(f'"{value}"')))
+            self.items_emitted = max(self.items_emitted, len(strings))
+        return completed
+
+    def finish(self):
+        """
+        The full analysis, plus the (field, value) pairs `feed` could not pick up (e.g. unusual formatting).
+        Raises ValueError when the text is not a valid analysis.
+        """
+        try:
+            analysis = json.loads(self.text)
+            remaining = [(field, analysis[field]) for field in ("category", "gender") if field not in self.emitted]
+            remaining += [("item", item) for item in analysis["items"][self.items_emitted:]]
+        except (json.JSONDecodeError, TypeError, KeyError) as e:
+            raise ValueError(f"Error parsing analysis result: {e}; raw result: {self.text!r}")
+        return analysis, remaining
+
+
+async def _stream_analysis(encoded_image, subcategories, events):
+    """Feed the streamed analysis into `events` as ("field", name, value) and finally ("analysis", dict)"""
+    parser = AnalysisStreamParser()
+    try:
+        async for chunk in stream_image_analysis(encoded_image, subcategories):
+            for field, value in parser.feed(chunk):
+                events.put(("field", field, value))
+        if not parser.text:
+            raise ValueError("Failed to analyze image (is the OpenAI client configured?)")
+        analysis, remaining = parser.finish()
+        for field, value in remaining:
+            events.put(("field", field, value))
+        events.put(("analysis", analysis))
+    except ValueError as e:
+        events.put(("error", str(e)))
+    except Exception as e:
+        events.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def match_image_pipelined(catalog, encoded_image, subcategories, image_dir=DEFAULT_IMAGE_DIR, validate=True,
+                          graph=None, visual=None, threshold=0.6, candidates_per_description=OUTFIT_CANDIDATES,
+                          mmr_lambda=OUTFIT_MMR_LAMBDA, mode=RETRIEVAL_MODE):
+    """
+    Generator of JSON-serializable progress events for one reference image:
+      {"event": "visual_matches", "items": [...]}               most similar catalog images (with visual search)
+      {"event": "analysis", "field": "category"|"gender", "value": str}
+      {"event": "description", "index": i, "text": str}          a suggested item, as soon as it is streamed
+      {"event": "match", "index": i, "item": {...}}              catalog item chosen for suggestion i
+      {"event": "search_error", "index": i, "message": str}      suggestion i could not be embedded or searched
+      {"event": "verdict", "item_id": id, "verdict": {...}}      guardrail verdict (or {"error": ...})
+      {"event": "done", "result": {...}}                         same shape as pipeline.match_image
+      {"event": "error", "message": str}                         the analysis failed; nothing else follows
+    Images of known catalog items are answered from the compatibility graph without any of these stages.
+    """
+    item_id, known_matches, visual_matches = match_known_item(catalog, encoded_image, graph, visual)
+    if visual is not None:
+        yield {"event": "visual_matches", "items": visual_matches}
+    if item_id is not None:
+        matches = [item_summary(item) for item in known_matches]
+        for index, match in enumerate(matches):
+            yield {"event": "match", "index": index, "item": match}
+        result = {"source": "graph", "matched_item": item_id, "analysis": None, "searched_items": 0, "matches": matches}
+        if visual is not None:
+            result["visual_matches"] = visual_matches
+        yield {"event": "done", "result": result}
+        return
+
+    events = queue.Queue()
+    filter_ready = threading.Event()
+    state = {"view": None}
+    outfit = IncrementalOutfit(mmr_lambda)
+    matches, verdicts = [], {}
+
+    def retrieve(index, description):
+        # Embedding needs no filter, so it overlaps with the rest of the analysis stream
+        embedding = get_embeddings([description])
+        filter_ready.wait()
+        view = state["view"]
+        if embedding is None or view is None:
+            return ("candidates", index, None)
+        with tracing.span("vector_search", queries=1, mode=mode) as span:
+            query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+            hits = description_candidates(view, query, [description], threshold, candidates_per_description, mode)[0]
+            span.set(candidates=len(hits))
+        return ("candidates", index, (view, hits, query[0]))
+
+    def validate_item(matched_id, path):
+        match_result = check_match_cached(encoded_image, matched_id, lambda: candidate_thumbnail(matched_id, path))
+        return ("verdict", matched_id, parse_verdict(match_result))
+
+    def run(task, *args):
+        try:
+            events.put(task(*args))
+        except Exception as e:
+            events.put(("task_error", task.__name__, args, e))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=GUARDRAIL_MAX_CONCURRENCY + 4)
+    analysis_future = openai_client.submit(_stream_analysis(encoded_image, subcategories, events))
+    pending = 1  # the analysis stream, then one per retrieval / guardrail task in flight
+    descriptions, analysis = [], None
+    try:
+        while pending:
+            kind, *payload = events.get()
+            if kind == "error":
+                filter_ready.set()
+                yield {"event": "error", "message": payload[0]}
+                return
+
+            if kind == "field":
+                field, value = payload
+                if field == "item":
+                    descriptions.append(value)
+                    yield {"event": "description", "index": len(descriptions) - 1, "text": value}
+                    pending += 1
+                    executor.submit(tracing.in_context(run), retrieve, len(descriptions) - 1, value)
+                    continue
+                state[field] = value
+                yield {"event": "analysis", "field": field, "value": value}
+                if "category" in state and "gender" in state and not filter_ready.is_set():
+                    with tracing.span("filter_catalog"):
+                        state["view"] = catalog.view(gender=state["gender"], exclude_category=state["category"])
+                    filter_ready.set()
+
+            elif kind == "analysis":
+                pending -= 1
+                analysis = payload[0]
+                filter_ready.set()  # a malformed analysis without both fields searches nothing
+
+            elif kind == "candidates":
+                pending -= 1
+                index, found = payload
+                if not found or not found[1]:
+                    continue
+                view, hits, query = found
+                rows = np.asarray([row for row, _ in hits], dtype=np.int64)
+                vectors = view.vectors(rows)
+                relevance = candidate_relevance(query[None, :], vectors)[0]
+                relevance[relevance < threshold] = -np.inf
+                styles_df = view.catalog.styles_df
+                article_types = styles_df["articleType"].to_numpy()[rows] if "articleType" in styles_df.columns else rows
+                best = outfit.pick(relevance, vectors, article_types)
+                if best is None:
+                    continue
+                record = view.record(rows[best])
+                record.update(description=descriptions[index], score=float(relevance[best]))
+                match = item_summary(record)
+                matches.append((index, match))
+                yield {"event": "match", "index": index, "item": match}
+
+                path = catalog_image_path(match["id"], image_dir)
+                if validate and os.path.exists(path):
+                    pending += 1
+                    executor.submit(tracing.in_context(run), validate_item, match["id"], path)
+
+            elif kind == "verdict":
+                pending -= 1
+                matched_id, verdict = payload
+                verdicts[matched_id] = verdict
+                yield {"event": "verdict", "item_id": matched_id, "verdict": verdict}
+
+            elif kind == "task_error":
+                pending -= 1
+                task_name, args, error = payload
+                if task_name == "validate_item":
+                    verdicts[args[0]] = parse_verdict(None, error)
+                    yield {"event": "verdict", "item_id": args[0], "verdict": verdicts[args[0]]}
+                else:
+                    yield {"event": "search_error", "index": args[0], "message": f"{type(error).__name__}: {error}"}
+    finally:
+        # Closed early (client gone, rerun, no "category"/"gender" yet): release the retrievals waiting on the filter
+        filter_ready.set()
+        analysis_future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    result_matches = []
+    for _, match in sorted(matches, key=lambda pair: pair[0]):
+        if match["id"] in verdicts:
+            match = dict(match, verdict=verdicts[match["id"]])
+        result_matches.append(match)
+    result = {
+        "source": "analysis",
+        "analysis": analysis,
+        "searched_items": len(state["view"]) if state["view"] is not None else 0,
+        "matches": result_matches,
+    }
+    if visual is not None:
+        result["visual_matches"] = visual_matches
+    yield {"event": "done", "result": result}
+
+
+def run_pipelined(catalog, encoded_image, subcategories, **kwargs):
+    """
+    Drain `match_image_pipelined` and return its final result (the shape `pipeline.match_image` returns).
+    Raises ValueError when the analysis fails.
+    """
+    for event in match_image_pipelined(catalog, encoded_image, subcategories, **kwargs):
+        if event["event"] == "error":
+            raise ValueError(event["message"])
+        if event["event"] == "done":
+            return event["result"]
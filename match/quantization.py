@@ -0,0 +1,225 @@
+"""
+quantization.py
+Compact storage and search for catalog embeddings. Vectors can be truncated Matryoshka-style to their
+first `dims` components (what the API's `dimensions` parameter returns) and stored as float16 or as
+int8 codes with one float32 scale per vector. Search scores the compact codes directly and can re-rank
+the best candidates exactly against the float32 vectors (e.g. the memory-mapped catalog store).
+Exposes the same search interface as VectorIndex.
+"""
+
+# Standard library imports
+import argparse
+import os
+import time
+
+# 3P Imports
+import numpy as np
+
+# Local application imports
+from match.vector_index import VectorIndex, normalize_rows, top_k_above_threshold
+
+QUANTIZATIONS = ("float16", "int8")
+
+# Float32 elements dequantized per block while scoring, bounds the temporary matrix (~16 MB)
+SCORE_BLOCK_ELEMENTS = 1 << 22
+
+# Candidates within this much of the threshold are re-ranked too, since quantized scores are approximate
+RERANK_MARGIN = 0.02
+
+
+def truncate_dimensions(matrix, dims=None):
+    """
+    First `dims` components of every row, re-normalized to unit length (Matryoshka truncation).
+    `dims=None` keeps all components.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if dims is None or dims >= matrix.shape[1]:
+        return normalize_rows(matrix)
+    return normalize_rows(matrix[:, :dims])
+
+
+def quantize(matrix, quantization="int8"):
+    """
+    Quantize unit-length rows. Returns (codes, scales): float16 codes with `scales=None`, or int8 codes
+    with a per-row float32 scale so that `codes * scales[:, None]` approximates `matrix`.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if quantization == "float16":
+        return matrix.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+class QuantizedIndex:
+    """
+    Exact-scan index over quantized (and optionally truncated) vectors.
+
+    Args:
+        codes: (n_items, dims) float16 or int8 codes
+        scales: per-row float32 scales for int8 codes, None for float16
+        rerank_matrix: optional (n_items, full_dim) float32 unit vectors used to re-score candidates
+        rerank: number of candidates re-scored per query (0 disables re-ranking)
+    """
+
+    def __init__(self, codes, scales=None, rerank_matrix=None, rerank=50):
+        self.codes = codes
+        self.scales = scales
+        self.rerank_matrix = rerank_matrix
+        self.rerank = rerank if rerank_matrix is not None else 0
+
+    @classmethod
+    def build(cls, matrix, quantization="int8", dims=None, rerank=50):
+        """
+        Quantize the L2-normalized float32 `matrix`, which is also kept (not copied) for re-ranking.
+        """
+        codes, scales = quantize(truncate_dimensions(matrix, dims), quantization)
+        return cls(codes, scales, rerank_matrix=matrix if rerank else None, rerank=rerank)
+
+    def save(self, path, fingerprint=""):
+        """
+        Save the codes and scales. The float32 vectors stay in the catalog store, whose `store_fingerprint`
+        is recorded so a rewritten store is detected at load time.
+        """
+        arrays = {"codes": self.codes, "fingerprint": fingerprint}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, rerank_matrix=None, rerank=50, fingerprint=None):
+        """Raises ValueError when the index was built for other catalog contents (`fingerprint` or item count differ)"""
+        data = np.load(path)
+        if fingerprint is not None and ("fingerprint" not in data.files or str(data["fingerprint"]) != fingerprint):
+            raise ValueError(f"Index at {path} was built for other catalog contents")
+        scales = data["scales"] if "scales" in data.files else None
+        if rerank_matrix is not None and len(rerank_matrix) != len(data["codes"]):
+            raise ValueError(f"Index at {path} was built for {len(data['codes'])} items, got {len(rerank_matrix)}")
+        return cls(data["codes"], scales, rerank_matrix=rerank_matrix, rerank=rerank)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def dim(self):
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self):
+        """Memory held by the compact codes (the re-rank matrix is usually memory-mapped)"""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def approximate_scores(self, queries, rows=None):
+        """
+        (n_queries, n_rows) cosine scores on the compact codes. NumPy has no float16/int8 BLAS, so codes
+        are dequantized block by block into float32 and scored with a matrix product.
+        """
+        queries = truncate_dimensions(queries, self.dim)
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        block = max(1, SCORE_BLOCK_ELEMENTS // self.dim)
+        for start in range(0, len(codes), block):
+            scores[:, start:start + block] = queries @ codes[start:start + block].astype(np.float32).T
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def vectors(self, rows):
+        """float32 unit vectors of the given row ids: exact when a re-rank matrix is attached, else dequantized codes"""
+        rows = np.asarray(rows)
+        if self.rerank_matrix is not None:
+            return np.asarray(self.rerank_matrix[rows], dtype=np.float32)
+        vectors = self.codes[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        return normalize_rows(vectors)
+
+    def search(self, query, threshold=0.5, top_k=2, rows=None):
+        return self.search_batch(np.ravel(query), threshold=threshold, top_k=top_k, rows=rows)[0]
+
+    def search_batch(self, queries, threshold=0.5, top_k=2, rows=None):
+        """
+        Top-k (row id, score) pairs per query, same contract as VectorIndex.search_batch. With re-ranking
+        the returned scores are exact float32 cosine similarities, otherwise approximate ones.
+        """
+        queries = normalize_rows(queries, dtype=np.float32)
+        if rows is not None:
+            rows = np.asarray(rows)
+        scores = self.approximate_scores(queries, rows)
+
+        results = []
+        for query, row_scores in zip(queries, scores):
+            if self.rerank:
+                results.append(self._rerank(query, row_scores, threshold, top_k, rows))
+                continue
+            candidates = top_k_above_threshold(row_scores, threshold, top_k)
+            results.append(candidates if rows is None else [(int(rows[i]), score) for i, score in candidates])
+        return results
+
+    def _rerank(self, query, approximate, threshold, top_k, rows):
+        """Re-score the best approximate candidates on the float32 vectors and keep the exact top-k"""
+        limit = None if top_k is None else max(self.rerank, top_k)
+        shortlist = np.asarray(
+            [i for i, _ in top_k_above_threshold(approximate, threshold - RERANK_MARGIN, limit)], dtype=np.int64
+        )
+        # Sorted row ids keep the lower-index tie-break and read the memory map in order
+        shortlist = np.sort(shortlist if rows is None else rows[shortlist])
+        exact = np.asarray(self.rerank_matrix[shortlist], dtype=np.float32) @ query
+        return [(int(shortlist[i]), score) for i, score in top_k_above_threshold(exact, threshold, top_k)]
+
+
+if __name__ == "__main__":
+    from match.ann_index import recall_at_k
+    from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog, store_fingerprint
+
+    parser = argparse.ArgumentParser(description="Measure memory, latency and recall@k of compact catalog indexes")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 1024, 512, 256], help="0 = all stored dims")
+    parser.add_argument("--quantization", nargs="+", default=list(QUANTIZATIONS), choices=QUANTIZATIONS)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 50])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--save", action="store_true", help="Save the SEARCH_QUANTIZATION/SEARCH_DIMENSIONS index into the store"
+    )
+    args = parser.parse_args()
+
+    metadata_df, matrix = load_catalog(args.store_dir)
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)
+    queries = np.asarray(matrix[np.sort(query_ids)]) + rng.normal(scale=0.02, size=(len(query_ids), matrix.shape[1]))
+    exact = VectorIndex(matrix, normalized=True)
+
+    start = time.perf_counter()
+    exact.search_batch(queries, threshold=-1.0, top_k=args.k)
+    baseline_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"float32 dims={matrix.shape[1]:<5} {matrix.nbytes / 2**20:8.1f} MB  {baseline_ms:.2f} ms/query")
+
+    for dims in args.dims:
+        for quantization in args.quantization:
+            for rerank in args.rerank:
+                index = QuantizedIndex.build(matrix, quantization, dims or None, rerank=rerank)
+                start = time.perf_counter()
+                index.search_batch(queries, threshold=-1.0, top_k=args.k)
+                elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                print(
+                    f"{quantization:<7} dims={index.dim:<5} rerank={rerank:<3} {index.nbytes / 2**20:8.1f} MB "
+                    f"({matrix.nbytes / index.nbytes:.1f}x smaller)  {elapsed_ms:.2f} ms/query  "
+                    f"recall@{args.k}={recall_at_k(index, exact, queries, k=args.k):.3f}"
+                )
+
+    if args.save:
+        from config import SEARCH_DIMENSIONS, SEARCH_QUANTIZATION
+        from match.catalog_index import quantized_index_file
+
+        if SEARCH_QUANTIZATION not in QUANTIZATIONS:
+            parser.error("set SEARCH_QUANTIZATION=float16 or int8 to save an index")
+        path = os.path.join(args.store_dir, quantized_index_file())
+        index = QuantizedIndex.build(matrix, SEARCH_QUANTIZATION, SEARCH_DIMENSIONS)
+        index.save(path, fingerprint=store_fingerprint(args.store_dir, metadata_df))
+        print(f"✅ Saved index to {path}")
@@ -1,7 +1,8 @@
 """
 search_similar_items.py
 Contains functions for generating embeddings using OpenAI (text-embedding-3-large) and retrieving top-matching items
-based on cosine similarity. Forms the retrieval layer in the GPT-4o mini + RAG pipeline.
+based on cosine similarity, optionally fused with BM25 over the catalog text (RETRIEVAL_MODE=hybrid). Forms the
+retrieval layer in the GPT-4o mini + RAG pipeline.
 """
 
 # Standard library imports
@@ -9,31 +10,40 @@ from typing import List
 
 # 3P Imports
 import numpy as np
-from openai import OpenAI
+from openai import NOT_GIVEN
 from tenacity import retry, wait_random_exponential, stop_after_attempt
 
 # Local application imports
-from config import EMBEDDING_MODEL, OPENAI_API_KEY
-
-# Initialize OpenAI client
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
+from config import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, EMBEDDING_MODEL_KEY, RETRIEVAL_MODE
+from match.catalog_index import CatalogView, frame_view
+from match.vector_index import VectorIndex
+from utils import openai_client, tracing
+from utils.embedding_cache import get_embedding_cache
 
 # Simple function to take in a list of text objects and return them as a list of embeddings
 
 @retry(wait=wait_random_exponential(min=1, max=40), stop=stop_after_attempt(10))
 
-def get_embeddings(input: List):
-    if not client:
+def create_embeddings(input: List):
+    if not openai_client.is_configured():
         return None
         
-    response = client.embeddings.create(
-        input=input,
-        model=EMBEDDING_MODEL
-    ).data
-    return [data.embedding for data in response]
+    return openai_client.create_embeddings(input, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS or NOT_GIVEN)
+
+
+# Cached variant used by the retrieval path. Only texts missing from the embedding cache hit the API
+
+def get_embeddings(input: List):
+    if not openai_client.is_configured():
+        return None
+
+    texts = list(input)
+    with tracing.span("embed_query", cache_hits=len(texts), cache_misses=0) as span:
+        def fetch(missing):
+            span.set(cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+            return create_embeddings(missing)
+
+        return get_embedding_cache().get_or_fetch(texts, fetch, model=EMBEDDING_MODEL_KEY)
 
 
 # Includes matching algorithm. Math - cosine similarity function]
@@ -55,39 +65,52 @@ def cosine_similarity_manual(vec1, vec2):
 def find_similar_items(input_embedding, embeddings, threshold=0.5, top_k=2):
     """
     Find the most similar items based on cosine similarity.
+    `embeddings` can be a list of vectors or a prebuilt index (VectorIndex / IVFIndex, reused across queries).
     """
-    
-    # Calculate cosine similarity between the input embedding and all other embeddings
-    similarities = [(index, cosine_similarity_manual(input_embedding, vec)) for index, vec in enumerate(embeddings)]
-    
-    # Filter out any similarities below the threshold
-    filtered_similarities = [(index, sim) for index, sim in similarities if sim >= threshold]
-    
-    # Sort the filtered similarities by similarity score
-    sorted_indices = sorted(filtered_similarities, key=lambda x: x[1], reverse=True)[:top_k]
 
-    # Return the top-k most similar items
-    return sorted_indices
+    # Score the input embedding against the catalog vectors (one matrix-vector product for exact search)
+    if not hasattr(embeddings, "search_batch"):
+        if len(embeddings) == 0:
+            return []
+        embeddings = VectorIndex(embeddings)
+    index = embeddings
+
+    # Keep the top-k scores above the threshold, sorted by similarity score
+    return index.search(input_embedding, threshold=threshold, top_k=top_k)
 
 
-def find_matching_items_with_rag(df_items, item_descs):
+def find_matching_items_with_rag(df_items, item_descs, mode=RETRIEVAL_MODE):
     """
     Take the input item descriptions and find the most similar items based on cosine similarity for each description.
+    All descriptions are embedded in one request. In "vector" mode they are scored against the catalog in one
+    matrix product; in "hybrid" mode each is scored only against its BM25 candidates and ranked by fusing both.
+    `df_items` is either a prefiltered DataFrame (searched exactly, vector mode only) or a CatalogView from the prebuilt
+    catalog index.
     """
-
-    # Select the embeddings from the DataFrame
-    embeddings = df_items['embeddings'].tolist()
-
-    similar_items = []
-    for desc in item_descs:
-        # Generate the embedding for the input item
-        input_embedding = get_embeddings([desc])
-        
-        if input_embedding is None:
-            continue
-
-        # Find the most similar items based on cosine similarity
-        similar_indices = find_similar_items(input_embedding, embeddings, threshold=0.6)
-    
-        similar_items += [df_items.iloc[i].to_dict() for i in similar_indices]
-    return similar_items
\ No newline at end of file
+    item_descs = list(item_descs)
+    if not item_descs or not len(df_items):
+        return []
+
+    # Generate the embeddings for all input items in a single call
+    input_embeddings = get_embeddings(item_descs)
+    if input_embeddings is None:
+        return []
+
+    # Score every description against the (filtered) catalog in one pass
+    with tracing.span("vector_search", queries=len(item_descs), mode=mode) as span:
+        if isinstance(df_items, CatalogView):
+            view = df_items
+        else:
+            view, mode = frame_view(df_items), "vector"
+        if mode == "hybrid":
+            similar_indices_per_desc = view.hybrid_search_batch(input_embeddings, item_descs, threshold=0.6, top_k=2)
+        else:
+            similar_indices_per_desc = view.search_batch(input_embeddings, threshold=0.6, top_k=2)
+        span.set(candidates=len(view))
+
+    # Keep the results grouped by description, in the order the descriptions were given
+    with tracing.span("load_records"):
+        similar_items = []
+        for similar_indices in similar_indices_per_desc:
+            similar_items += [view.record(i) for i, _ in similar_indices]
+    return similar_items
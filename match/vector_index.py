@@ -0,0 +1,106 @@
+"""
+vector_index.py
+In-memory vector index used by the retrieval layer. Keeps the catalog embeddings as one contiguous
+float32 matrix of L2-normalized rows so a query is scored with a single matrix-vector product.
+"""
+
+# Standard library imports
+from typing import List, Tuple
+
+# 3P Imports
+import numpy as np
+
+
+def normalize_rows(matrix, dtype=np.float32):
+    """
+    Return a C-contiguous copy of `matrix` with every row scaled to unit L2 norm.
+    Rows with a zero norm are left as zeros so they never pass a positive threshold.
+    """
+    matrix = np.array(matrix, dtype=dtype, copy=True, order="C")
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def top_k_above_threshold(scores, threshold=0.5, top_k=2) -> List[Tuple[int, float]]:
+    """
+    Select the `top_k` highest scores that are >= `threshold`.
+    Uses a partial partition so only the surviving candidates are sorted. Ties are broken by the lower index,
+    which matches a stable sort over the scores in catalog order.
+    """
+    if top_k is not None and top_k <= 0:
+        return []
+
+    candidates = np.flatnonzero(scores >= threshold)
+    if top_k is not None and len(candidates) > top_k:
+        # Keep everything tied with the k-th best score so the tie-break below stays exact
+        kth_score = -np.partition(-scores[candidates], top_k - 1)[top_k - 1]
+        candidates = candidates[scores[candidates] >= kth_score]
+
+    order = np.lexsort((candidates, -scores[candidates]))[:top_k]
+    return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]
+
+
+class VectorIndex:
+    """
+    Exact (brute force) cosine similarity index over a fixed set of embeddings.
+    Pass `normalized=True` for float32 rows that are already unit length (e.g. a memory-mapped catalog
+    store) to use them in place without a copy.
+    """
+
+    def __init__(self, embeddings, dtype=np.float32, normalized=False):
+        if normalized:
+            self.matrix = np.ascontiguousarray(embeddings, dtype=dtype)
+        else:
+            self.matrix = normalize_rows(embeddings, dtype=dtype)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def scores(self, query):
+        """
+        Cosine similarity between one query vector and every indexed row.
+        """
+        query = normalize_rows(np.ravel(query), dtype=self.matrix.dtype)[0]
+        return self.matrix @ query
+
+    def vectors(self, rows):
+        """float32 unit vectors of the given row ids"""
+        return np.asarray(self.matrix[np.asarray(rows)], dtype=np.float32)
+
+    def search(self, query, threshold=0.5, top_k=2, rows=None):
+        """
+        Return the top-k (index, score) pairs for a single query.
+        """
+        return self.search_batch(np.ravel(query), threshold=threshold, top_k=top_k, rows=rows)[0]
+
+    def search_batch(self, queries, threshold=0.5, top_k=2, rows=None):
+        """
+        Score a (n_queries, dim) matrix against the index with one matrix-matrix product.
+        Returns one list of (index, score) pairs per query, in query order.
+
+        `rows` optionally restricts the search to a sorted array of row ids; returned indices are
+        still row ids of the full index.
+        """
+        queries = normalize_rows(queries, dtype=self.matrix.dtype)
+        if rows is None:
+            scores = queries @ self.matrix.T
+            return [top_k_above_threshold(row, threshold, top_k) for row in scores]
+
+        # Small subsets gather just their rows; large ones score everything and select columns
+        rows = np.asarray(rows)
+        if 2 * len(rows) < len(self):
+            scores = queries @ self.matrix[rows].T
+        else:
+            scores = (queries @ self.matrix.T)[:, rows]
+        return [
+            [(int(rows[i]), score) for i, score in top_k_above_threshold(row, threshold, top_k)]
+            for row in scores
+        ]
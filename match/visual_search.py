@@ -0,0 +1,216 @@
+"""
+visual_search.py
+Image-to-image retrieval with a local CPU model. A CLIP-style image encoder exported to ONNX embeds every catalog image
+once, offline, into its own vector index stored next to the catalog store (rows keyed by item id). At request time the
+upload is embedded in-process (tens of ms on CPU, no remote call), which finds the catalog item it shows and its
+visual neighbours without waiting for the vision model to describe it. onnxruntime is an optional dependency: without
+it, or without the model file or the index, visual search is simply unavailable.
+
+    python -m match.visual_search --image-dir data/sample_clothes/sample_images --model models/clip_image_encoder.onnx
+"""
+
+# Standard library imports
+import argparse
+import base64
+import collections
+import concurrent.futures
+import io
+import os
+import threading
+import time
+
+# 3P Imports
+import numpy as np
+from PIL import Image, ImageOps
+from tqdm import tqdm
+
+# Local application imports
+from config import (
+    IMAGE_EMBEDDING_MODEL,
+    IMAGE_EMBEDDING_SIZE,
+    IMAGE_EMBEDDING_THREADS,
+    VISUAL_NEIGHBORS,
+    VISUAL_SEARCH_MODE,
+)
+from match.vector_index import VectorIndex, normalize_rows
+from utils import tracing
+from utils.catalog_store import DEFAULT_STORE_DIR, load_catalog
+
+IMAGE_EMBEDDINGS_FILE = "image_embeddings.npy"
+IMAGE_EMBEDDING_IDS_FILE = "image_embedding_ids.npy"
+
+# CLIP's per-channel RGB normalization
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+class ImageEncoder:
+    """
+    ONNX image encoder taking a (batch, 3, size, size) float32 tensor of CLIP-normalized pixels and returning one
+    embedding per image as its first output. Runs on the CPU execution provider; `run` is thread-safe.
+    """
+
+    def __init__(self, model_path=IMAGE_EMBEDDING_MODEL, size=IMAGE_EMBEDDING_SIZE, threads=IMAGE_EMBEDDING_THREADS):
+        import onnxruntime  # optional dependency, only needed for visual search
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.size = size
+
+    def preprocess(self, image):
+        """CLIP preprocessing of a PIL image: upright RGB, resized to cover `size` (bicubic), centre crop, CHW"""
+        image.draft("RGB", (self.size, self.size))  # JPEGs are decoded at a reduced DCT scale
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image = ImageOps.fit(image, (self.size, self.size), Image.BICUBIC)
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+        return ((pixels - CLIP_MEAN) / CLIP_STD).transpose(2, 0, 1)
+
+    def embed_batch(self, batch):
+        """L2-normalized (n, dim) float32 embeddings of a stacked batch of `preprocess` outputs"""
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return normalize_rows(np.asarray(output, dtype=np.float32).reshape(len(batch), -1))
+
+    def embed(self, images):
+        """L2-normalized (n, dim) float32 embeddings of PIL images"""
+        return self.embed_batch(np.stack([self.preprocess(image) for image in images]))
+
+    def embed_base64(self, image_base64):
+        """Unit embedding of one base64-encoded image"""
+        with tracing.span("image_embedding"):
+            return self.embed([Image.open(io.BytesIO(base64.b64decode(image_base64)))])[0]
+
+
+class VisualIndex:
+    """
+    Image embeddings of the catalog items that have an image: row i is the item `item_ids[i]`.
+    """
+
+    def __init__(self, item_ids, vectors):
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.index = VectorIndex(vectors, normalized=True)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def search(self, query, top_k=VISUAL_NEIGHBORS, threshold=-1.0):
+        """[(item id, cosine similarity)] of the `top_k` catalog images most similar to the query embedding"""
+        return [(int(self.item_ids[row]), score) for row, score in self.index.search(query, threshold=threshold, top_k=top_k)]
+
+    @staticmethod
+    def exists(store_dir=DEFAULT_STORE_DIR):
+        """The id file is written last, so it only exists next to a complete embeddings file"""
+        return os.path.exists(os.path.join(store_dir, IMAGE_EMBEDDING_IDS_FILE))
+
+    @classmethod
+    def load(cls, store_dir=DEFAULT_STORE_DIR, mmap=True):
+        vectors = np.load(os.path.join(store_dir, IMAGE_EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        return cls(np.load(os.path.join(store_dir, IMAGE_EMBEDDING_IDS_FILE)), vectors)
+
+
+class VisualSearch:
+    """An image encoder plus the catalog's visual index: base64 upload in, similar catalog items out"""
+
+    def __init__(self, encoder, index):
+        self.encoder = encoder
+        self.index = index
+
+    def search(self, image_base64, top_k=VISUAL_NEIGHBORS):
+        """[(item id, similarity)] of the catalog images closest to the upload, best first"""
+        query = self.encoder.embed_base64(image_base64)
+        with tracing.span("visual_search", candidates=len(self.index)):
+            return self.index.search(query, top_k=top_k)
+
+
+def embed_catalog_images(encoder, store_dir=DEFAULT_STORE_DIR, image_dir="data/sample_clothes/sample_images",
+                         batch_size=32, workers=4):
+    """
+    Embed the image `<image_dir>/<id>.jpg` of every catalog item that has one and write the visual index into the
+    store. Images are decoded in `workers` threads (at most 2 * `workers` batches ahead) while the previous batch
+    runs through the model.
+    Returns the number of items embedded.
+    """
+    metadata_df, _ = load_catalog(store_dir)
+    item_ids = [int(item_id) for item_id in metadata_df["id"] if os.path.exists(os.path.join(image_dir, f"{item_id}.jpg"))]
+    if not item_ids:
+        return 0
+    ids_path = os.path.join(store_dir, IMAGE_EMBEDDING_IDS_FILE)
+    if os.path.exists(ids_path):
+        os.remove(ids_path)
+
+    def load_batch(batch_ids):
+        images = []
+        for item_id in batch_ids:
+            with Image.open(os.path.join(image_dir, f"{item_id}.jpg")) as image:
+                images.append(encoder.preprocess(image))
+        return np.stack(images)
+
+    def loaded_batches(executor):
+        # Decoding outpaces the encoder, so at most 2 * workers decoded batches wait in memory
+        in_flight = collections.deque()
+        for start in range(0, len(item_ids), batch_size):
+            in_flight.append(executor.submit(load_batch, item_ids[start:start + batch_size]))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    n_batches = -(-len(item_ids) // batch_size)
+    vectors = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # Written straight into the .npy file, so catalogs larger than memory work too
+        for position, batch in enumerate(tqdm(loaded_batches(executor), total=n_batches, desc="Embedding catalog images")):
+            embeddings = encoder.embed_batch(batch)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(store_dir, IMAGE_EMBEDDINGS_FILE), mode="w+", dtype=np.float32,
+                    shape=(len(item_ids), embeddings.shape[1]),
+                )
+            start = position * batch_size
+            vectors[start:start + len(embeddings)] = embeddings
+    vectors.flush()
+    np.save(ids_path, np.asarray(item_ids, dtype=np.int64))
+    return len(item_ids)
+
+
+_visual_search = {}
+_visual_search_lock = threading.Lock()
+
+
+def get_visual_search(store_dir=DEFAULT_STORE_DIR, model_path=IMAGE_EMBEDDING_MODEL):
+    """
+    Visual search over a catalog store (loaded once per process), or None when it is switched off, the index was never
+    built, or the encoder cannot be loaded (onnxruntime not installed, model file missing).
+    """
+    with _visual_search_lock:
+        if store_dir not in _visual_search:
+            visual_search = None
+            if VISUAL_SEARCH_MODE != "off" and VisualIndex.exists(store_dir):
+                try:
+                    visual_search = VisualSearch(ImageEncoder(model_path), VisualIndex.load(store_dir))
+                except ImportError:
+                    print("⚠️ Visual index found but onnxruntime is not installed (pip install onnxruntime); visual search is off")
+                except Exception as e:
+                    print(f"⚠️ Could not load the image encoder {model_path}: {e}; visual search is off")
+            _visual_search[store_dir] = visual_search
+    return _visual_search[store_dir]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the catalog images into the store's visual index")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--image-dir", default="data/sample_clothes/sample_images", help="Catalog images <id>.jpg")
+    parser.add_argument("--model", default=IMAGE_EMBEDDING_MODEL, help="ONNX image encoder")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="Image decoding threads")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = embed_catalog_images(ImageEncoder(args.model), args.store_dir, args.image_dir, args.batch_size, args.workers)
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f"✅ Embedded {count} catalog images in {elapsed:.1f}s ({count / elapsed:.1f} images/s)")
+    else:
+        print(f"⚠️ No catalog images found in {args.image_dir}")
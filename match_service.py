@@ -0,0 +1,221 @@
+"""
+match_service.py
+Standalone matching service: analyze / search / validate (and graph recommendations) over HTTP, so the Streamlit app (or any other client)
+does not have to hold the catalog itself. Run several worker processes behind one port; each worker memory-maps
+the same catalog store, so the embedding matrix lives once in the OS page cache however many workers there are.
+The OpenAI RPM/TPM budget is divided between the workers.
+
+    python match_service.py --workers 4 --port 8000
+    MATCH_SERVICE_URL=http://localhost:8000 streamlit run app.py
+"""
+
+# Standard library imports
+import argparse
+import contextlib
+import json
+import os
+import queue
+import threading
+from typing import List
+
+# 3P Imports
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Local application imports
+from config import (
+    MATCH_SERVICE_IMAGE_DIR,
+    MATCH_SERVICE_STORE_DIR,
+    OPENAI_RPM_LIMIT,
+    OPENAI_TPM_LIMIT,
+    USE_COMPATIBILITY_GRAPH,
+)
+from match.catalog_index import build_catalog_index
+from match.compatibility_graph import get_compatibility_graph
+from match.pipeline import item_summary, match_from_analysis, match_known_item, run_image_analysis, validate_matches
+from match.pipelined_match import match_image_pipelined
+from match.visual_search import get_visual_search
+from utils import tracing
+from utils.catalog_store import load_catalog_dataframe
+
+# Per-process catalog, loaded once when the worker starts
+_state = {}
+
+# /match events buffered ahead of a slow client before the pipeline waits for it
+MATCH_STREAM_BUFFER = 16
+
+
+class AnalyzeRequest(BaseModel):
+    image: str  # base64-encoded JPEG/PNG
+
+
+class SearchRequest(BaseModel):
+    items: List[str]
+    gender: str
+    category: str
+
+
+class ValidateRequest(BaseModel):
+    image: str  # base64-encoded reference image
+    item_ids: List[int]
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    styles_df = load_catalog_dataframe(MATCH_SERVICE_STORE_DIR)
+    _state.update(
+        styles_df=styles_df,
+        catalog=build_catalog_index(styles_df, MATCH_SERVICE_STORE_DIR),
+        subcategories=styles_df["articleType"].unique(),
+        graph=get_compatibility_graph(MATCH_SERVICE_STORE_DIR) if USE_COMPATIBILITY_GRAPH else None,
+        visual=get_visual_search(MATCH_SERVICE_STORE_DIR),
+    )
+    print(f"✅ Worker {os.getpid()} serving {len(styles_df)} catalog items")
+    yield
+    _state.clear()
+
+
+app = FastAPI(title="RetailNext matching service", lifespan=lifespan)
+
+
+# Handlers are plain `def`s: FastAPI runs them in its thread pool, and the OpenAI calls inside them are
+# multiplexed on the process's shared client loop
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "pid": os.getpid(), "items": len(_state["styles_df"])}
+
+
+@app.get("/catalog")
+def catalog_info():
+    """Catalog summary for the app's sidebar and for clients building analysis prompts"""
+    styles_df = _state["styles_df"]
+    return {
+        "items": len(styles_df),
+        "categories": sorted(styles_df["articleType"].unique().tolist()),
+        "genders": sorted(styles_df["gender"].unique().tolist()),
+    }
+
+
+@app.post("/recommend")
+def recommend(request: AnalyzeRequest):
+    """
+    Precomputed recommendations when the image is a known catalog item (see match/compatibility_graph.py), plus the
+    most similar catalog images when visual search is set up (match/visual_search.py):
+    {"matched_item": id or null, "matches": [...], "visual_matches": [...]}
+    """
+    with tracing.trace("service.recommend"):
+        item_id, matching_items, visual_matches = match_known_item(
+            _state["catalog"], request.image, _state["graph"], _state["visual"]
+        )
+        return {
+            "matched_item": item_id,
+            "matches": [item_summary(item) for item in matching_items],
+            "visual_matches": visual_matches,
+        }
+
+
+@app.post("/match")
+def match(request: AnalyzeRequest):
+    """
+    Analysis, retrieval and guardrails for a reference image in one pipelined operation, streamed as
+    newline-delimited JSON events as each stage lands (see match/pipelined_match.py)
+    """
+    lines = queue.Queue(maxsize=MATCH_STREAM_BUFFER)
+    stopped = threading.Event()
+
+    def send(line):
+        """Queue a line for the client; False once the client has gone"""
+        while not stopped.is_set():
+            try:
+                lines.put(line, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # One producer thread runs the whole match under its trace; the response may resume on other threads
+    def produce():
+        events = match_image_pipelined(
+            _state["catalog"], request.image, _state["subcategories"], MATCH_SERVICE_IMAGE_DIR,
+            graph=_state["graph"], visual=_state["visual"],
+        )
+        try:
+            with tracing.trace("service.match"):
+                try:
+                    for event in events:
+                        if not send(json.dumps(event, default=str) + "\n"):
+                            break
+                finally:
+                    events.close()  # a client that left cancels the analysis and the searches / checks not yet started
+        except Exception as e:
+            send(json.dumps({"event": "error", "message": f"{type(e).__name__}: {e}"}) + "\n")
+        finally:
+            send(None)
+
+    def stream():
+        try:
+            while (line := lines.get()) is not None:
+                yield line
+        finally:
+            stopped.set()
+
+    threading.Thread(target=produce, name="match-stream", daemon=True).start()
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/analyze")
+def analyze(request: AnalyzeRequest):
+    """Analysis of a reference image: {"items", "category", "gender"}"""
+    with tracing.trace("service.analyze"):
+        try:
+            return run_image_analysis(request.image, _state["subcategories"])
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+
+@app.post("/search")
+def search(request: SearchRequest):
+    """Catalog items matching an analysis (same gender or unisex, different category)"""
+    with tracing.trace("service.search"):
+        analysis = {"items": request.items, "gender": request.gender, "category": request.category}
+        searched, matching_items = match_from_analysis(_state["catalog"], analysis)
+        return {"searched_items": searched, "matches": [item_summary(item) for item in matching_items]}
+
+
+@app.post("/validate")
+def validate(request: ValidateRequest):
+    """Guardrail verdicts for catalog items against the reference image, checked concurrently"""
+    with tracing.trace("service.validate"):
+        verdicts = validate_matches(request.image, [{"id": item_id} for item_id in request.item_ids], MATCH_SERVICE_IMAGE_DIR)
+        missing = [item_id for item_id in request.item_ids if item_id not in verdicts]
+        return {"verdicts": {str(item_id): verdict for item_id, verdict in verdicts.items()}, "missing_images": missing}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics of the worker that answers (see utils/tracing.py)"""
+    return tracing.METRICS.render_prometheus()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    from utils.catalog_store import DEFAULT_CSV_PATH, convert_csv_to_store, store_outdated
+
+    parser = argparse.ArgumentParser(description="Serve analyze / search / validate over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    args = parser.parse_args()
+
+    # Convert once here rather than racing to do it in every worker
+    if store_outdated(DEFAULT_CSV_PATH, MATCH_SERVICE_STORE_DIR):
+        convert_csv_to_store(DEFAULT_CSV_PATH, MATCH_SERVICE_STORE_DIR)
+
+    # Workers are fresh processes that read their config from the environment: split the rate limits between them
+    os.environ["OPENAI_RPM_LIMIT"] = str(max(1, OPENAI_RPM_LIMIT // args.workers))
+    os.environ["OPENAI_TPM_LIMIT"] = str(max(1, OPENAI_TPM_LIMIT // args.workers))
+    uvicorn.run("match_service:app", host=args.host, port=args.port, workers=args.workers)
@@ -1,92 +1,67 @@
 # Standard Library Imports
-import ast
-import base64
 import json
 import os
 
 # 3P Imports
-import pandas as pd
 from IPython.display import Image, display, HTML
 
 # Local Application Imports
-from analysis import analyze_image
-from utils.guardrails import check_match
-from match.search_similar_items import find_matching_items_with_rag
-
-# Load the dataset with embeddings
-styles_df = pd.read_csv("data/sample_clothes/sample_styles_with_embeddings.csv", on_bad_lines="skip")
+from utils.guardrails import check_matches
+from match.catalog_index import build_catalog_index
+from match.pipeline import match_from_analysis, run_image_analysis
+from utils.image_prep import candidate_thumbnail, encode_image_file
+from utils.catalog_store import DEFAULT_CSV_PATH, convert_csv_to_store, load_catalog_dataframe, store_outdated
+
+# Convert the embeddings CSV into the binary catalog store on first run (and after the CSV is regenerated)
+if store_outdated():
+    convert_csv_to_store(DEFAULT_CSV_PATH)
+
+# Load the dataset with embeddings (memory-mapped float32 matrix)
+styles_df = load_catalog_dataframe()
 print(styles_df.columns)
 
-
-# Convert the 'embeddings' column from string to list of floats
-styles_df["embeddings"] = styles_df["embeddings"].apply(ast.literal_eval)
+# Build the gender/articleType index once
+catalog = build_catalog_index(styles_df)
 
 
-def encode_image_to_base64(image_path):
-    with open(image_path, 'rb') as image_file:
-        encoded_image = base64.b64encode(image_file.read())
-        return encoded_image.decode('utf-8')
-
 ## Test Prompt including sample images
 
 # Set the path to the images and select a test image
 image_path = "../openai-cookbook/examples/data/sample_clothes/sample_images/"
 test_images = ["2133.jpg", "7143.jpg", "4226.jpg"]
 
-# Encode the test image to base64
+# Encode the test image to base64 (downscaled to the resolution the vision model uses)
 reference_image = image_path + test_images[0]
-encoded_image = encode_image_to_base64(reference_image)
-
-## WRAP IN OWN FUNCTION TODO run_image_analysis etc
-
-# Encode the test image to base64
-reference_image = image_path + test_images[0]
-encoded_image = encode_image_to_base64(reference_image)
+encoded_image = encode_image_file(reference_image)
 
 # Select the unique subcategories from the DataFrame
 unique_subcategories = styles_df['articleType'].unique()
 
 # Analyze the image and return the results
-analysis = analyze_image(encoded_image, unique_subcategories)
-if analysis is None:
-    print("Error: Failed to analyze image")
-    exit(1)
-
 try:
-    image_analysis = json.loads(analysis)
-except (json.JSONDecodeError, TypeError) as e:
-    print(f"Error parsing analysis result: {e}")
-    print(f"Raw analysis result: {analysis}")
+    image_analysis = run_image_analysis(encoded_image, unique_subcategories)
+except ValueError as e:
+    print(f"Error: {e}")
     exit(1)
 
 # Display the image and the analysis results
 display(Image(filename=reference_image))
 print(image_analysis)
 
-## Break this out into own file TODO match_from_image
-# Extract the relevant features from the analysis
+# Find the most similar items of the same gender (or unisex) and a different category
+searched_items, matching_items = match_from_analysis(catalog, image_analysis)
 item_descs = image_analysis['items']
-item_category = image_analysis['category']
-item_gender = image_analysis['gender']
-
-
-# Filter data such that we only look through the items of the same gender (or unisex) and different category
-filtered_items = styles_df.loc[styles_df['gender'].isin([item_gender, 'Unisex'])]
-filtered_items = filtered_items[filtered_items['articleType'] != item_category]
-print(str(len(filtered_items)) + " Remaining Items")
-
-# Find the most similar items based on the input item descriptions
-matching_items = find_matching_items_with_rag(filtered_items, item_descs)
+print(str(searched_items) + " Remaining Items")
 
-# Display the matching items (this will display 2 items for each description in the image analysis)
+# Display the matching outfit (at most one item for each description in the image analysis)
 html = ""
-paths = []
+paths = {}
 for i, item in enumerate(matching_items):
     item_id = item['id']
         
     # Path to the image file
     image_path = f'../openai-cookbook/examples/data/sample_clothes/sample_images/{item_id}.jpg'
-    paths.append(image_path)
+    paths[item_id] = image_path
     html += f'<img src="{image_path}" style="display:inline;margin:1px"/>'
 
 # Print the matching item description as a reminder of what we are looking for
@@ -96,19 +71,22 @@ print(item_descs)
 display(HTML(html))
 
 
-# Select the unique paths for the generated images
-paths = list(set(paths))
-
-for path in paths:
+# Unique candidates keyed by item id (the guardrail verdict cache key); skip missing image files
+candidates = {}
+for item_id, path in paths.items():
     # Run a check to see if file exists
     if not os.path.exists(path):
         print(f"⚠️ Image not found, skipping: {path}")
         continue
-    # Encode the test image to base64
-    suggested_image = encode_image_to_base64(path)
-    
-    # Check if the items match
-    match_result = check_match(encoded_image, suggested_image)
+    # Cached thumbnail of the suggested image, loaded in the worker thread (only on a verdict cache miss)
+    candidates[item_id] = lambda item_id=item_id, path=path: candidate_thumbnail(item_id, path)
+
+# Check all candidates concurrently; results arrive as each check finishes
+for item_id, match_result, error in check_matches(encoded_image, candidates):
+    path = paths[item_id]
+    if error is not None:
+        print(f"Error: Failed to check match for {path}: {error}")
+        continue
     if match_result is None:
         print(f"Error: Failed to check match for {path}")
         continue
@@ -0,0 +1,59 @@
+"""
+test_ann_index.py
+IVF index recall against exact search on clustered synthetic vectors, with and without a row restriction.
+
+    python -m pytest tests
+"""
+
+# 3P Imports
+import numpy as np
+import pytest
+
+# Local application imports
+from match.ann_index import IVFIndex, recall_at_k
+from match.vector_index import VectorIndex, normalize_rows
+
+
+def clustered_catalog(n_items=3000, dim=32, n_clusters=24, noise=0.35, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim))
+    vectors = centers[rng.integers(n_clusters, size=n_items)] + noise * rng.standard_normal((n_items, dim))
+    queries = vectors[rng.choice(n_items, size=50, replace=False)] + 0.1 * rng.standard_normal((50, dim))
+    return normalize_rows(vectors), normalize_rows(queries)
+
+
+@pytest.fixture(scope="module")
+def indexes():
+    matrix, queries = clustered_catalog()
+    return IVFIndex.build(matrix, n_lists=40, nprobe=8), VectorIndex(matrix, normalized=True), queries
+
+
+def test_recall_at_10_against_exact_search(indexes):
+    ivf, exact, queries = indexes
+    assert recall_at_k(ivf, exact, queries, k=10) >= 0.9
+
+
+def test_probing_every_list_is_exact(indexes):
+    ivf, exact, queries = indexes
+    ivf_hits = ivf.search_batch(queries, threshold=-1.0, top_k=10, nprobe=len(ivf.centroids))
+    exact_hits = exact.search_batch(queries, threshold=-1.0, top_k=10)
+    assert [[row for row, _ in hits] for hits in ivf_hits] == [[row for row, _ in hits] for hits in exact_hits]
+
+
+def test_row_restriction_keeps_recall_and_only_returns_allowed_rows(indexes):
+    ivf, exact, queries = indexes
+    rows = np.flatnonzero(np.random.default_rng(1).random(len(ivf)) < 0.5)
+
+    ivf_hits = ivf.search_batch(queries, threshold=-1.0, top_k=10, rows=rows)
+    exact_hits = exact.search_batch(queries, threshold=-1.0, top_k=10, rows=rows)
+    allowed = set(rows.tolist())
+    assert all(row in allowed for hits in ivf_hits for row, _ in hits)
+
+    recall = np.mean([
+        len({row for row, _ in approx} & {row for row, _ in truth}) / len(truth)
+        for approx, truth in zip(ivf_hits, exact_hits)
+    ])
+    assert recall >= 0.9
+
+    full_probe = ivf.search_batch(queries, threshold=-1.0, top_k=10, rows=rows, nprobe=len(ivf.centroids))
+    assert [[row for row, _ in hits] for hits in full_probe] == [[row for row, _ in hits] for hits in exact_hits]
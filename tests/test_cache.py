@@ -0,0 +1,100 @@
+"""
+test_cache.py
+SQLite and tiered caches: the running byte total, batched writes, LRU eviction under the byte budget and TTLs
+across tiers; the embedding cache's fetch-only-the-misses contract.
+
+    python -m pytest tests
+"""
+
+# Standard library imports
+import itertools
+
+# Local application imports
+from utils import cache as cache_module
+from utils.cache import SQLiteCache, TieredCache
+from utils.embedding_cache import EmbeddingCache
+
+
+def stored_bytes(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+def test_running_total_tracks_inserts_and_replacements(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set("a", b"x" * 10)
+    cache.set_many([("b", b"y" * 20), ("c", b"z" * 30)])
+    cache.set("a", b"x" * 5)  # replacing a key swaps its size, not adds to it
+
+    assert cache._bytes == stored_bytes(cache) == 55
+    assert len(cache) == 3
+    assert cache.get("a") == b"x" * 5
+
+
+def test_set_many_keeps_the_last_value_of_a_repeated_key(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set_many([("a", b"1"), ("b", b"22"), ("a", b"333")])
+
+    assert cache.get("a") == b"333"
+    assert cache._bytes == stored_bytes(cache) == 5
+
+
+def test_least_recently_used_entries_are_evicted_to_fit_the_budget(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(clock))
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_bytes=100)
+    for key in "abc":
+        cache.set(key, b"v" * 30)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("d", b"v" * 30)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache._bytes == stored_bytes(cache) <= 100
+    assert cache.evictions == 1
+
+
+def test_running_total_resumes_from_an_existing_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteCache(path).set_many([("a", b"x" * 40), ("b", b"y" * 2)])
+
+    assert SQLiteCache(path)._bytes == 42
+
+
+def test_promoted_disk_hit_expires_at_its_original_time(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    path = str(tmp_path / "cache.sqlite")
+    TieredCache(path, ttl=10).set("a", b"value")
+
+    # A fresh process (empty memory tier) promotes the disk row 8s after it was written
+    now[0] = 1008.0
+    cache = TieredCache(path, ttl=10)
+    assert cache.get("a") == b"value"
+
+    # 11s after the write it has expired, even though it was promoted only 3s ago
+    now[0] = 1011.0
+    assert cache.get("a") is None
+
+
+def test_get_or_fetch_only_fetches_misses_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    requested = []
+
+    def fetch(texts):
+        requested.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    cache = EmbeddingCache(path)
+    assert cache.get_or_fetch(["red scarf", "blue  jeans"], fetch) == [[9.0, 1.0], [11.0, 1.0]]
+    # Whitespace is normalized, so "blue jeans" is a hit; only the new text is fetched
+    assert cache.get_or_fetch(["blue jeans", "belt"], fetch) == [[11.0, 1.0], [4.0, 1.0]]
+    assert requested == [["red scarf", "blue  jeans"], ["belt"]]
+
+    assert EmbeddingCache(path).get_or_fetch(["red scarf", "belt"], fetch) == [[9.0, 1.0], [4.0, 1.0]]
+    assert len(requested) == 2
+
+
+def test_get_or_fetch_caches_nothing_when_fetch_fails(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    assert cache.get_or_fetch(["red scarf"], lambda texts: None) is None
+    assert cache.get("red scarf") is None
@@ -0,0 +1,66 @@
+"""
+test_catalog_store.py
+Catalog store lifecycle: staleness against the embeddings CSV and streamed rewrites.
+
+    python -m pytest tests
+"""
+
+# Standard library imports
+import os
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+
+# Local application imports
+from utils.catalog_store import CatalogStoreWriter, load_catalog, save_catalog, store_exists, store_outdated
+
+
+def write_store(store_dir, n_items=4, dim=8, seed=0):
+    metadata_df = pd.DataFrame({"id": np.arange(n_items), "productDisplayName": [f"Item {i}" for i in range(n_items)]})
+    save_catalog(metadata_df, np.random.default_rng(seed).standard_normal((n_items, dim)), str(store_dir))
+    return metadata_df
+
+
+def test_store_is_outdated_when_missing_or_older_than_the_csv(tmp_path):
+    store_dir, csv_path = tmp_path / "store", tmp_path / "styles.csv"
+    csv_path.write_text("id,embeddings\n")
+    assert store_outdated(str(csv_path), str(store_dir))
+
+    write_store(store_dir)
+    os.utime(csv_path, (1, 1))
+    assert not store_outdated(str(csv_path), str(store_dir))
+    assert not store_outdated(str(tmp_path / "missing.csv"), str(store_dir))
+
+    # A regenerated CSV is newer than the manifest
+    manifest_mtime = os.path.getmtime(store_dir / "manifest.json")
+    os.utime(csv_path, (manifest_mtime + 10, manifest_mtime + 10))
+    assert store_outdated(str(csv_path), str(store_dir))
+
+
+def test_saved_store_round_trips_unit_vectors(tmp_path):
+    metadata_df = write_store(tmp_path / "store")
+    loaded_df, embeddings = load_catalog(str(tmp_path / "store"))
+    assert loaded_df["id"].tolist() == metadata_df["id"].tolist()
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-6)
+
+
+def test_streamed_rewrite_keeps_the_old_store_until_close(tmp_path):
+    store_dir = tmp_path / "store"
+    write_store(store_dir, n_items=4)
+    (store_dir / "ivf_index.npz").write_bytes(b"derived from the old contents")
+
+    writer = CatalogStoreWriter(str(store_dir))
+    writer.append(pd.DataFrame({"id": [10, 11]}), np.eye(2, 8))
+    # Mid-job, the old store is intact and still loads
+    assert store_exists(str(store_dir))
+    assert len(load_catalog(str(store_dir))[0]) == 4
+
+    writer.append(pd.DataFrame({"id": [12]}), np.ones((1, 8)))
+    writer.close()
+
+    metadata_df, embeddings = load_catalog(str(store_dir))
+    assert metadata_df["id"].tolist() == [10, 11, 12]
+    assert embeddings.shape == (3, 8)
+    assert not (store_dir / "ivf_index.npz").exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["store"]
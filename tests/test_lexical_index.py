@@ -0,0 +1,93 @@
+"""
+test_lexical_index.py
+BM25 term matching and row restriction, reciprocal rank fusion, and hybrid retrieval through the catalog index
+(eager BM25 build, lexical candidates, vector fallback).
+
+    python -m pytest tests
+"""
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local application imports
+from match.catalog_index import build_catalog_index
+from match.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CATALOG = pd.DataFrame({
+    "id": [100, 101, 102, 103, 104],
+    "productDisplayName": [
+        "Navy Blue Formal Shirt",
+        "White Casual Shirt",
+        "Blue Slim Jeans",
+        "Black Leather Belt",
+        "Red Cotton Scarf",
+    ],
+    "baseColour": ["Navy Blue", "White", "Blue", "Black", "Red"],
+    "articleType": ["Shirts", "Shirts", "Jeans", "Belts", "Scarves"],
+})
+
+
+def test_tokenize_folds_plurals_and_drops_stopwords():
+    assert tokenize("Men's Shirts and Jeans") == ["men", "shirt", "jean"]
+
+
+def test_exact_terms_rank_first():
+    rows, scores = BM25Index(CATALOG).search("navy shirt")
+    assert rows[0] == 0
+    assert set(rows) == {0, 1}
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_rows_without_a_shared_term_are_never_returned():
+    rows, scores = BM25Index(CATALOG).search("wool gloves")
+    assert len(rows) == len(scores) == 0
+
+
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_search_is_restricted_to_the_given_rows(use_mask):
+    index = BM25Index(CATALOG)
+    allowed = np.array([1, 2, 4])
+    if use_mask:
+        rows, _ = index.search("blue shirt", mask=index.row_mask(allowed))
+    else:
+        rows, _ = index.search("blue shirt", rows=allowed)
+    assert set(rows) == {1, 2}
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([[7, 3, 5], [3, 9]], k=60)
+    assert fused[3] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[7] == pytest.approx(1 / 61)
+    # A row ranked in both lists beats the top of a single list
+    assert max(fused, key=fused.get) == 3
+
+
+def embedded_catalog(dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((len(CATALOG), dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    styles_df = CATALOG.copy()
+    styles_df["embeddings"] = list(vectors)
+    return styles_df, vectors
+
+
+@pytest.mark.parametrize("mode, built", [("hybrid", True), ("vector", False)])
+def test_bm25_index_is_built_with_the_catalog_index_in_hybrid_mode(tmp_path, mode, built):
+    styles_df, _ = embedded_catalog()
+    catalog = build_catalog_index(styles_df, store_dir=str(tmp_path / "no_store"), mode=mode)
+    assert (catalog._lexical is not None) == built
+
+
+def test_hybrid_search_scores_lexical_candidates_and_falls_back_to_vectors(tmp_path):
+    styles_df, vectors = embedded_catalog()
+    view = build_catalog_index(styles_df, store_dir=str(tmp_path / "no_store"), mode="hybrid").view()
+
+    # The query vector is row 2 (jeans) but the text only matches shirts: both shirts are scored and pass
+    hits = view.hybrid_search_batch(vectors[[2]], ["white shirt"], threshold=-1.0, top_k=2)[0]
+    assert {row for row, _ in hits} == {0, 1}
+
+    # No lexical candidate at all: the whole view is searched by vector
+    hits = view.hybrid_search_batch(vectors[[2]], ["wool gloves"], threshold=0.5, top_k=1)[0]
+    assert hits[0][0] == 2
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,76 @@
+"""
+test_outfit_search.py
+MMR outfit assembly: the relevance/redundancy trade-off at its extremes, non-qualifying candidates and one item per
+articleType, for both the batch (`mmr_select`) and the streaming (`IncrementalOutfit`) selectors; exact search over
+prefiltered frames.
+
+    python -m pytest tests
+"""
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local application imports
+from match import catalog_index
+from match.catalog_index import frame_view
+from match.outfit_search import IncrementalOutfit, mmr_select
+from match.vector_index import VectorIndex
+
+NO = -np.inf
+
+# Candidates 0 and 1 are near-duplicates; candidate 2 is unlike both
+ITEM_SIMILARITY = np.array([[1.0, 0.95, 0.1], [0.95, 1.0, 0.1], [0.1, 0.1, 1.0]], dtype=np.float32)
+VECTORS = np.linalg.cholesky(ITEM_SIMILARITY.astype(np.float64)).astype(np.float32)  # rows with those dot products
+
+
+@pytest.mark.parametrize("mmr_lambda", [0.0, 0.5, 1.0])
+def test_non_qualifying_candidates_are_never_selected(mmr_lambda):
+    relevance = np.array([[NO, 0.7, NO], [NO, NO, NO]], dtype=np.float32)
+    selected = mmr_select(relevance, ITEM_SIMILARITY, ["a", "b", "c"], mmr_lambda)
+    assert selected == [(0, 1)]
+
+
+@pytest.mark.parametrize("mmr_lambda", [0.0, 1.0])
+def test_nothing_qualifies_returns_an_empty_outfit(mmr_lambda):
+    relevance = np.full((2, 3), NO, dtype=np.float32)
+    assert mmr_select(relevance, ITEM_SIMILARITY, ["a", "b", "c"], mmr_lambda) == []
+    assert IncrementalOutfit(mmr_lambda).pick(relevance[0], VECTORS, ["a", "b", "c"]) is None
+
+
+def test_lambda_one_is_greedy_by_relevance():
+    relevance = np.array([[0.9, 0.8, 0.3], [0.85, 0.8, 0.4]], dtype=np.float32)
+    selected = mmr_select(relevance, ITEM_SIMILARITY, ["a", "b", "c"], mmr_lambda=1.0)
+    # Best pair first, then the best remaining candidate for the other description, near-duplicate or not
+    assert selected == [(0, 0), (1, 1)]
+
+
+def test_lambda_zero_picks_the_least_redundant_qualifying_item():
+    relevance = np.array([[0.9, 0.8, 0.3], [0.85, 0.8, 0.4]], dtype=np.float32)
+    selected = mmr_select(relevance, ITEM_SIMILARITY, ["a", "b", "c"], mmr_lambda=0.0)
+    assert selected[1][1] == 2
+
+
+def test_one_item_per_article_type():
+    relevance = np.array([[0.9, 0.8, 0.3], [0.85, 0.8, 0.4]], dtype=np.float32)
+    selected = mmr_select(relevance, ITEM_SIMILARITY, ["Shirts", "Shirts", "Jeans"], mmr_lambda=1.0)
+    assert selected == [(0, 0), (1, 2)]
+
+
+@pytest.mark.parametrize("mmr_lambda, second_pick", [(1.0, 1), (0.0, 2)])
+def test_incremental_outfit_at_the_lambda_extremes(mmr_lambda, second_pick):
+    outfit = IncrementalOutfit(mmr_lambda)
+    assert outfit.pick(np.array([0.9, NO, NO], dtype=np.float32), VECTORS, ["a", "b", "c"]) == 0
+    assert outfit.pick(np.array([NO, 0.8, 0.4], dtype=np.float32), VECTORS, ["a", "b", "c"]) == second_pick
+
+
+@pytest.mark.parametrize("backend, quantization", [("ivf", "none"), ("exact", "int8")])
+def test_frame_view_searches_exactly_whatever_the_index_settings(monkeypatch, backend, quantization):
+    monkeypatch.setattr(catalog_index, "SEARCH_BACKEND", backend)
+    monkeypatch.setattr(catalog_index, "SEARCH_QUANTIZATION", quantization)
+    styles_df = pd.DataFrame({"id": [1, 2, 3], "embeddings": list(VECTORS)})
+
+    view = frame_view(styles_df)
+    assert isinstance(view.catalog.index, VectorIndex)
+    assert view.search_batch(VECTORS[[2]], threshold=0.5, top_k=1)[0][0][0] == 2
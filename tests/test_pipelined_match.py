@@ -0,0 +1,103 @@
+"""
+test_pipelined_match.py
+Unit tests for the incremental analysis parser of the pipelined match: chunk boundaries, escaped quotes and key order.
+
+    python -m pytest tests
+"""
+
+# Standard library imports
+import json
+
+# 3P Imports
+import pytest
+
+# Local application imports
+from match.pipelined_match import AnalysisStreamParser
+
+
+def feed_in_chunks(text, size):
+    """Feed `text` to a new parser `size` characters at a time; returns (parser, all completed pairs)"""
+    parser = AnalysisStreamParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed += parser.feed(text[start:start + size])
+    return parser, completed
+
+
+ANALYSIS = {"category": "Jackets", "gender": "Women", "items": ["White Sneakers", "Black Skinny Jeans", "Red Scarf"]}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 8, 1000])
+def test_fields_are_emitted_once_in_stream_order_whatever_the_chunking(size):
+    parser, completed = feed_in_chunks(json.dumps(ANALYSIS), size)
+
+    assert completed == [
+        ("category", "Jackets"),
+        ("gender", "Women"),
+        ("item", "White Sneakers"),
+        ("item", "Black Skinny Jeans"),
+        ("item", "Red Scarf"),
+    ]
+    analysis, remaining = parser.finish()
+    assert analysis == ANALYSIS
+    assert remaining == []
+
+
+def test_item_is_only_emitted_once_its_string_closes():
+    parser = AnalysisStreamParser()
+    assert parser.feed('{"category": "Jackets", "gender": "Wom') == [("category", "Jackets")]
+    assert parser.feed('en", "items": ["White Sne') == [("gender", "Women")]
+    assert parser.feed("akers") == []
+    assert parser.feed('"') == [("item", "White Sneakers")]
+    assert parser.feed(', "Red Scarf"]}') == [("item", "Red Scarf")]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_escaped_quotes_and_backslashes_are_decoded(size):
+    analysis = {"category": 'Say "hi"', "gender": "Men", "items": ['12" Vinyl Tee', "Back\\slash Belt", "Plain Cap"]}
+    _, completed = feed_in_chunks(json.dumps(analysis), size)
+
+    assert completed == [
+        ("category", 'Say "hi"'),
+        ("gender", "Men"),
+        ("item", '12" Vinyl Tee'),
+        ("item", "Back\\slash Belt"),
+        ("item", "Plain Cap"),
+    ]
+
+
+def test_escape_split_across_chunks_does_not_close_the_string_early():
+    parser = AnalysisStreamParser()
+    assert parser.feed('{"items": ["12\\') == []
+    assert parser.feed('" Vinyl Tee"') == [("item", '12" Vinyl Tee')]
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_items_first_still_emits_every_field_and_stops_at_the_array_end(size):
+    text = json.dumps({"items": ["Blue Jeans", "Belt [leather]"], "category": "Shirts", "gender": "Men"})
+    parser, completed = feed_in_chunks(text, size)
+
+    # Strings after the closing "]" are not items, and a "]" inside a string does not end the array
+    assert [value for field, value in completed if field == "item"] == ["Blue Jeans", "Belt [leather]"]
+    assert ("category", "Shirts") in completed
+    assert ("gender", "Men") in completed
+    assert parser.finish()[1] == []
+
+
+def test_finish_returns_fields_feed_missed():
+    # Valid JSON the incremental patterns do not recognise: a key spelled with a unicode escape
+    parser = AnalysisStreamParser()
+    completed = parser.feed('{"\\u0063ategory": "Shirts", "gender": "Men", "items": ["Blue Jeans"]}')
+    assert completed == [("gender", "Men"), ("item", "Blue Jeans")]
+
+    analysis, remaining = parser.finish()
+    assert analysis["category"] == "Shirts"
+    assert remaining == [("category", "Shirts")]
+
+
+@pytest.mark.parametrize("text", ['{"category": "Shirts", "gender": "Men", "items": ["Blue', '{"category": "Shirts"}', "not json"])
+def test_finish_rejects_truncated_or_incomplete_analyses(text):
+    parser = AnalysisStreamParser()
+    parser.feed(text)
+    with pytest.raises(ValueError):
+        parser.finish()
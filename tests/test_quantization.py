@@ -0,0 +1,86 @@
+"""
+test_quantization.py
+Compact catalog indexes: int8/float16 codes, Matryoshka truncation, recall against exact search, exact re-ranking,
+row restriction and the fingerprint check on load.
+
+    python -m pytest tests
+"""
+
+# 3P Imports
+import numpy as np
+import pytest
+
+# Local application imports
+from match.ann_index import recall_at_k
+from match.quantization import QuantizedIndex, quantize, truncate_dimensions
+from match.vector_index import VectorIndex, normalize_rows
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rng = np.random.default_rng(0)
+    matrix = normalize_rows(rng.standard_normal((2000, 64)))
+    queries = normalize_rows(matrix[rng.choice(len(matrix), size=40, replace=False)] + 0.2 * rng.standard_normal((40, 64)))
+    return matrix, queries, VectorIndex(matrix, normalized=True)
+
+
+def test_truncation_keeps_leading_dims_at_unit_length():
+    matrix = normalize_rows(np.random.default_rng(1).standard_normal((5, 16)))
+    truncated = truncate_dimensions(matrix, 4)
+    assert truncated.shape == (5, 4)
+    np.testing.assert_allclose(np.linalg.norm(truncated, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(truncated, normalize_rows(matrix[:, :4]))
+    np.testing.assert_allclose(truncate_dimensions(matrix, None), matrix, rtol=1e-6)
+
+
+@pytest.mark.parametrize("quantization, dtype, tolerance", [("int8", np.int8, 0.01), ("float16", np.float16, 1e-3)])
+def test_codes_approximate_the_vectors(catalog, quantization, dtype, tolerance):
+    matrix = catalog[0]
+    codes, scales = quantize(matrix, quantization)
+    assert codes.dtype == dtype
+    decoded = codes.astype(np.float32) * (scales[:, None] if scales is not None else 1.0)
+    assert np.abs(decoded - matrix).max() < tolerance
+
+
+@pytest.mark.parametrize("quantization", ["int8", "float16"])
+def test_recall_without_reranking(catalog, quantization):
+    matrix, queries, exact = catalog
+    index = QuantizedIndex.build(matrix, quantization, rerank=0)
+    assert index.rerank_matrix is None
+    assert recall_at_k(index, exact, queries, k=10) >= 0.95
+
+
+def test_reranking_returns_exact_results(catalog):
+    matrix, queries, exact = catalog
+    index = QuantizedIndex.build(matrix, "int8", rerank=100)
+    for approx_hits, exact_hits in zip(index.search_batch(queries, -1.0, 10), exact.search_batch(queries, -1.0, 10)):
+        assert [row for row, _ in approx_hits] == [row for row, _ in exact_hits]
+        np.testing.assert_allclose([s for _, s in approx_hits], [s for _, s in exact_hits], rtol=1e-5)
+
+
+def test_vectors_are_truncated_codes_without_a_rerank_matrix(catalog):
+    matrix = catalog[0]
+    assert QuantizedIndex.build(matrix, "int8", dims=16, rerank=0).vectors([0, 1]).shape == (2, 16)
+    np.testing.assert_array_equal(QuantizedIndex.build(matrix, "int8", dims=16, rerank=10).vectors([0, 1]), matrix[[0, 1]])
+
+
+@pytest.mark.parametrize("rerank", [0, 50])
+def test_row_restriction(catalog, rerank):
+    matrix, queries, _ = catalog
+    rows = np.arange(0, len(matrix), 3)
+    index = QuantizedIndex.build(matrix, "int8", rerank=rerank)
+    hits = index.search_batch(queries, threshold=-1.0, top_k=5, rows=rows)
+    assert all(row % 3 == 0 for query_hits in hits for row, _ in query_hits)
+    assert all(len(query_hits) == 5 for query_hits in hits)
+
+
+def test_load_rejects_an_index_built_for_other_contents(tmp_path, catalog):
+    matrix = catalog[0]
+    path = str(tmp_path / "quantized.npz")
+    QuantizedIndex.build(matrix, "int8").save(path, fingerprint="abc")
+
+    assert len(QuantizedIndex.load(path, matrix, fingerprint="abc")) == len(matrix)
+    with pytest.raises(ValueError):
+        QuantizedIndex.load(path, matrix, fingerprint="def")
+    with pytest.raises(ValueError):
+        QuantizedIndex.load(path, matrix[:10])
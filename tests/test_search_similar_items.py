@@ -0,0 +1,54 @@
+"""
+test_search_similar_items.py
+find_similar_items (VectorIndex top-k) must return what the original per-item loop returned: same items, same order
+(ties broken by the lower index), same threshold and top_k handling.
+
+    python -m pytest tests
+"""
+
+# 3P Imports
+import numpy as np
+import pytest
+
+# Local application imports
+from match.search_similar_items import cosine_similarity_manual, find_similar_items
+
+
+def loop_find_similar_items(input_embedding, embeddings, threshold=0.5, top_k=2):
+    """The original implementation: one cosine similarity per item, filter, stable sort"""
+    similarities = [(index, cosine_similarity_manual(input_embedding, vec)) for index, vec in enumerate(embeddings)]
+    filtered_similarities = [(index, sim) for index, sim in similarities if sim >= threshold]
+    return sorted(filtered_similarities, key=lambda x: x[1], reverse=True)[:top_k]
+
+
+def catalog_with_ties(seed=0, n_items=60, dim=16):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n_items, dim))
+    # Exact duplicates score identically, so the tie-break is exercised
+    embeddings[10] = embeddings[3]
+    embeddings[40] = embeddings[3]
+    embeddings[25] = embeddings[7]
+    return [list(vector) for vector in embeddings], rng
+
+
+@pytest.mark.parametrize("threshold", [-1.0, 0.0, 0.2, 0.5, 0.99])
+@pytest.mark.parametrize("top_k", [1, 2, 3, 10, 100])
+def test_matches_the_original_loop(threshold, top_k):
+    embeddings, rng = catalog_with_ties()
+    queries = [embeddings[3], embeddings[7]] + [list(rng.standard_normal(16)) for _ in range(5)]
+
+    for query in queries:
+        expected = loop_find_similar_items(query, embeddings, threshold, top_k)
+        result = find_similar_items(query, embeddings, threshold, top_k)
+        assert [index for index, _ in result] == [index for index, _ in expected]
+        assert [score for _, score in result] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+
+def test_ties_keep_catalog_order():
+    embeddings, _ = catalog_with_ties()
+    result = find_similar_items(embeddings[3], embeddings, threshold=0.99, top_k=3)
+    assert [index for index, _ in result] == [3, 10, 40]
+
+
+def test_empty_catalog_returns_no_items():
+    assert find_similar_items([1.0, 0.0], [], threshold=0.0) == []
@@ -0,0 +1,130 @@
+"""
+analysis_cache.py
+Cache in front of `analysis.analyze_image`. Entries are keyed by a perceptual hash of the uploaded image
+plus the set of subcategories offered to the model, and a lookup returns the stored JSON for identical or
+near-duplicate images (Hamming distance <= `max_distance`). The SQLite store is bounded and evicts the
+least recently used entries; counters show how many vision calls were saved.
+"""
+
+# Standard library imports
+import os
+import sqlite3
+import threading
+import time
+
+# Local Application Imports
+from config import ANALYSIS_CACHE_MAX_DISTANCE, ANALYSIS_CACHE_MAX_ENTRIES, CACHE_DIR, GPT_MODEL
+from utils.cache import make_key
+from utils.image_hash import hamming_distances, to_signed64
+
+
+def subcategories_key(subcategories):
+    """Order-independent key for the subcategory list passed to the model"""
+    return make_key(GPT_MODEL, *sorted({str(subcategory) for subcategory in subcategories}))
+
+
+class AnalysisCache:
+    """
+    Perceptual-hash cache of image analysis results.
+    """
+
+    def __init__(self, path, max_entries=ANALYSIS_CACHE_MAX_ENTRIES, max_distance=ANALYSIS_CACHE_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS analyses (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   phash INTEGER NOT NULL,
+                   subcategories TEXT NOT NULL,
+                   result TEXT NOT NULL,
+                   hit_count INTEGER NOT NULL DEFAULT 0,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_subcategories ON analyses (subcategories)")
+        self._conn.commit()
+
+    def get(self, phash, subcategories):
+        """Stored analysis JSON for the closest cached image within `max_distance`, or None"""
+        key = subcategories_key(subcategories)
+        with self._lock:
+            rows = self._conn.execute("SELECT id, phash FROM analyses WHERE subcategories = ?", (key,)).fetchall()
+            if not rows:
+                self.misses += 1
+                return None
+
+            distances = hamming_distances(phash, [row[1] for row in rows])
+            best = int(distances.argmin())
+            if distances[best] > self.max_distance:
+                self.misses += 1
+                return None
+
+            if distances[best] == 0:
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+            entry_id = rows[best][0]
+            self._conn.execute(
+                "UPDATE analyses SET hit_count = hit_count + 1, accessed = ? WHERE id = ?", (time.time(), entry_id)
+            )
+            self._conn.commit()
+            return self._conn.execute("SELECT result FROM analyses WHERE id = ?", (entry_id,)).fetchone()[0]
+
+    def set(self, phash, subcategories, result):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analyses (phash, subcategories, result, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (to_signed64(phash), subcategories_key(subcategories), result, now, now),
+            )
+            # Keep the store bounded: drop the least recently used entries beyond max_entries
+            cursor = self._conn.execute(
+                """DELETE FROM analyses WHERE id IN (
+                       SELECT id FROM analyses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+            self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total_hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM analyses"
+            ).fetchone()
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "entries": entries,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+            "vision_calls_saved": self.exact_hits + self.near_hits,
+            "vision_calls_saved_total": total_hits,
+        }
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """Return the process-wide analysis cache, creating it on first use"""
+    global _analysis_cache
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache(os.path.join(CACHE_DIR, "image_analysis.sqlite"))
+    return _analysis_cache
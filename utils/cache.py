@@ -0,0 +1,242 @@
+"""
+cache.py
+Small caching building blocks shared by the pipeline: an in-process LRU tier, a persistent SQLite tier
+that survives restarts, and a two-tier cache that combines them. Values are stored as bytes; callers
+decide how to serialize.
+"""
+
+# Standard library imports
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(*parts):
+    """
+    Build a content-addressed cache key from strings/bytes parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by number of entries.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache in a single SQLite file.
+    Entries older than `ttl` seconds are treated as misses, and the least recently used entries are
+    evicted once the stored values exceed `max_bytes`. The byte total is kept as a running count (re-read from
+    the file every RESYNC_WRITES writes, since other processes may share it), so a write never scans the table.
+    """
+
+    RESYNC_WRITES = 1024
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                   key TEXT PRIMARY KEY,
+                   value BLOB NOT NULL,
+                   size INTEGER NOT NULL,
+                   created REAL NOT NULL,
+                   accessed REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        self._conn.commit()
+        self._bytes = self._total_bytes()
+        self._writes = 0
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """(value, created) for a live entry, or None; `created` lets an upper tier expire it at the same time"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._delete([key])
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0], row[1]
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def set_many(self, items):
+        """Store several (key, value) pairs in one transaction"""
+        now = time.time()
+        items = list(dict(items).items())  # last value wins for a repeated key
+        with self._lock:
+            self._delete([key for key, _ in items])
+            self._conn.executemany(
+                "INSERT INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(key, sqlite3.Binary(value), len(value), now, now) for key, value in items],
+            )
+            self._bytes += sum(len(value) for _, value in items)
+            self._writes += len(items)
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, keys):
+        """Delete entries by key, keeping the running byte total in step"""
+        removed = 0
+        for key in keys:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bytes -= row[0]
+                removed += 1
+        return removed
+
+    def _evict(self):
+        if self.ttl is not None:
+            cutoff = time.time() - self.ttl
+            expired = [key for key, in self._conn.execute("SELECT key FROM entries WHERE created < ?", (cutoff,))]
+            self.evictions += self._delete(expired)
+
+        if self._writes >= self.RESYNC_WRITES:
+            self._bytes, self._writes = self._total_bytes(), 0
+        if self._bytes <= self.max_bytes:
+            return
+
+        # Over budget (rare): re-read the true total, then drop least recently used entries until it fits again
+        self._bytes = self._total_bytes()
+        stale_keys = []
+        freed = 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if self._bytes - freed <= self.max_bytes:
+                break
+            stale_keys.append(key)
+            freed += size
+        self.evictions += self._delete(stale_keys)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class TieredCache:
+    """
+    In-process LRU tier in front of a persistent SQLite tier. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, path, max_entries=1024, max_bytes=256 * 1024 * 1024, ttl=None):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.disk = SQLiteCache(path, max_bytes=max_bytes, ttl=ttl)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # The memory tier stores (created, value) so it honours the same TTL as the disk tier
+        entry = self.memory.get(key)
+        if entry is not None and (self.ttl is None or time.time() - entry[0] <= self.ttl):
+            self.hits += 1
+            return entry[1]
+
+        entry = self.disk.get_entry(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        # Promote with the disk row's creation time, so the TTL is not restarted by the promotion
+        value, created = entry
+        self.memory.set(key, (created, value))
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, (time.time(), value))
+        self.disk.set(key, value)
+
+    def set_many(self, items):
+        """Store several (key, value) pairs; one disk transaction"""
+        items = list(items)
+        now = time.time()
+        for key, value in items:
+            self.memory.set(key, (now, value))
+        self.disk.set_many(items)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats(),
+        }
@@ -0,0 +1,280 @@
+"""
+catalog_store.py
+Binary on-disk format for the embedded catalog. Vectors live in a float32 `.npy` matrix that is memory-mapped
+at load time, next to a columnar metadata table (Parquet when pyarrow is installed, CSV otherwise).
+Includes a converter from the legacy `sample_styles_with_embeddings.csv` file.
+"""
+
+# Standard library imports
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+# 3P Imports
+import numpy as np
+import pandas as pd
+
+# Local Application Imports
+from config import EMBEDDING_MODEL
+
+DEFAULT_CSV_PATH = "data/sample_clothes/sample_styles_with_embeddings.csv"
+DEFAULT_STORE_DIR = "data/sample_clothes/catalog_store"
+
+EMBEDDINGS_FILE = "embeddings.npy"
+MANIFEST_FILE = "manifest.json"
+# Files other jobs derive from the store contents: IVF and quantized indexes, compatibility graph, visual index
+DERIVED_FILES = ("ivf_index.npz", "quantized_*.npz", "compatibility_graph.npz", "image_embedding*.npy")
+
+
+def parse_embedding(text):
+    """
+    Parse one "[0.1, 0.2, ...]" embedding string into a float32 vector without building Python floats.
+    """
+    return np.array(text.strip().strip("[]").split(","), dtype=np.float32)
+
+
+def _normalize_in_place(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _write_metadata(df, store_dir):
+    try:
+        df.to_parquet(os.path.join(store_dir, "metadata.parquet"), index=False)
+        return "metadata.parquet"
+    except ImportError:
+        df.to_csv(os.path.join(store_dir, "metadata.csv"), index=False)
+        return "metadata.csv"
+
+
+def _read_metadata(store_dir, metadata_file):
+    path = os.path.join(store_dir, metadata_file)
+    if metadata_file.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def store_exists(store_dir=DEFAULT_STORE_DIR):
+    """Return True if `store_dir` holds a complete catalog store"""
+    return os.path.exists(os.path.join(store_dir, MANIFEST_FILE))
+
+
+def store_outdated(csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_STORE_DIR):
+    """
+    True if `store_dir` has no complete catalog store, or the embeddings CSV was written after it (e.g. by a
+    regeneration with embeddings/generate_embeddings.py), so it has to be (re)converted.
+    """
+    if not store_exists(store_dir):
+        return True
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    return os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(manifest_path)
+
+
+def store_fingerprint(store_dir=DEFAULT_STORE_DIR, metadata_df=None):
+    """
+    Short hash of what a catalog store holds: item count, dimensions, embedding model and the item ids in row order.
+    Indexes derived from the store record it, so they are never reused after the store is rewritten.
+    """
+    with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if metadata_df is None:
+        metadata_df = _read_metadata(store_dir, manifest["metadata_file"])
+    digest = hashlib.sha256(json.dumps([manifest["count"], manifest["dim"], manifest["model"]]).encode())
+    digest.update(np.ascontiguousarray(metadata_df["id"].to_numpy(dtype=np.int64)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _start_rewrite(store_dir):
+    """Unmark the store as complete and drop the files derived from its previous contents"""
+    os.makedirs(store_dir, exist_ok=True)
+    if store_exists(store_dir):
+        os.remove(os.path.join(store_dir, MANIFEST_FILE))
+    for pattern in DERIVED_FILES:
+        for path in glob.glob(os.path.join(store_dir, pattern)):
+            os.remove(path)
+
+
+def _staging_dir(store_dir):
+    """Sibling directory a streamed store is built in before it replaces `store_dir`"""
+    return os.path.normpath(store_dir) + ".partial"
+
+
+def _swap_into_place(staging_dir, store_dir):
+    """
+    Replace `store_dir` with the finished `staging_dir` by renames. The old directory (with its derived files) is
+    moved aside and deleted; readers that memory-mapped its matrix keep their mapping.
+    """
+    if os.path.exists(store_dir):
+        retired_dir = os.path.normpath(store_dir) + ".old"
+        shutil.rmtree(retired_dir, ignore_errors=True)
+        os.replace(store_dir, retired_dir)
+        os.replace(staging_dir, store_dir)
+        shutil.rmtree(retired_dir, ignore_errors=True)
+    else:
+        os.replace(staging_dir, store_dir)
+
+
+def save_catalog(metadata_df, embeddings, store_dir=DEFAULT_STORE_DIR, model=EMBEDDING_MODEL):
+    """
+    Write a catalog store. `embeddings` is any (n_items, dim) array-like aligned with `metadata_df` rows.
+    Vectors are stored L2-normalized so search can use the memory-mapped matrix as is. Indexes derived from the
+    previous contents of `store_dir` (DERIVED_FILES) are deleted.
+
+    Args:
+        metadata_df: Catalog metadata (everything except the embeddings column)
+        embeddings: Embedding vectors, one row per catalog item
+        store_dir: Output directory
+        model: Name of the embedding model, recorded in the manifest
+    """
+    _start_rewrite(store_dir)
+
+    matrix = _normalize_in_place(np.array(embeddings, dtype=np.float32, order="C"))
+    if len(matrix) != len(metadata_df):
+        raise ValueError(f"Got {len(matrix)} embeddings for {len(metadata_df)} catalog rows")
+
+    metadata_df = metadata_df.drop(columns=["embeddings"], errors="ignore").reset_index(drop=True)
+    # Write to a temp file and rename, so readers holding a memory map of the old matrix are unaffected
+    tmp_path = os.path.join(store_dir, EMBEDDINGS_FILE + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, os.path.join(store_dir, EMBEDDINGS_FILE))
+    metadata_file = _write_metadata(metadata_df, store_dir)
+
+    # The manifest is written last so a partially written store is never picked up
+    write_manifest(store_dir, matrix.shape[0], matrix.shape[1] if matrix.ndim == 2 else 0, metadata_file, model)
+    return store_dir
+
+
+def write_manifest(store_dir, count, dim, metadata_file, model=EMBEDDING_MODEL):
+    """Mark a catalog store as complete"""
+    manifest = {
+        "count": int(count),
+        "dim": int(dim),
+        "dtype": "float32",
+        "normalized": True,
+        "model": model,
+        "metadata_file": metadata_file,
+    }
+    with open(os.path.join(store_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class CatalogStoreWriter:
+    """
+    Append-only writer for catalogs larger than memory. Vectors are streamed to a raw float32 file and
+    metadata rows to a CSV; `close` turns them into a regular catalog store. Memory use is bounded by
+    the chunks passed to `append`, not the catalog size. (Metadata stays CSV in this mode so column
+    types never have to be reconciled across chunks.) The store is built in a sibling `<store_dir>.partial`
+    directory and only replaces `store_dir` on `close`, so the previous store stays usable for the whole job;
+    the files derived from it go with it.
+    """
+
+    COPY_BLOCK = 65_536
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, model=EMBEDDING_MODEL):
+        self.store_dir = store_dir
+        self.model = model
+        self.count = 0
+        self.dim = None
+
+        # A leftover staging directory is from an interrupted job
+        self._staging_dir = _staging_dir(store_dir)
+        shutil.rmtree(self._staging_dir, ignore_errors=True)
+        os.makedirs(self._staging_dir)
+        self._raw_path = os.path.join(self._staging_dir, EMBEDDINGS_FILE + ".raw")
+        self._metadata_path = os.path.join(self._staging_dir, "metadata.csv")
+        self._raw = open(self._raw_path, "wb")
+        self._metadata = open(self._metadata_path, "w", newline="")
+
+    def append(self, metadata_df, embeddings):
+        """Append one chunk of rows and their (n_rows, dim) embeddings"""
+        matrix = _normalize_in_place(np.array(embeddings, dtype=np.float32, order="C"))
+        if len(matrix) != len(metadata_df):
+            raise ValueError(f"Got {len(matrix)} embeddings for {len(metadata_df)} catalog rows")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim embeddings, got {matrix.shape[1]}")
+
+        self._raw.write(matrix.tobytes())
+        metadata_df.drop(columns=["embeddings"], errors="ignore").to_csv(self._metadata, index=False, header=self.count == 0)
+        self.count += len(matrix)
+
+    def close(self):
+        """Finalize the store: copy the raw vectors into embeddings.npy, write the manifest and swap it into place"""
+        self._raw.close()
+        self._metadata.close()
+        if self.count == 0:
+            raise ValueError("No rows were written")
+
+        embeddings_path = os.path.join(self._staging_dir, EMBEDDINGS_FILE)
+        raw = np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        out = np.lib.format.open_memmap(embeddings_path, mode="w+", dtype=np.float32, shape=(self.count, self.dim))
+        for start in range(0, self.count, self.COPY_BLOCK):
+            out[start:start + self.COPY_BLOCK] = raw[start:start + self.COPY_BLOCK]
+        out.flush()
+        del out, raw
+
+        os.remove(self._raw_path)
+        write_manifest(self._staging_dir, self.count, self.dim, "metadata.csv", self.model)
+        _swap_into_place(self._staging_dir, self.store_dir)
+        return self.store_dir
+
+
+def load_catalog(store_dir=DEFAULT_STORE_DIR, mmap=True):
+    """
+    Load a catalog store.
+
+    Returns:
+        (metadata_df, embeddings) where `embeddings` is a read-only memory-mapped float32 matrix
+        (or an in-memory array when `mmap` is False)
+    """
+    with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    embeddings = np.load(os.path.join(store_dir, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+    metadata_df = _read_metadata(store_dir, manifest["metadata_file"])
+    return metadata_df, embeddings
+
+
+def load_catalog_dataframe(store_dir=DEFAULT_STORE_DIR):
+    """
+    Load a catalog store as a styles DataFrame with an `embeddings` column.
+    Each cell is a view into the shared memory-mapped matrix, so no vector data is copied.
+    """
+    styles_df, embeddings = load_catalog(store_dir)
+    styles_df["embeddings"] = list(embeddings)
+    return styles_df
+
+
+def convert_csv_to_store(csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_STORE_DIR, chunksize=5000, model=EMBEDDING_MODEL):
+    """
+    Convert a CSV with a stringified `embeddings` column into a catalog store.
+    The CSV is read in chunks and the vectors are parsed straight into float32.
+    """
+    metadata_chunks = []
+    vector_chunks = []
+    for chunk in pd.read_csv(csv_path, on_bad_lines="skip", chunksize=chunksize):
+        chunk = chunk.dropna(subset=["embeddings"])
+        vector_chunks.append(np.stack([parse_embedding(text) for text in chunk["embeddings"]]))
+        metadata_chunks.append(chunk.drop(columns=["embeddings"]))
+
+    metadata_df = pd.concat(metadata_chunks, ignore_index=True)
+    embeddings = np.concatenate(vector_chunks)
+    save_catalog(metadata_df, embeddings, store_dir, model=model)
+    print(f"✅ Converted {len(metadata_df)} items ({embeddings.shape[1]} dims) from {csv_path} to {store_dir}")
+    return store_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the embeddings CSV into a binary catalog store")
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_CSV_PATH)
+    parser.add_argument("store_dir", nargs="?", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--chunksize", type=int, default=5000)
+    args = parser.parse_args()
+
+    convert_csv_to_store(args.csv_path, args.store_dir, chunksize=args.chunksize)
@@ -0,0 +1,84 @@
+"""
+embedding_cache.py
+Content-addressed cache for query embeddings, keyed by (model and dimensions, normalized text), so a suggested
+description is only ever embedded once per model (match/search_similar_items.py). Catalog embedding jobs do not go
+through it: they reuse vectors from the catalog store and their own checkpoints, and would otherwise evict every
+query embedding.
+"""
+
+# Standard library imports
+import os
+import threading
+import unicodedata
+from typing import Callable, List, Optional
+
+# 3P Imports
+import numpy as np
+
+# Local Application Imports
+from config import CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_MODEL_KEY
+from utils.cache import TieredCache, make_key
+
+
+def normalize_text(text):
+    """Normalize unicode and collapse whitespace so trivially different strings share one entry"""
+    return " ".join(unicodedata.normalize("NFKC", str(text)).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier (LRU memory + SQLite disk) cache of embedding vectors stored as float32 bytes.
+    """
+
+    def __init__(self, path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.cache = TieredCache(path, max_entries=max_entries, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(text, model=EMBEDDING_MODEL_KEY):
+        return make_key(model, normalize_text(text))
+
+    def get(self, text, model=EMBEDDING_MODEL_KEY) -> Optional[List[float]]:
+        value = self.cache.get(self.key(text, model))
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float32).tolist()
+
+    def set(self, text, embedding, model=EMBEDDING_MODEL_KEY):
+        self.cache.set(self.key(text, model), np.asarray(embedding, dtype=np.float32).tobytes())
+
+    def get_or_fetch(self, texts: List[str], fetch: Callable, model=EMBEDDING_MODEL_KEY):
+        """
+        Return embeddings for `texts`, calling `fetch` once with only the texts that are not cached.
+        Returns None if `fetch` does (e.g. no API client configured).
+        """
+        embeddings = [self.get(text, model) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+
+        fetched = fetch([texts[i] for i in missing])
+        if fetched is None:
+            return None
+        for i, embedding in zip(missing, fetched):
+            embeddings[i] = embedding
+        self.cache.set_many(
+            (self.key(texts[i], model), np.asarray(embedding, dtype=np.float32).tobytes())
+            for i, embedding in zip(missing, fetched)
+        )
+        return embeddings
+
+    def stats(self):
+        return self.cache.stats()
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, creating it on first use"""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(os.path.join(CACHE_DIR, "embeddings.sqlite"))
+    return _embedding_cache
@@ -0,0 +1,291 @@
+"""
+fake_openai.py
+Offline stand-in for the OpenAI endpoints the app uses, for load tests of concurrency, caching and retries
+without network access or cost. `FakeOpenAITransport` plugs into the real `AsyncOpenAI` client as its
+httpx transport (set OPENAI_FAKE=1), so the SDK's request building, retries and Retry-After handling all
+run unchanged. It answers:
+  - POST /embeddings: deterministic hash-seeded vectors (bag of hashed words, so similar texts are close)
+  - POST /chat/completions: scripted JSON for the analyze_image and check_match prompts (optionally streamed)
+with simulated latency, random 429s / 5xx failures and an optional requests-per-minute ceiling.
+"""
+
+# Standard library imports
+import asyncio
+import base64
+import collections
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+# 3P Imports
+import numpy as np
+
+# The transport and its responses must come from the package the SDK's client is built on (httpx2 from openai 3)
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+# Local Application Imports
+from config import (
+    FAKE_OPENAI_FAILURE_RATE,
+    FAKE_OPENAI_JITTER,
+    FAKE_OPENAI_LATENCY_MS,
+    FAKE_OPENAI_RATE_LIMIT_RATE,
+    FAKE_OPENAI_RETRY_AFTER,
+    FAKE_OPENAI_RPM,
+    FAKE_OPENAI_SCRIPT,
+    FAKE_OPENAI_SEED,
+)
+
+MODEL_DIMENSIONS = {"text-embedding-3-large": 3072, "text-embedding-3-small": 1536, "text-embedding-ada-002": 1536}
+GENDERS = ["Men", "Women", "Unisex"]
+COLOURS = ["Black", "White", "Blue", "Grey", "Red", "Brown", "Navy Blue", "Green"]
+SUGGESTIONS = ["Casual Shoes", "Jeans", "Tshirts", "Shirts", "Watches", "Belts", "Sunglasses", "Trousers", "Heels"]
+STREAM_CHUNK_CHARS = 8
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).digest()
+
+
+def _seed(*parts):
+    return int.from_bytes(_digest(*parts)[:8], "little")
+
+
+@functools.lru_cache(maxsize=65_536)
+def _word_vector(word, dim, seed):
+    return np.random.default_rng(_seed(seed, word)).standard_normal(dim).astype(np.float32)
+
+
+def fake_embedding(item, dim=3072, seed=FAKE_OPENAI_SEED):
+    """
+    Deterministic unit vector for a text (or token-id list): the sum of one hashed vector per word, so
+    texts sharing words get high cosine similarity, plus a small component unique to the whole input.
+    """
+    words = [str(token) for token in item] if isinstance(item, list) else re.findall(r"\w+", str(item).lower())
+    vector = np.random.default_rng(_seed(seed, "input", words)).standard_normal(dim).astype(np.float32) * 0.3
+    for word in words:
+        vector += _word_vector(word, dim, seed)
+    return vector / np.linalg.norm(vector)
+
+
+def _prompt_text(messages):
+    """Concatenated text parts of the request messages"""
+    texts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(part.get("text", "") for part in content if part.get("type") == "text")
+    return "\n".join(texts)
+
+
+def _prompt_kind(prompt):
+    if '"answer", "reason"' in prompt:
+        return "check_match"
+    if '"items", "category", and "gender"' in prompt:
+        return "analyze_image"
+    return "chat"
+
+
+def scripted_answer(kind, prompt, request_key, script=None):
+    """
+    JSON answer for a chat request. Entries of a script file ({kind: [answer, ...]}) take precedence;
+    an answer that is not a string is serialized, so scripts can also return malformed text on purpose.
+    """
+    rng = random.Random(_seed(request_key))
+    if script and script.get(kind):
+        answer = script[kind][rng.randrange(len(script[kind]))]
+        return answer if isinstance(answer, str) else json.dumps(answer)
+
+    if kind == "analyze_image":
+        # The list is a Python list or a NumPy array repr (which has no commas), so only the quoted names are read
+        match = re.search(r"between the types in this list: (\[.*?\])", prompt, re.S)
+        categories = re.findall(r"'([^']*)'", match.group(1)) if match else []
+        gender = rng.choice(GENDERS)
+        items = [f"{rng.choice(COLOURS)} {gender}'s {article}" for article in rng.sample(SUGGESTIONS, 3)]
+        return json.dumps({"category": rng.choice(categories or SUGGESTIONS), "gender": gender, "items": items})
+    if kind == "check_match":
+        answer = "yes" if rng.random() < 0.7 else "no"
+        reason = "The colours and styles complement each other." if answer == "yes" else "The styles clash."
+        return json.dumps({"answer": answer, "reason": reason})
+    return "OK"
+
+
+class FakeOpenAITransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that serves OpenAI-shaped responses locally.
+
+    Args:
+        latency_ms: mean simulated latency per request
+        jitter: relative +/- spread of the latency
+        rate_limit_rate: probability of answering 429 regardless of load
+        failure_rate: probability of answering 500
+        rpm: requests per rolling minute before 429s are returned (0 = unlimited)
+        retry_after: seconds sent in the Retry-After header of 429 responses
+        script: path to a JSON file of scripted chat answers, see `scripted_answer`
+        seed: seed for embeddings and the failure draws
+    """
+
+    def __init__(
+        self,
+        latency_ms=FAKE_OPENAI_LATENCY_MS,
+        jitter=FAKE_OPENAI_JITTER,
+        rate_limit_rate=FAKE_OPENAI_RATE_LIMIT_RATE,
+        failure_rate=FAKE_OPENAI_FAILURE_RATE,
+        rpm=FAKE_OPENAI_RPM,
+        retry_after=FAKE_OPENAI_RETRY_AFTER,
+        script=FAKE_OPENAI_SCRIPT,
+        seed=FAKE_OPENAI_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.seed = seed
+        self.script = None
+        if script:
+            with open(script) as f:
+                self.script = json.load(f)
+
+        self._rng = random.Random(seed)
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def stats(self):
+        """Requests served per endpoint and outcome, plus the highest concurrency observed"""
+        with self._lock:
+            return {**self.counts, "max_in_flight": self.max_in_flight}
+
+    def _outcome(self):
+        """Decide up front whether this request is rate limited, fails, or succeeds"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                return "rate_limited"
+            self._recent.append(now)
+            draw = self._rng.random()
+        if draw < self.rate_limit_rate:
+            return "rate_limited"
+        if draw < self.rate_limit_rate + self.failure_rate:
+            return "failed"
+        return "ok"
+
+    def _latency(self):
+        with self._lock:
+            spread = 1 + self.jitter * (2 * self._rng.random() - 1)
+        return max(0.0, self.latency_ms * spread / 1000)
+
+    async def handle_async_request(self, request):
+        if request.url.path.endswith("/embeddings"):
+            endpoint = "embeddings"
+        elif request.url.path.endswith("/chat/completions"):
+            endpoint = "chat"
+        else:
+            endpoint = "unknown"
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self._latency())
+            outcome = self._outcome()
+            with self._lock:
+                self.counts[f"{endpoint}_{outcome}"] += 1
+
+            if outcome == "rate_limited":
+                return self._error(429, "Rate limit reached (simulated)", "rate_limit_exceeded",
+                                   {"retry-after": str(self.retry_after)})
+            if outcome == "failed":
+                return self._error(500, "Internal server error (simulated)", "server_error")
+
+            body = json.loads(request.content or b"{}")
+            if endpoint == "embeddings":
+                return httpx.Response(200, json=self._embeddings(body))
+            if endpoint == "chat":
+                return self._chat(body)
+            return self._error(404, f"Unknown endpoint {request.url.path}", "invalid_request_error")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def _error(status, message, error_type, headers=None):
+        return httpx.Response(
+            status, headers=headers, json={"error": {"message": message, "type": error_type, "code": error_type}}
+        )
+
+    def _embeddings(self, body):
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dim = body.get("dimensions") or MODEL_DIMENSIONS.get(body["model"], 3072)
+
+        data, n_tokens = [], 0
+        for index, item in enumerate(inputs):
+            vector = fake_embedding(item, dim, self.seed)
+            n_tokens += len(item) if isinstance(item, list) else len(str(item)) // 4 + 1
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        return {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+        }
+
+    def _chat(self, body):
+        messages = body.get("messages", [])
+        prompt = _prompt_text(messages)
+        content = scripted_answer(_prompt_kind(prompt), prompt, json.dumps(messages, sort_keys=True), self.script)
+        completion_id = f"chatcmpl-fake-{_digest(content, time.time_ns()).hex()[:16]}"
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4 + 1}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            return httpx.Response(200, json={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                ],
+                "usage": usage,
+            })
+
+        # Server-sent events, one small content delta at a time
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(content), STREAM_CHUNK_CHARS):
+                await asyncio.sleep(self.latency_ms / 1000 / 50)
+                yield chunk({"content": content[start:start + STREAM_CHUNK_CHARS]})
+            yield chunk({}, finish_reason="stop")
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
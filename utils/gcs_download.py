@@ -7,7 +7,15 @@ import os
 import requests
 from google.cloud import storage
 import pandas as pd
-import ast
+
+from config import EMBEDDING_DIMENSIONS
+from utils.catalog_store import (
+    DEFAULT_STORE_DIR,
+    convert_csv_to_store,
+    load_catalog_dataframe,
+    store_exists,
+    store_outdated,
+)
 
 def download_embeddings_from_public_url(url, destination_file_name):
     """
@@ -60,7 +68,15 @@ def download_embeddings_from_gcs(bucket_name, source_blob_name, destination_file
         print(f"❌ Error downloading from GCS: {e}")
         return False
 
-def load_embeddings_with_gcs_fallback(bucket_name=None, blob_name=None, public_url=None):
+def load_embeddings_from_csv(local_path, store_dir=DEFAULT_STORE_DIR):
+    """
+    Convert an embeddings CSV into the binary catalog store and load it from there.
+    Later starts find the store and skip the CSV entirely.
+    """
+    convert_csv_to_store(local_path, store_dir)
+    return load_catalog_dataframe(store_dir)
+
+def load_embeddings_with_gcs_fallback(bucket_name=None, blob_name=None, public_url=None, store_dir=DEFAULT_STORE_DIR):
     """
     Load embeddings file with fallback to GCS if local file doesn't exist
     
@@ -68,16 +84,25 @@ def load_embeddings_with_gcs_fallback(bucket_name=None, blob_name=None, public_u
         bucket_name: GCS bucket name (optional)
         blob_name: Path to file in bucket (optional)
         public_url: Public GCS URL (optional)
+        store_dir: Binary catalog store, preferred over the CSV when present
     """
     local_path = "data/sample_clothes/sample_styles_with_embeddings.csv"
     
+    # Check if the binary catalog store exists (memory-mapped, no parsing) and is not older than the CSV
+    if store_exists(store_dir) and store_outdated(local_path, store_dir):
+        print("🔄 Embeddings CSV is newer than the catalog store, rebuilding the store")
+    elif store_exists(store_dir):
+        print("📦 Using local catalog store")
+        try:
+            return load_catalog_dataframe(store_dir)
+        except Exception as e:
+            print(f"❌ Error loading catalog store: {e}")
+    
     # Check if local file exists
     if os.path.exists(local_path):
         print("📁 Using local embeddings file")
         try:
-            styles_df = pd.read_csv(local_path, on_bad_lines="skip")
-            styles_df["embeddings"] = styles_df["embeddings"].apply(ast.literal_eval)
-            return styles_df
+            return load_embeddings_from_csv(local_path, store_dir)
         except Exception as e:
             print(f"❌ Error loading local file: {e}")
     
@@ -86,9 +111,7 @@ def load_embeddings_with_gcs_fallback(bucket_name=None, blob_name=None, public_u
         print("☁️ Attempting to download from public GCS URL...")
         if download_embeddings_from_public_url(public_url, local_path):
             try:
-                styles_df = pd.read_csv(local_path, on_bad_lines="skip")
-                styles_df["embeddings"] = styles_df["embeddings"].apply(ast.literal_eval)
-                return styles_df
+                return load_embeddings_from_csv(local_path, store_dir)
             except Exception as e:
                 print(f"❌ Error loading downloaded file: {e}")
     
@@ -97,9 +120,7 @@ def load_embeddings_with_gcs_fallback(bucket_name=None, blob_name=None, public_u
         print("☁️ Attempting to download from Google Cloud Storage...")
         if download_embeddings_from_gcs(bucket_name, blob_name, local_path):
             try:
-                styles_df = pd.read_csv(local_path, on_bad_lines="skip")
-                styles_df["embeddings"] = styles_df["embeddings"].apply(ast.literal_eval)
-                return styles_df
+                return load_embeddings_from_csv(local_path, store_dir)
             except Exception as e:
                 print(f"❌ Error loading downloaded file: {e}")
     
@@ -134,14 +155,12 @@ def create_sample_embeddings():
     
     sample_df = pd.DataFrame(sample_data)
     
-    # Create dummy embeddings (1536-dimensional vectors like OpenAI embeddings)
+    # Create dummy unit vectors shaped like the real embeddings (3072 dims, or EMBEDDING_DIMENSIONS)
     print(f"Creating sample embeddings for {len(sample_df)} items...")
     
-    embeddings = []
-    for i in range(len(sample_df)):
-        # Create a random embedding vector (1536 dimensions like text-embedding-3-large)
-        embedding = np.random.rand(1536).tolist()
-        embeddings.append(embedding)
+    vectors = np.random.normal(size=(len(sample_df), EMBEDDING_DIMENSIONS or 3072))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    embeddings = vectors.tolist()
     
     # Add embeddings to the dataframe
     sample_df['embeddings'] = embeddings
@@ -2,25 +2,55 @@
 guardrails.py
 Contains business logic filters and constraints used to refine matching results. Initial 
 images are sent back to the model and asked if they are relevant (Yes/No) and provide justification.
+`check_matches` validates all candidates for one reference image concurrently, and verdicts are cached
+per (reference image, candidate item, prompt version, model).
 """
 
+# Standard library imports
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import threading
+
 # 3P Imports
-from openai import OpenAI
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 # Local Application Imports
-from config import GPT_MODEL, OPENAI_API_KEY
+from config import (
+    CACHE_DIR,
+    GPT_MODEL,
+    GUARDRAIL_CACHE_MAX_BYTES,
+    GUARDRAIL_CACHE_MAX_ENTRIES,
+    GUARDRAIL_CACHE_TTL,
+    GUARDRAIL_MAX_ATTEMPTS,
+    GUARDRAIL_MAX_CONCURRENCY,
+    GUARDRAIL_TIMEOUT,
+)
+from utils import openai_client, tracing
+from utils.cache import TieredCache, make_key
+from utils.image_prep import image_data_url
 
-# Initialize OpenAI client 
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
+MATCH_PROMPT = """ You will be given two images of two different items of clothing.
+                            Your goal is to decide if the items in the images would work in an outfit together.
+                            The first image is the reference item (the item that the user is trying to match with another item).
+                            You need to decide if the second item would work well with the reference item.
+                            Your response must be a JSON output with the following fields: "answer", "reason".
+                            The "answer" field must be either "yes" or "no", depending on whether you think the items would work well together.
+                            The "reason" field must be a short explanation of your reasoning for your decision. Do not include the descriptions of the 2 images.
+                            Do not include the ```json ``` tag in the output.
+                           """
+
+# Changes whenever the prompt text changes, so cached verdicts from an older prompt are never reused
+PROMPT_VERSION = hashlib.sha256(MATCH_PROMPT.encode("utf-8")).hexdigest()[:12]
 
-def check_match(reference_image_base64, suggested_image_base64):
-    if not client:
+async def check_match_async(reference_image_base64, suggested_image_base64, timeout=None, max_retries=None):
+    if not openai_client.is_configured():
         return None
         
-    response = client.chat.completions.create(
+    response = await openai_client.achat_completion(
         model=GPT_MODEL,
         messages=[
             {
@@ -28,34 +58,175 @@ def check_match(reference_image_base64, suggested_image_base64):
             "content": [
                 {
                 "type": "text",
-                "text": """ You will be given two images of two different items of clothing.
-                            Your goal is to decide if the items in the images would work in an outfit together.
-                            The first image is the reference item (the item that the user is trying to match with another item).
-                            You need to decide if the second item would work well with the reference item.
-                            Your response must be a JSON output with the following fields: "answer", "reason".
-                            The "answer" field must be either "yes" or "no", depending on whether you think the items would work well together.
-                            The "reason" field must be a short explanation of your reasoning for your decision. Do not include the descriptions of the 2 images.
-                            Do not include the ```json ``` tag in the output.
-                           """,
+                "text": MATCH_PROMPT,
                 },
                 {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{reference_image_base64}",
+                    "url": image_data_url(reference_image_base64),
                 },
                 },
                 {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{suggested_image_base64}",
+                    "url": image_data_url(suggested_image_base64),
                 },
                 }
             ],
             }
         ],
         max_tokens=300,
+        timeout=timeout,
+        max_retries=max_retries,
     )
     # Extract relevant features from the response
     features = response.choices[0].message.content
     return features
 
+
+def check_match(reference_image_base64, suggested_image_base64, timeout=None, max_retries=None):
+    """Blocking wrapper around check_match_async (runs on the shared OpenAI client loop)"""
+    if not openai_client.is_configured():
+        return None
+    return openai_client.run(check_match_async(reference_image_base64, suggested_image_base64, timeout, max_retries))
+
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def _wait_for_rate_limit(retry_state):
+    """Honour the server's Retry-After header on 429s, otherwise back off exponentially with jitter"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+def check_match_with_retry(reference_image_base64, suggested_image_base64, timeout=GUARDRAIL_TIMEOUT, max_attempts=GUARDRAIL_MAX_ATTEMPTS):
+    """
+    check_match with a per-call timeout and rate-limit-aware retries.
+    The client's own retries are disabled for these calls so attempts are not multiplied.
+    """
+    retrying = Retrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        wait=_wait_for_rate_limit,
+        stop=stop_after_attempt(max_attempts),
+        reraise=True,
+    )
+    return retrying(check_match, reference_image_base64, suggested_image_base64, timeout=timeout, max_retries=0)
+
+
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """Return the process-wide guardrail verdict cache (memory LRU + SQLite, with TTL)"""
+    global _verdict_cache
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            _verdict_cache = TieredCache(
+                os.path.join(CACHE_DIR, "guardrail_verdicts.sqlite"),
+                max_entries=GUARDRAIL_CACHE_MAX_ENTRIES,
+                max_bytes=GUARDRAIL_CACHE_MAX_BYTES,
+                ttl=GUARDRAIL_CACHE_TTL,
+            )
+    return _verdict_cache
+
+
+@functools.lru_cache(maxsize=16)
+def reference_digest(reference_image_base64):
+    """SHA-256 of a reference payload, hashed once for all the candidates checked against it"""
+    return hashlib.sha256(reference_image_base64.encode("utf-8")).hexdigest()
+
+
+def verdict_key(reference_image_base64, candidate_id):
+    """Cache key for one (reference image, candidate item) pair under the current prompt and model"""
+    return make_key(reference_digest(reference_image_base64), str(candidate_id), PROMPT_VERSION, GPT_MODEL)
+
+
+def check_match_cached(
+    reference_image_base64,
+    candidate_id,
+    suggested_image,
+    timeout=GUARDRAIL_TIMEOUT,
+    max_attempts=GUARDRAIL_MAX_ATTEMPTS,
+):
+    """
+    check_match_with_retry behind the verdict cache.
+
+    Args:
+        reference_image_base64: Encoded reference image
+        candidate_id: Stable catalog item id of the candidate
+        suggested_image: Encoded candidate image, or a zero-argument callable returning it (only
+            called on a cache miss)
+    """
+    with tracing.span("check_match", cache_hit=False) as span:
+        cache = get_verdict_cache()
+        key = verdict_key(reference_image_base64, candidate_id)
+        cached = cache.get(key)
+        if cached is not None:
+            span.set(cache_hit=True)
+            return cached.decode("utf-8")
+
+        suggested_image_base64 = suggested_image() if callable(suggested_image) else suggested_image
+        match_result = check_match_with_retry(reference_image_base64, suggested_image_base64, timeout=timeout, max_attempts=max_attempts)
+
+        # Only cache well-formed verdicts; parse failures should be retried next time
+        try:
+            if match_result is not None and json.loads(match_result)["answer"] in ("yes", "no"):
+                cache.set(key, match_result.encode("utf-8"))
+        except (json.JSONDecodeError, TypeError, KeyError):
+            pass
+        return match_result
+
+
+def check_matches(
+    reference_image_base64,
+    candidates,
+    max_concurrency=GUARDRAIL_MAX_CONCURRENCY,
+    timeout=GUARDRAIL_TIMEOUT,
+    max_attempts=GUARDRAIL_MAX_ATTEMPTS,
+    use_cache=True,
+):
+    """
+    Validate every candidate against one reference image concurrently and yield results as they finish.
+
+    Args:
+        reference_image_base64: Encoded reference image, shared by all checks
+        candidates: Mapping of candidate item id to its encoded image, or to a zero-argument callable
+            returning it (so encoding also runs in the worker threads, and is skipped on cache hits)
+        max_concurrency: Maximum number of guardrail requests in flight
+        timeout: Per-request timeout in seconds
+        max_attempts: Attempts per candidate before giving up
+        use_cache: Serve repeat (reference, candidate) pairs from the verdict cache
+
+    Yields:
+        (key, match_result, error) in completion order. `match_result` is the raw JSON string from
+        check_match (None when no client is configured); `error` is the exception if the check failed.
+    """
+    def validate(key, payload):
+        if use_cache:
+            return check_match_cached(reference_image_base64, key, payload, timeout=timeout, max_attempts=max_attempts)
+        with tracing.span("check_match"):
+            suggested_image_base64 = payload() if callable(payload) else payload
+            return check_match_with_retry(reference_image_base64, suggested_image_base64, timeout=timeout, max_attempts=max_attempts)
+
+    # Each worker runs in a copy of the caller's context so its spans join the caller's trace
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(tracing.in_context(validate), key, payload): key for key, payload in candidates.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except Exception as e:
+                yield key, None, e
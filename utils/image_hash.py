@@ -0,0 +1,42 @@
+"""
+image_hash.py
+Perceptual hashing for uploaded images. A 64-bit difference hash (dHash) stays the same, or changes in
+only a few bits, when an image is re-encoded, resized or slightly cropped, so near-duplicate uploads can
+be found by Hamming distance.
+"""
+
+# Standard library imports
+import base64
+import io
+
+# 3P Imports
+import numpy as np
+from PIL import Image
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash of a PIL image as an unsigned int of hash_size * hash_size bits.
+    """
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def dhash_base64(image_base64, hash_size=8):
+    """dHash of a base64-encoded image"""
+    return dhash(Image.open(io.BytesIO(base64.b64decode(image_base64))), hash_size=hash_size)
+
+
+def to_signed64(value):
+    """Map an unsigned 64-bit hash onto SQLite's signed INTEGER range"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distances(value, hashes):
+    """
+    Hamming distance between one 64-bit hash and an array of 64-bit hashes (signed or unsigned).
+    """
+    xor = np.asarray(hashes, dtype=np.int64).view(np.uint64) ^ np.uint64(value & ((1 << 64) - 1))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
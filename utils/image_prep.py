@@ -0,0 +1,126 @@
+"""
+image_prep.py
+Prepares images for the vision calls. GPT-4o fits every image into 2048px, scales the short side down to 768px and
+bills 170 tokens per 512px tile, so pixels beyond that are uploaded and decoded for nothing. Images are downscaled
+here before base64 encoding (JPEG decoding itself runs at reduced scale), and JPEGs that are already small enough
+pass through byte for byte. Candidate images are kept as ready-to-send base64 thumbnails per item id in a
+size-capped LRU + SQLite cache, so validating the same item again costs no file read or encode.
+"""
+
+# Standard library imports
+import base64
+import functools
+import io
+import os
+import threading
+
+# 3P Imports
+from PIL import Image, ImageOps
+
+# Local Application Imports
+from config import (
+    CACHE_DIR,
+    CANDIDATE_IMAGE_MAX_SIDE,
+    IMAGE_JPEG_QUALITY,
+    REFERENCE_IMAGE_MAX_SIDE,
+    THUMBNAIL_CACHE_MAX_BYTES,
+    THUMBNAIL_CACHE_MAX_ENTRIES,
+)
+from utils import tracing
+from utils.cache import TieredCache, make_key
+
+EXIF_ORIENTATION = 0x0112
+
+
+def _encode_jpeg(image, max_side, quality):
+    """Orient, flatten to RGB, shrink to fit `max_side` and encode as base64 JPEG"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getbuffer()).decode("ascii")
+
+
+def prepare_image_bytes(data, max_side=REFERENCE_IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """
+    Base64 JPEG payload for encoded image bytes (JPEG, PNG, ...). Upright JPEGs that already fit `max_side`
+    are passed through unchanged; everything else is decoded (JPEGs at a reduced DCT scale) and downscaled.
+    """
+    with tracing.span("encode_image", bytes_in=len(data)) as span:
+        image = Image.open(io.BytesIO(data))
+        if (
+            image.format == "JPEG"
+            and max(image.size) <= max_side
+            and image.getexif().get(EXIF_ORIENTATION, 1) == 1
+        ):
+            encoded = base64.b64encode(data).decode("ascii")
+        else:
+            image.draft("RGB", (max_side, max_side))
+            encoded = _encode_jpeg(image, max_side, quality)
+        span.set(bytes_out=len(encoded))
+        return encoded
+
+
+def encode_image_file(path, max_side=REFERENCE_IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """Base64 JPEG payload for an image file"""
+    with open(path, "rb") as f:
+        return prepare_image_bytes(f.read(), max_side, quality)
+
+
+@functools.lru_cache(maxsize=16)
+def image_data_url(image_base64):
+    """
+    data: URL for a base64 JPEG payload. Memoized (lookups of the same str object are O(1)), so the
+    concurrent checks against one reference image share a single URL string instead of copying it each.
+    """
+    return f"data:image/jpeg;base64,{image_base64}"
+
+
+class ThumbnailCache:
+    """
+    Base64 candidate thumbnails keyed by item id, image size and mtime (so a replaced image file is re-encoded),
+    in an LRU tier in front of a size-capped SQLite tier.
+    """
+
+    def __init__(self, path, max_side=CANDIDATE_IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY,
+                 max_entries=THUMBNAIL_CACHE_MAX_ENTRIES, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.max_side = max_side
+        self.quality = quality
+        self.cache = TieredCache(path, max_entries=max_entries, max_bytes=max_bytes)
+
+    def get(self, item_id, path):
+        """Thumbnail of the catalog image at `path` for `item_id`, encoded on first use"""
+        with tracing.span("candidate_thumbnail", cache_hit=True) as span:
+            stat = os.stat(path)
+            key = make_key("thumbnail", str(item_id), str(stat.st_size), str(stat.st_mtime_ns), str(self.max_side), str(self.quality))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached.decode("ascii")
+
+            span.set(cache_hit=False)
+            encoded = encode_image_file(path, self.max_side, self.quality)
+            self.cache.set(key, encoded.encode("ascii"))
+            return encoded
+
+    def stats(self):
+        return self.cache.stats()
+
+
+_thumbnail_cache = None
+_thumbnail_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Return the process-wide candidate thumbnail cache, creating it on first use"""
+    global _thumbnail_cache
+    with _thumbnail_cache_lock:
+        if _thumbnail_cache is None:
+            _thumbnail_cache = ThumbnailCache(os.path.join(CACHE_DIR, "thumbnails.sqlite"))
+    return _thumbnail_cache
+
+
+def candidate_thumbnail(item_id, path):
+    """Cached base64 thumbnail of a candidate's catalog image"""
+    return get_thumbnail_cache().get(item_id, path)
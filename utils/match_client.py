@@ -0,0 +1,118 @@
+"""
+match_client.py
+HTTP client for the matching service (match_service.py). Mirrors the local pipeline calls so app.py can
+switch between in-process matching and the service with MATCH_SERVICE_URL.
+"""
+
+# Standard library imports
+import json
+import threading
+
+# 3P Imports
+import requests
+
+# Local Application Imports
+from config import MATCH_SERVICE_TIMEOUT, MATCH_SERVICE_URL
+from utils import tracing
+
+
+class MatchServiceError(RuntimeError):
+    """The service could not be reached or answered with an error"""
+
+
+class MatchServiceClient:
+    """
+    Thin client; one keep-alive session per thread (requests sessions are not thread-safe).
+    """
+
+    def __init__(self, url=MATCH_SERVICE_URL, timeout=MATCH_SERVICE_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _request(self, method, path, payload=None):
+        with tracing.span(f"service{path.replace('/', '.')}"):
+            try:
+                response = self._session.request(method, self.url + path, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise MatchServiceError(f"Matching service unreachable at {self.url}: {e}") from e
+            if not response.ok:
+                try:
+                    detail = response.json().get("detail", response.text)
+                except ValueError:
+                    detail = response.text
+                raise MatchServiceError(f"{method} {path} failed ({response.status_code}): {detail}")
+            return response.json()
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def catalog_info(self):
+        """{"items": count, "categories": [...], "genders": [...]}"""
+        return self._request("GET", "/catalog")
+
+    def recommend(self, encoded_image):
+        """
+        (matched catalog item id or None, recommended item dicts from the compatibility graph,
+        visually similar catalog item dicts)
+        """
+        result = self._request("POST", "/recommend", {"image": encoded_image})
+        return result["matched_item"], result["matches"], result.get("visual_matches", [])
+
+    def match_stream(self, encoded_image):
+        """Progress events of the pipelined match (see match/pipelined_match.py), yielded as the service sends them"""
+        with tracing.span("service.match"):
+            try:
+                response = self._session.post(
+                    self.url + "/match", json={"image": encoded_image}, timeout=self.timeout, stream=True
+                )
+            except requests.RequestException as e:
+                raise MatchServiceError(f"Matching service unreachable at {self.url}: {e}") from e
+            with response:
+                if not response.ok:
+                    raise MatchServiceError(f"POST /match failed ({response.status_code}): {response.text}")
+                try:
+                    for line in response.iter_lines():
+                        if line:
+                            yield json.loads(line)
+                except requests.RequestException as e:
+                    raise MatchServiceError(f"Match stream from {self.url} interrupted: {e}") from e
+
+    def analyze(self, encoded_image):
+        """Parsed analysis of a base64 image: {"items", "category", "gender"}"""
+        return self._request("POST", "/analyze", {"image": encoded_image})
+
+    def search(self, image_analysis):
+        """(number of items searched, matching item dicts) for an analysis"""
+        result = self._request("POST", "/search", {
+            "items": image_analysis["items"],
+            "gender": image_analysis["gender"],
+            "category": image_analysis["category"],
+        })
+        return result["searched_items"], result["matches"]
+
+    def validate(self, encoded_image, item_ids):
+        """{item_id: parsed verdict or {"error": message}} for the items that have a catalog image"""
+        result = self._request("POST", "/validate", {"image": encoded_image, "item_ids": [int(i) for i in item_ids]})
+        return {int(item_id): verdict for item_id, verdict in result["verdicts"].items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_match_client():
+    """Process-wide client for MATCH_SERVICE_URL, or None when the app should match in-process"""
+    global _client
+    if not MATCH_SERVICE_URL:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = MatchServiceClient()
+    return _client
@@ -0,0 +1,231 @@
+"""
+openai_client.py
+Shared OpenAI client for the whole app. One `AsyncOpenAI` instance with a pooled keep-alive HTTP
+connection runs on a background event loop; every call goes through a global concurrency semaphore
+and per-model token buckets for requests/minute and tokens/minute. Sync wrappers let the existing
+blocking code use it, and `submit` lets independent calls of one request overlap.
+"""
+
+# Standard library imports
+import asyncio
+import threading
+import time
+
+# 3P Imports
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# Local Application Imports
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_FAKE,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE,
+    OPENAI_MAX_RETRIES,
+    OPENAI_RPM_LIMIT,
+    OPENAI_TIMEOUT,
+    OPENAI_TPM_LIMIT,
+)
+from utils import tracing
+
+# Rough token cost of one image input, used only for rate limiting
+IMAGE_TOKEN_ESTIMATE = 1000
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`, holding at most one minute of budget.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Global concurrency limit plus RPM/TPM buckets per model.
+    """
+
+    def __init__(self, max_concurrency=OPENAI_MAX_CONCURRENCY, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rpm = rpm
+        self.tpm = tpm
+        self._buckets = {}
+
+    def _bucket(self, model, kind, rate):
+        key = (model, kind)
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(rate)
+        return self._buckets[key]
+
+    async def acquire(self, model, tokens):
+        await self._bucket(model, "requests", self.rpm).acquire(1)
+        await self._bucket(model, "tokens", self.tpm).acquire(tokens)
+
+
+def estimate_tokens(value):
+    """
+    Cheap token estimate (~4 characters per token) for strings, message lists and image parts.
+    Only used to pace requests against the TPM budget, so it does not need to be exact.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value) // 4 + 1
+    if isinstance(value, dict):
+        if value.get("type") == "image_url":
+            return IMAGE_TOKEN_ESTIMATE
+        return sum(estimate_tokens(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_tokens(v) for v in value)
+    return 0
+
+
+class SharedClient:
+    """
+    Owns the background event loop, the AsyncOpenAI client and the rate limiter.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="openai-client-loop", daemon=True)
+        self._thread.start()
+        self.fake = None
+        self.client = self.run_sync(self._create_client())
+        self.limiter = self.run_sync(self._create_limiter())
+
+    async def _create_client(self):
+        if OPENAI_FAKE:
+            # Offline load-test mode: same client, requests are answered in-process by the fake transport
+            from utils.fake_openai import FakeOpenAITransport
+
+            self.fake = FakeOpenAITransport()
+            http_client = DefaultAsyncHttpxClient(transport=self.fake)
+        else:
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=OPENAI_TIMEOUT,
+        )
+
+    async def _create_limiter(self):
+        # Created on the loop so the semaphore and locks belong to it
+        return RateLimiter()
+
+    def submit(self, coro):
+        """Schedule `coro` on the shared loop (under the caller's trace) and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(tracing.bind(coro), self.loop)
+
+    def run_sync(self, coro):
+        """Run `coro` on the shared loop and block until it finishes"""
+        return self.submit(coro).result()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Return the process-wide SharedClient, starting its event loop on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedClient()
+    return _shared
+
+
+def is_configured():
+    """True when an API key is available"""
+    return bool(OPENAI_API_KEY)
+
+
+# === Async API ===
+
+async def achat_completion(max_retries=None, timeout=None, **kwargs):
+    """
+    `chat.completions.create` through the shared pool and rate limits. Returns the response object.
+    `max_retries`/`timeout` override the client defaults for this call only.
+    """
+    shared = get_shared_client()
+    client = shared.client
+    if max_retries is not None or timeout is not None:
+        options = {"max_retries": max_retries, "timeout": timeout}
+        client = client.with_options(**{k: v for k, v in options.items() if v is not None})
+
+    tokens = estimate_tokens(kwargs.get("messages")) + kwargs.get("max_tokens", 500)
+    with tracing.span("openai.chat", model=kwargs.get("model")) as span:
+        async with shared.limiter.semaphore:
+            await shared.limiter.acquire(kwargs.get("model"), tokens)
+            span.set(queue_ms=round((time.perf_counter() - span.start) * 1000, 3))
+            response = await client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span.set(tokens=usage.total_tokens, prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    return response
+
+
+async def acreate_embeddings(input, model, max_retries=None, **kwargs):
+    """
+    `embeddings.create` through the shared pool and rate limits. Returns the list of vectors.
+    Accepts text or token-id inputs. `max_retries` overrides the client default for this call only.
+    """
+    shared = get_shared_client()
+    client = shared.client if max_retries is None else shared.client.with_options(max_retries=max_retries)
+    tokens = sum(len(item) if isinstance(item, list) else estimate_tokens(item) for item in input)
+    with tracing.span("openai.embeddings", model=model, inputs=len(input)) as span:
+        async with shared.limiter.semaphore:
+            await shared.limiter.acquire(model, tokens)
+            span.set(queue_ms=round((time.perf_counter() - span.start) * 1000, 3))
+            response = await client.embeddings.create(input=input, model=model, **kwargs)
+        span.set(tokens=response.usage.total_tokens)
+    return [data.embedding for data in response.data]
+
+
+# === Sync wrappers ===
+
+def submit(coro):
+    """Start `coro` on the shared loop without waiting; lets one request overlap several calls"""
+    return get_shared_client().submit(coro)
+
+
+def run(coro):
+    """Run `coro` on the shared loop and return its result"""
+    return get_shared_client().run_sync(coro)
+
+
+def chat_completion(**kwargs):
+    """Blocking version of achat_completion"""
+    return run(achat_completion(**kwargs))
+
+
+def create_embeddings(input, model, **kwargs):
+    """Blocking version of acreate_embeddings"""
+    return run(acreate_embeddings(input, model, **kwargs))
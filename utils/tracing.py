@@ -0,0 +1,264 @@
+"""
+tracing.py
+Lightweight request tracing. A trace covers one user request (e.g. "analyze" or "search"); spans inside it
+time each stage (image encoding, image analysis, query embedding, vector search, guardrail checks, OpenAI
+calls) and carry attributes such as token counts and cache-hit flags. The current trace lives in a
+contextvar, so spans nest naturally; `bind` and `in_context` carry it onto the shared OpenAI event loop
+and into worker threads. Every span also feeds process-wide metrics, exported as Prometheus text
+(`start_metrics_server`) and, per finished trace, as one JSON line in TRACE_LOG_PATH.
+"""
+
+# Standard library imports
+import collections
+import contextlib
+import contextvars
+import functools
+import http.server
+import json
+import threading
+import time
+import uuid
+
+# Local Application Imports
+from config import METRICS_HOST, METRICS_PORT, TRACE_LOG_PATH
+
+# Latency histogram buckets (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("retailnext_trace", default=None)
+
+
+class Span:
+    """
+    One timed stage. `attrs` conventions: `tokens` (total tokens used), `cache_hit` (bool),
+    `cache_hits` / `cache_misses` (counts for batched lookups), `error` (exception type name).
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin):
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            **self.attrs,
+        }
+
+
+class Trace:
+    """
+    All spans recorded for one request.
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self):
+        """Per-stage totals: {stage: {"count", "total_ms", "tokens", "cache_hits", "cache_misses"}}"""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(
+                span.name, {"count": 0, "total_ms": 0.0, "tokens": 0, "cache_hits": 0, "cache_misses": 0}
+            )
+            hits, misses = _cache_counts(span.attrs)
+            stage["count"] += 1
+            stage["total_ms"] += (span.duration or 0.0) * 1000
+            stage["tokens"] += span.attrs.get("tokens", 0)
+            stage["cache_hits"] += hits
+            stage["cache_misses"] += misses
+        return stages
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            **self.attrs,
+            "spans": [span.to_dict(self.start) for span in spans],
+        }
+
+
+def _cache_counts(attrs):
+    """(hits, misses) recorded on a span"""
+    hits, misses = attrs.get("cache_hits", 0), attrs.get("cache_misses", 0)
+    if "cache_hit" in attrs:
+        hits, misses = hits + bool(attrs["cache_hit"]), misses + (not attrs["cache_hit"])
+    return hits, misses
+
+
+class Metrics:
+    """
+    Process-wide latency histograms and counters per stage (and per trace name), in Prometheus format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = collections.Counter()
+
+    def observe(self, kind, name, seconds, attrs=None):
+        attrs = attrs or {}
+        with self._lock:
+            histogram = self.histograms.setdefault((kind, name), {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            if kind != "stage":
+                return
+
+            hits, misses = _cache_counts(attrs)
+            self.counters[("tokens", name)] += attrs.get("tokens", 0)
+            self.counters[("cache_hits", name)] += hits
+            self.counters[("cache_misses", name)] += misses
+            self.counters[("errors", name)] += "error" in attrs
+
+    def render_prometheus(self):
+        """Current metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for kind in ("stage", "request"):
+                metric = f"retailnext_{kind}_duration_seconds"
+                lines += [f"# HELP {metric} Latency of each {kind}", f"# TYPE {metric} histogram"]
+                for (histogram_kind, name), histogram in sorted(self.histograms.items()):
+                    if histogram_kind != kind:
+                        continue
+                    for bound, count in zip(BUCKETS, histogram["buckets"]):
+                        lines.append(f'{metric}_bucket{{{kind}="{name}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{kind}="{name}",le="+Inf"}} {histogram["count"]}')
+                    lines.append(f'{metric}_sum{{{kind}="{name}"}} {histogram["sum"]:.6f}')
+                    lines.append(f'{metric}_count{{{kind}="{name}"}} {histogram["count"]}')
+
+            for counter in ("tokens", "cache_hits", "cache_misses", "errors"):
+                metric = f"retailnext_stage_{counter}_total"
+                lines += [f"# HELP {metric} Total {counter.replace('_', ' ')} per stage", f"# TYPE {metric} counter"]
+                for (counter_name, name), value in sorted(self.counters.items()):
+                    if counter_name == counter:
+                        lines.append(f'{metric}{{stage="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+_log_lock = threading.Lock()
+
+
+def current_trace():
+    """The trace of the request being handled, or None"""
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def trace(name, on_finish=None, **attrs):
+    """
+    Trace one request. `on_finish(trace)` runs when it ends, even if the block raises (useful for UI
+    frameworks that abort the script, like `st.rerun`).
+    """
+    request_trace = Trace(name, **attrs)
+    token = _current_trace.set(request_trace)
+    try:
+        yield request_trace
+    except Exception as e:
+        request_trace.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        request_trace.duration = time.perf_counter() - request_trace.start
+        METRICS.observe("request", name, request_trace.duration, request_trace.attrs)
+        if TRACE_LOG_PATH:
+            with _log_lock, open(TRACE_LOG_PATH, "a") as f:
+                f.write(json.dumps(request_trace.to_dict(), default=str) + "\n")
+        if on_finish is not None:
+            on_finish(request_trace)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time one stage of the current request (also recorded in the metrics when there is no trace)"""
+    current = Span(name, **attrs)
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        METRICS.observe("stage", name, current.duration, current.attrs)
+        request_trace = _current_trace.get()
+        if request_trace is not None:
+            request_trace.add(current)
+
+
+async def _run_in_trace(coro, request_trace):
+    token = _current_trace.set(request_trace)
+    try:
+        return await coro
+    finally:
+        _current_trace.reset(token)
+
+
+def bind(coro):
+    """Wrap `coro` so it runs under the caller's trace (e.g. when scheduled on another thread's event loop)"""
+    request_trace = _current_trace.get()
+    return coro if request_trace is None else _run_in_trace(coro, request_trace)
+
+
+def in_context(fn):
+    """Wrap `fn` to run in a copy of the caller's context, so spans from worker threads join the trace"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve GET /metrics on `host`:`port` from a daemon thread (once per process); port 0 disables it"""
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"📈 Metrics available at http://{host}:{port}/metrics")
+    return _metrics_server